@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""导入用户修改映射：读取映射对比表中的用户操作并写回中间表"""
+
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from 导入用户修改映射 import SHEET_NAME, apply_user_updates, iter_user_updates
+from 映射中间表存储 import MAPPING_TABLE, ConnectionPool, MappingStore, SqliteBackend
+
+HEADER = ['源系统科目编码', '源系统科目名称', '目标科目编码', '用户修改目标编码', '用户修改目标名称', '用户备注', '用户操作']
+
+
+def _workbook(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = SHEET_NAME
+    ws.append(HEADER)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    with ConnectionPool(SqliteBackend(os.path.join(tmp_path, 'mapping.sqlite3'))) as pool:
+        store = MappingStore(pool)
+        store.create_table()
+        store.upsert(pd.DataFrame({
+            'source_subject_code': ['1001', '1002', '1122', '2202'],
+            'target_subject_code': ['1001', '1002', '1122', '2202'],
+            'target_subject_name': ['库存现金', '银行存款', '应收账款', '应付账款'],
+            'match_type': 'exact_match',
+            'match_method': 'traditional_rule',
+            'mapping_status': ['matched', 'matched', 'confirmed', 'matched'],
+            'is_confirmed': [0, 0, 1, 0],
+        }), batch_id='B1')
+        yield store
+
+
+def _rows(store):
+    conn = sqlite3.connect(store.backend.path)
+    try:
+        frame = pd.read_sql(f"SELECT source_subject_code, target_subject_code, target_subject_name, match_type, "
+                            f"match_method, mapping_status, is_confirmed, is_modified, remark FROM {MAPPING_TABLE}",
+                            conn)
+    finally:
+        conn.close()
+    return frame.set_index('source_subject_code')
+
+
+def test_records_contain_only_changed_fields(tmp_path):
+    path = _workbook(os.path.join(tmp_path, 'review.xlsx'), [
+        ('1001', '库存现金', '1001', None, None, None, '确认'),
+        ('1122', '应收账款', '1122', None, None, '核对过', '待处理'),
+        ('1231', '坏账准备', '1231', None, None, None, '待处理'),
+    ])
+    records = list(iter_user_updates(path, mapping_batch_id='B1'))
+    assert [r['source_subject_code'] for r in records] == ['1001', '1122']
+    assert records[0]['set'] == {'mapping_status': 'confirmed', 'is_confirmed': 1}
+    assert records[1]['set'] == {'remark': '核对过'}
+    assert records[1]['excel_row'] == 3
+
+
+def test_apply_round_trips_through_mapping_store(tmp_path, store):
+    path = _workbook(os.path.join(tmp_path, 'review.xlsx'), [
+        ('1001', '库存现金', '1001', None, None, None, '确认'),
+        ('1002', '银行存款', '1002', '100201', None, '改到明细', '确认'),
+        ('1122', '应收账款', '1122', None, None, '核对过', '待处理'),
+        ('2202', '应付账款', '2202', None, None, None, '拒绝'),
+    ])
+    assert apply_user_updates(store, 'B1', iter_user_updates(path, mapping_batch_id='B1')) == 4
+
+    rows = _rows(store)
+    # 只确认：目标科目和匹配方式保持不变
+    assert rows.loc['1001', ['target_subject_code', 'target_subject_name', 'match_type']].tolist() == \
+        ['1001', '库存现金', 'exact_match']
+    assert rows.loc['1001', ['mapping_status', 'is_confirmed', 'is_modified']].tolist() == ['confirmed', 1, 0]
+    # 只改了编码：名称保持不变，标记为人工映射
+    assert rows.loc['1002', ['target_subject_code', 'target_subject_name', 'match_type', 'match_method']].tolist() == \
+        ['100201', '银行存款', 'manual_mapping', 'manual']
+    assert rows.loc['1002', ['is_confirmed', 'is_modified', 'remark']].tolist() == [1, 1, '改到明细']
+    # 待处理只写备注：已确认的行仍为已确认
+    assert rows.loc['1122', ['mapping_status', 'is_confirmed', 'remark']].tolist() == ['confirmed', 1, '核对过']
+    assert rows.loc['2202', ['mapping_status', 'is_confirmed', 'target_subject_code']].tolist() == \
+        ['rejected', 0, '2202']
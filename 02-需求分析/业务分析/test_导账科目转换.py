@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""导账科目转换：已确认映射的一对一、一对多（拆分）转换"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from 导账科目转换 import (
+    AMBIGUOUS,
+    COUNTERPART_FIELD,
+    EXCEPTION_FIELD,
+    SUBJECT_FIELD,
+    LedgerTranslator,
+    MappingLookup,
+)
+from 科目拆分 import SplitEngine
+from 科目精确匹配 import load_target_index
+
+
+@pytest.fixture(scope='module')
+def index():
+    # 默认科目表的相对路径以本目录为准
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        yield load_target_index()
+    finally:
+        os.chdir(cwd)
+
+
+def _translate(index, mapping, lines):
+    lookup = MappingLookup(pd.DataFrame(mapping, columns=['source_subject_code', 'target_subject_code']), index,
+                           split_codes=['1901'])
+    translator = LedgerTranslator(lookup, splitter=SplitEngine(target=index))
+    frame = pd.DataFrame(lines, columns=[SUBJECT_FIELD, COUNTERPART_FIELD, 'debit_amount', 'credit_amount'])
+    return translator.translate(frame)
+
+
+def test_one_to_one_child_of_split_parent_is_kept(index):
+    translated, exceptions = _translate(index, [('X1', '190102')], [('X1', '1405', '100.00', '')])
+    assert list(translated[SUBJECT_FIELD]) == ['190102']
+    assert not len(exceptions)
+
+
+def test_one_to_many_under_split_parent_is_split(index):
+    translated, exceptions = _translate(index, [('X2', '190101'), ('X2', '190102')],
+                                        [('X2', '1405', '100.00', '')])
+    assert list(translated[SUBJECT_FIELD]) == ['190101']
+    assert list(translated['split_from']) == ['1901']
+    assert not len(exceptions)
+
+
+def test_one_to_many_outside_split_parent_is_exception(index):
+    translated, exceptions = _translate(index, [('X3', '190101'), ('X3', '1122')], [('X3', '1405', '100.00', '')])
+    assert not len(translated)
+    assert list(exceptions[EXCEPTION_FIELD]) == [AMBIGUOUS]
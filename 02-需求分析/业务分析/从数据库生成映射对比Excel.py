@@ -6,9 +6,10 @@
 """
 
 import pandas as pd
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+from openpyxl.utils import get_column_letter, column_index_from_string
 try:
     from openpyxl.worksheet.datavalidation import DataValidation
 except ImportError:
@@ -16,6 +17,67 @@ except ImportError:
 from datetime import datetime
 import os
 
+from 映射中间表存储 import BATCH_FIELD, MAPPING_TABLE, server_side_cursor
+
+# 映射对比表的列定义：(Excel列名, 中间表字段, 列宽)
+# 用户操作区域（AA-AD列）没有对应的中间表字段
+MAPPING_COLUMNS = [
+    # 源系统科目信息（映射前，A-H列）
+    ('源系统科目编码', 'source_subject_code', 15),
+    ('源系统科目名称', 'source_subject_name', 20),
+    ('源系统父科目编码', 'source_parent_code', 15),
+    ('源系统父科目名称', 'source_parent_name', 20),
+    ('源系统科目层级', 'source_subject_level', 12),
+    ('源系统科目类型', 'source_subject_type', 10),
+    ('源系统余额方向', 'source_debit_credit', 10),
+    ('源系统辅助核算', 'source_auxiliary_info', 15),
+
+    # 目标系统科目信息（映射后，I-P列）
+    ('目标系统科目编码', 'target_subject_code', 15),
+    ('目标系统科目名称', 'target_subject_name', 20),
+    ('目标系统父科目编码', 'target_parent_code', 15),
+    ('目标系统父科目名称', 'target_parent_name', 20),
+    ('目标系统科目层级', 'target_subject_level', 12),
+    ('目标系统科目类型', 'target_subject_type', 10),
+    ('目标系统余额方向', 'target_debit_credit', 10),
+    ('目标系统辅助核算', 'target_auxiliary_info', 15),
+
+    # 匹配过程信息（Q-U列）
+    ('匹配类型', 'match_type', 15),
+    ('匹配方法', 'match_method', 15),
+    ('匹配度评分', 'match_score', 12),
+    ('匹配置信度', 'match_confidence', 12),
+    ('匹配依据', 'match_reason', 30),
+
+    # 处理状态（V-Z列）
+    ('映射状态', 'mapping_status', 12),
+    ('是否已确认', 'is_confirmed', 12),
+    ('是否已修改', 'is_modified', 12),
+    ('验证结果', 'validation_result', 12),
+    ('是否存在冲突', 'conflict_flag', 12),
+
+    # 用户操作区域（AA-AD列，可修改）
+    ('用户修改目标编码', None, 15),
+    ('用户修改目标名称', None, 20),
+    ('用户备注', None, 30),
+    ('用户操作', None, 12),
+]
+
+# 从中间表读取的字段（按Excel列顺序）
+MAPPING_FIELDS = [field for _, field, _ in MAPPING_COLUMNS if field]
+
+# 从数据库分块读取时每次取回的行数
+EXPORT_CHUNK_SIZE = 5000
+
+# 用户操作区域的默认值
+USER_COLUMN_DEFAULTS = {'用户操作': '待处理'}
+
+# 居中显示的列
+CENTER_COLUMNS = ['E', 'F', 'G', 'M', 'N', 'O', 'S', 'T', 'V', 'W', 'X', 'Y', 'Z', 'AD']
+
+# 用户可修改的列（灰色高亮）
+USER_COLUMNS = ['AA', 'AB', 'AC', 'AD']
+
 def generate_mapping_excel(mapping_data, output_file, source_system_name="源系统"):
     """
     生成科目映射对比Excel文件
@@ -27,47 +89,12 @@ def generate_mapping_excel(mapping_data, output_file, source_system_name="源系
     """
     
     # 准备Excel数据
-    excel_data = {
-        # 源系统科目信息（映射前）
-        '源系统科目编码': mapping_data.get('source_subject_code', [''] * len(mapping_data)),
-        '源系统科目名称': mapping_data.get('source_subject_name', [''] * len(mapping_data)),
-        '源系统父科目编码': mapping_data.get('source_parent_code', [''] * len(mapping_data)),
-        '源系统父科目名称': mapping_data.get('source_parent_name', [''] * len(mapping_data)),
-        '源系统科目层级': mapping_data.get('source_subject_level', [''] * len(mapping_data)),
-        '源系统科目类型': mapping_data.get('source_subject_type', [''] * len(mapping_data)),
-        '源系统余额方向': mapping_data.get('source_debit_credit', [''] * len(mapping_data)),
-        '源系统辅助核算': mapping_data.get('source_auxiliary_info', [''] * len(mapping_data)),
-        
-        # 目标系统科目信息（映射后）
-        '目标系统科目编码': mapping_data.get('target_subject_code', [''] * len(mapping_data)),
-        '目标系统科目名称': mapping_data.get('target_subject_name', [''] * len(mapping_data)),
-        '目标系统父科目编码': mapping_data.get('target_parent_code', [''] * len(mapping_data)),
-        '目标系统父科目名称': mapping_data.get('target_parent_name', [''] * len(mapping_data)),
-        '目标系统科目层级': mapping_data.get('target_subject_level', [''] * len(mapping_data)),
-        '目标系统科目类型': mapping_data.get('target_subject_type', [''] * len(mapping_data)),
-        '目标系统余额方向': mapping_data.get('target_debit_credit', [''] * len(mapping_data)),
-        '目标系统辅助核算': mapping_data.get('target_auxiliary_info', [''] * len(mapping_data)),
-        
-        # 匹配过程信息
-        '匹配类型': mapping_data.get('match_type', [''] * len(mapping_data)),
-        '匹配方法': mapping_data.get('match_method', [''] * len(mapping_data)),
-        '匹配度评分': mapping_data.get('match_score', [''] * len(mapping_data)),
-        '匹配置信度': mapping_data.get('match_confidence', [''] * len(mapping_data)),
-        '匹配依据': mapping_data.get('match_reason', [''] * len(mapping_data)),
-        
-        # 处理状态
-        '映射状态': mapping_data.get('mapping_status', [''] * len(mapping_data)),
-        '是否已确认': mapping_data.get('is_confirmed', [''] * len(mapping_data)),
-        '是否已修改': mapping_data.get('is_modified', [''] * len(mapping_data)),
-        '验证结果': mapping_data.get('validation_result', [''] * len(mapping_data)),
-        '是否存在冲突': mapping_data.get('conflict_flag', [''] * len(mapping_data)),
-        
-        # 用户操作区域（可修改）
-        '用户修改目标编码': [''] * len(mapping_data),
-        '用户修改目标名称': [''] * len(mapping_data),
-        '用户备注': [''] * len(mapping_data),
-        '用户操作': ['待处理'] * len(mapping_data),
-    }
+    excel_data = {}
+    for header, field, _ in MAPPING_COLUMNS:
+        if field is None:
+            excel_data[header] = [USER_COLUMN_DEFAULTS.get(header, '')] * len(mapping_data)
+        else:
+            excel_data[header] = mapping_data.get(field, [''] * len(mapping_data))
     
     df = pd.DataFrame(excel_data)
     
@@ -100,11 +127,7 @@ def generate_mapping_excel(mapping_data, output_file, source_system_name="源系
     
     # 设置列宽
     column_widths = {
-        'A': 15, 'B': 20, 'C': 15, 'D': 20, 'E': 12, 'F': 10, 'G': 10, 'H': 15,
-        'I': 15, 'J': 20, 'K': 15, 'L': 20, 'M': 12, 'N': 10, 'O': 10, 'P': 15,
-        'Q': 15, 'R': 15, 'S': 12, 'T': 12, 'U': 30,
-        'V': 12, 'W': 12, 'X': 12, 'Y': 12, 'Z': 12,
-        'AA': 15, 'AB': 20, 'AC': 30, 'AD': 12,
+        get_column_letter(i): width for i, (_, _, width) in enumerate(MAPPING_COLUMNS, start=1)
     }
     
     for col, width in column_widths.items():
@@ -117,7 +140,7 @@ def generate_mapping_excel(mapping_data, output_file, source_system_name="源系
             cell.alignment = wrap_alignment
             
             col_letter = get_column_letter(cell.column)
-            if col_letter in ['E', 'F', 'G', 'M', 'N', 'O', 'S', 'T', 'V', 'W', 'X', 'Y', 'Z', 'AD']:
+            if col_letter in CENTER_COLUMNS:
                 cell.alignment = center_alignment
             
             # 根据状态设置背景色
@@ -137,7 +160,7 @@ def generate_mapping_excel(mapping_data, output_file, source_system_name="源系
                     cell.fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
             
             # 用户可修改区域高亮
-            if col_letter in ['AA', 'AB', 'AC', 'AD']:
+            if col_letter in USER_COLUMNS:
                 cell.fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
                 cell.font = Font(bold=True)
     
@@ -159,9 +182,173 @@ def generate_mapping_excel(mapping_data, output_file, source_system_name="源系
     print(f"   - 包含数据: {len(df)} 条记录")
     print(f"   - 包含使用说明sheet")
 
+def _mapping_cell_styles(ws):
+    """
+    预先构建映射对比表的单元格样式，返回 (表头样式, 各列样式, 按值着色的列样式)
+    样式在工作簿中只登记一次，写入时直接复用，不再逐单元格查找样式表
+    """
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    center_alignment = Alignment(horizontal='center', vertical='center')
+    wrap_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+    yellow_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+    gray_fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
+    
+    def make_style(**attrs):
+        cell = WriteOnlyCell(ws)
+        for name, value in attrs.items():
+            setattr(cell, name, value)
+        return cell._style
+    
+    header_style = make_style(fill=header_fill, font=header_font, alignment=center_alignment, border=border)
+    
+    column_styles = []
+    for i in range(1, len(MAPPING_COLUMNS) + 1):
+        col_letter = get_column_letter(i)
+        attrs = {'border': border,
+                 'alignment': center_alignment if col_letter in CENTER_COLUMNS else wrap_alignment}
+        if col_letter in USER_COLUMNS:
+            attrs.update(fill=gray_fill, font=Font(bold=True))
+        column_styles.append(make_style(**attrs))
+    
+    # 映射状态列（V）和匹配置信度列（T）按单元格值着色
+    value_styles = {}
+    status_col = column_index_from_string('V') - 1
+    confidence_col = column_index_from_string('T') - 1
+    for col, colors in ((status_col, {'已确认': green_fill, 'confirmed': green_fill,
+                                       '待确认': yellow_fill, 'matched': yellow_fill}),
+                        (confidence_col, {'高': green_fill, 'high': green_fill,
+                                          '中': yellow_fill, 'medium': yellow_fill,
+                                          '低': red_fill, 'low': red_fill})):
+        value_styles[col] = {
+            value: make_style(border=border, alignment=center_alignment, fill=fill)
+            for value, fill in colors.items()
+        }
+    
+    return header_style, column_styles, value_styles
+
+def generate_mapping_excel_streaming(rows, output_file, source_system_name="源系统"):
+    """
+    流式生成科目映射对比Excel文件（write-only模式）
+    每行只写入一次且写入时即带样式，不经过DataFrame、不回读文件，内存占用不随行数增长
+    
+    参数:
+    - rows: 映射记录的可迭代对象，每条记录为以中间表字段为键的dict，
+            或按 MAPPING_FIELDS 顺序排列的元组/列表（如数据库游标返回的行）
+    - output_file: 输出文件路径
+    - source_system_name: 源系统名称
+    
+    返回: 写入的数据行数
+    """
+    wb = Workbook(write_only=True)
+    
+    # 使用说明sheet放在第一个
+    add_instruction_sheet(wb, source_system_name)
+    
+    ws = wb.create_sheet('映射对比表')
+    
+    # 列宽和冻结窗格需在写入数据前设置
+    for i, (_, _, width) in enumerate(MAPPING_COLUMNS, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.freeze_panes = 'I2'
+    
+    header_style, column_styles, value_styles = _mapping_cell_styles(ws)
+    
+    # 表头
+    header_cells = []
+    for header, _, _ in MAPPING_COLUMNS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell._style = header_style
+        header_cells.append(cell)
+    ws.append(header_cells)
+    
+    # 用户操作区域的默认值
+    user_values = [USER_COLUMN_DEFAULTS.get(header, '') for header, field, _ in MAPPING_COLUMNS if field is None]
+    
+    row_count = 0
+    for record in rows:
+        if isinstance(record, dict):
+            values = [record.get(field, '') for field in MAPPING_FIELDS]
+        else:
+            values = list(record)
+        values.extend(user_values)
+        
+        row_cells = []
+        for col, value in enumerate(values):
+            # 空值（NaN）写为空单元格
+            if isinstance(value, float) and value != value:
+                value = None
+            cell = WriteOnlyCell(ws, value=value)
+            style = column_styles[col]
+            if col in value_styles:
+                style = value_styles[col].get(value, style)
+            cell._style = style
+            row_cells.append(cell)
+        ws.append(row_cells)
+        row_count += 1
+    
+    # 添加数据验证（用户操作列），行数在写完数据后才确定
+    dv = DataValidation(type="list", formula1='"确认,拒绝,待处理,跳过"', allow_blank=True)
+    dv.add(f"AD2:AD{row_count + 1}")
+    ws.data_validations.append(dv)
+    
+    wb.save(output_file)
+    print(f"✅ Excel文件已生成（流式）: {output_file}")
+    print(f"   - 文件大小: {os.path.getsize(output_file) / 1024:.2f} KB")
+    print(f"   - 包含数据: {row_count} 条记录")
+    print(f"   - 包含使用说明sheet")
+    return row_count
+
+def iter_mapping_rows(conn, batch_id, chunk_size=EXPORT_CHUNK_SIZE, placeholder='?', table=MAPPING_TABLE):
+    """
+    从中间表逐行读取一个批次（服务器端游标，每次 fetchmany 一块），只查询 MAPPING_FIELDS
+    按唯一键 (mapping_batch_id, source_subject_code) 的顺序返回，数据库不需要先排序整个批次
+    
+    参数:
+    - conn: DB-API 连接（sqlite3、pymysql 等）
+    - batch_id: mapping_batch_id
+    - chunk_size: 每次从数据库取回的行数
+    - placeholder: 参数占位符，sqlite3 为 '?'，pymysql 为 '%s'
+    
+    返回: 生成器，每次一个按 MAPPING_FIELDS 顺序排列的行元组
+    """
+    cursor = server_side_cursor(conn)
+    try:
+        cursor.execute(f"SELECT {', '.join(MAPPING_FIELDS)} FROM {table} "
+                       f"WHERE {BATCH_FIELD} = {placeholder} ORDER BY source_subject_code", (batch_id,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+def generate_mapping_excel_from_db(conn, batch_id, output_file, source_system_name="源系统",
+                                   chunk_size=EXPORT_CHUNK_SIZE, placeholder='?'):
+    """
+    从数据库直接流式生成科目映射对比Excel文件
+    读一块写一块，内存中最多只有一块行，查询尚未取完时前面的行已经写入工作表
+    
+    返回: 写入的数据行数
+    """
+    rows = iter_mapping_rows(conn, batch_id, chunk_size=chunk_size, placeholder=placeholder)
+    return generate_mapping_excel_streaming(rows, output_file, source_system_name)
+
 def add_instruction_sheet(wb, source_system_name):
-    """添加使用说明sheet"""
+    """添加使用说明sheet（支持普通和write-only工作簿）"""
     ws_info = wb.create_sheet("使用说明", 0)
+    # 列宽需在写入数据前设置（write-only模式要求）
+    ws_info.column_dimensions['A'].width = 50
+    ws_info.column_dimensions['B'].width = 50
     info_content = [
         ["科目映射对比表 - 使用说明"],
         [""],
@@ -212,22 +399,32 @@ def add_instruction_sheet(wb, source_system_name):
     ]
     
     for i, row_data in enumerate(info_content, start=1):
-        for j, value in enumerate(row_data, start=1):
-            cell = ws_info.cell(row=i, column=j, value=value)
-            if i == 1:
-                cell.font = Font(bold=True, size=14)
-            elif i in [3, 10, 17, 25, 31, 37]:
-                cell.font = Font(bold=True, size=12)
-    
-    ws_info.column_dimensions['A'].width = 50
-    ws_info.column_dimensions['B'].width = 50
+        font = None
+        if i == 1:
+            font = Font(bold=True, size=14)
+        elif i in [3, 10, 17, 25, 31, 37]:
+            font = Font(bold=True, size=12)
+        
+        if wb.write_only:
+            # write-only模式只能按整行追加
+            row_cells = []
+            for value in row_data:
+                cell = WriteOnlyCell(ws_info, value=value)
+                if font:
+                    cell.font = font
+                row_cells.append(cell)
+            ws_info.append(row_cells)
+        else:
+            for j, value in enumerate(row_data, start=1):
+                cell = ws_info.cell(row=i, column=j, value=value)
+                if font:
+                    cell.font = font
 
 if __name__ == "__main__":
-    # 示例：从数据库读取数据（需要根据实际情况修改）
+    # 示例：从数据库流式导出（需要根据实际情况修改），不会先把整个批次读入内存
     # import pymysql
     # conn = pymysql.connect(host='localhost', user='user', password='pass', database='db')
-    # query = "SELECT * FROM account_mapping_temp WHERE mapping_batch_id = 'BATCH001'"
-    # mapping_data = pd.read_sql(query, conn)
+    # generate_mapping_excel_from_db(conn, 'BATCH001', '科目映射对比表_BATCH001.xlsx', "用友U8", placeholder='%s')
     # conn.close()
     
     # 示例：使用示例数据
@@ -249,3 +446,13 @@ if __name__ == "__main__":
     output_file = os.path.join(output_dir, "科目映射对比表_示例.xlsx")
     
     generate_mapping_excel(sample_data, output_file, "示例系统")
+    
+    # 示例：示例数据写入本地 SQLite 中间表后从数据库流式导出
+    from 映射中间表存储 import ConnectionPool, MappingStore, SqliteBackend
+    with ConnectionPool(SqliteBackend(':memory:'), size=1) as pool:
+        store = MappingStore(pool)
+        store.create_table()
+        store.upsert(sample_data, batch_id='BATCH001')
+        with pool.connection() as conn:
+            generate_mapping_excel_from_db(conn, 'BATCH001', os.path.join(output_dir, "科目映射对比表_示例_数据库.xlsx"),
+                                           "示例系统")
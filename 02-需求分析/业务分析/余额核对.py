@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导账前后余额核对：源系统余额（或凭证明细）与转换后的余额逐块读入，一次遍历完成核对
+- 试算平衡：导账前、导账后分别核对借方合计 = 贷方合计
+- 按映射目标科目、类别、资产负债表/利润表科目、报表项目核对导账前后的借方、贷方金额
+  导账前按源科目确认的映射目标归集（未映射、一对多的归入“未转换”），导账后按转换结果的科目归集（拆分的取拆分前的父科目）
+- 每个不一致的项目列出造成差异的源科目
+
+金额全部为整数分，按 (源科目, 目标科目) 对累加，对的数量只与科目数有关，和明细行数无关
+"""
+
+import numpy as np
+import pandas as pd
+
+from 报表汇总 import StatementRollup
+from 导账科目转换 import SOURCE_SUBJECT_FIELD
+from 科目拆分 import AMOUNT_FIELDS, CHUNK_SIZE, SPLIT_FROM_FIELD, SUBJECT_FIELD, cents_to_text, to_cents
+from 科目精确匹配 import load_target_index, normalize_code_column
+
+UNTRANSLATED = '未转换'
+
+# 核对维度
+DIMENSION_TARGET = '目标科目'
+DIMENSION_CATEGORY = '类别'
+DIMENSION_SHEET = '报表科目'
+DIMENSION_ITEM = '报表项目'
+DIMENSION_SOURCE = '源科目'
+
+# 导账前/导账后的借方、贷方金额列
+AMOUNT_COLUMNS = ['before_debit', 'before_credit', 'after_debit', 'after_credit']
+MISMATCH_COLUMNS = ['dimension', 'key', *AMOUNT_COLUMNS, 'difference', 'sources']
+
+
+class _Registry:
+    """可增长的键 -> 连续编号表（每块只追加新出现的键）"""
+
+    def __init__(self, dtype=object):
+        self.keys = pd.Index([], dtype=dtype)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def ids(self, keys):
+        position = self.keys.get_indexer(keys)
+        new = position < 0
+        if new.any():
+            self.keys = self.keys.append(pd.Index(pd.unique(keys[new])))
+            position[new] = self.keys.get_indexer(keys[new])
+        return position
+
+
+class BalanceReconciler:
+    """
+    导账前后余额核对器：feed_before() / feed_after() 逐块累计，result() 汇总并列出差异
+
+    参数:
+    - lookup: 导账科目转换.MappingLookup（与转换时使用的相同）
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    - amount_fields: 金额字段（借方、贷方）
+    """
+
+    def __init__(self, lookup, target=None, amount_fields=AMOUNT_FIELDS):
+        if target is None:
+            target = load_target_index()
+        self.lookup = lookup
+        self.chart = lookup.chart
+        self.rollup = StatementRollup.from_index(target)
+        # 目标科目的类别、所属报表，按 lookup 的科目表位置排列
+        records = list(target)
+        position = pd.Index([r.code for r in records]).get_indexer(self.chart)
+        self.category = np.array([r.category for r in records] + [''], dtype=object)[position]
+        self.sheets = np.array(['/'.join(name for name, flag in (('资产负债表', r.balance_sheet), ('利润表', r.profit_sheet))
+                                         if flag == '是') for r in records] + [''], dtype=object)[position]
+        self.amount_fields = list(amount_fields)
+        self.sources = _Registry()
+        self.pairs = _Registry(dtype=np.int64)
+        self.amounts = np.zeros((0, 4), dtype=np.int64)
+        self.stats = {'before_lines': 0, 'after_lines': 0}
+
+    def _cents(self, chunk):
+        debit, credit = self.amount_fields
+        zero = np.zeros(len(chunk), dtype=np.int64)
+        return (to_cents(chunk[debit]) if debit in chunk.columns else zero,
+                to_cents(chunk[credit]) if credit in chunk.columns else zero)
+
+    def _add(self, codes, targets, side, chunk):
+        """按 (源科目, 目标科目) 对累加一块金额；targets 为目标科目位置，-1 为未转换"""
+        debit, credit = self._cents(chunk)
+        keys = self.sources.ids(codes).astype(np.int64) * (len(self.chart) + 1) + (targets + 1)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        sums = np.zeros((len(unique), 2), dtype=np.int64)
+        np.add.at(sums, inverse, np.column_stack([debit, credit]))
+        ids = self.pairs.ids(unique)
+        if len(self.pairs) > len(self.amounts):
+            self.amounts = np.vstack([self.amounts, np.zeros((len(self.pairs) - len(self.amounts), 4),
+                                                             dtype=np.int64)])
+        self.amounts[ids, 2 * side:2 * side + 2] += sums
+
+    def feed_before(self, chunk):
+        """累计一块源系统余额/明细（subject_code 为源科目编码）"""
+        codes = normalize_code_column(chunk[SUBJECT_FIELD])
+        targets = self.lookup.resolve(codes)
+        self._add(codes, np.where(targets >= 0, targets, -1), 0, chunk)
+        self.stats['before_lines'] += len(chunk)
+
+    def feed_after(self, chunk):
+        """累计一块转换后的余额/明细（subject_code 为本系统科目，source_subject_code 为源科目）"""
+        codes = normalize_code_column(chunk[SOURCE_SUBJECT_FIELD])
+        target = normalize_code_column(chunk[SUBJECT_FIELD])
+        if SPLIT_FROM_FIELD in chunk.columns:
+            parent = normalize_code_column(chunk[SPLIT_FROM_FIELD])
+            target = np.where(parent != '', parent, target)
+        self._add(codes, self.chart.get_indexer(target), 1, chunk)
+        self.stats['after_lines'] += len(chunk)
+
+    def pair_frame(self):
+        """(源科目, 目标科目) 对的导账前后金额"""
+        size = len(self.chart) + 1
+        keys = self.pairs.keys.to_numpy()
+        frame = pd.DataFrame(self.amounts[:len(keys)], columns=AMOUNT_COLUMNS)
+        frame.insert(0, 'source_subject_code', self.sources.keys.to_numpy(dtype=object)[keys // size])
+        frame.insert(1, 'target', keys % size - 1)
+        return frame
+
+    def trial_balance(self):
+        """导账前/导账后的借贷合计"""
+        totals = self.amounts.sum(axis=0) if len(self.amounts) else np.zeros(4, dtype=np.int64)
+        return pd.DataFrame({'side': ['导账前', '导账后'], 'debit': totals[[0, 2]], 'credit': totals[[1, 3]],
+                             'difference': totals[[0, 2]] - totals[[1, 3]]})
+
+    @staticmethod
+    def _mismatches(dimension, pairs, keys):
+        """按 keys（每个对的归集键）汇总，返回导账前后不一致的键及造成差异的源科目"""
+        amounts = pairs[AMOUNT_COLUMNS].to_numpy()
+        frame = pd.DataFrame(amounts, columns=AMOUNT_COLUMNS).assign(key=keys)
+        grouped = frame.groupby('key', sort=True)[AMOUNT_COLUMNS].sum()
+        values = grouped.to_numpy()
+        bad = (values[:, 0] != values[:, 2]) | (values[:, 1] != values[:, 3])
+        grouped = grouped[bad]
+        # 差异来源：对本身导账前后不一致的源科目
+        pair_bad = (amounts[:, 0] != amounts[:, 2]) | (amounts[:, 1] != amounts[:, 3])
+        culprits = pd.DataFrame({'key': keys[pair_bad], 'source': pairs['source_subject_code'].to_numpy()[pair_bad]})
+        culprits = culprits[culprits['key'].isin(grouped.index)].drop_duplicates().sort_values(['key', 'source'])
+        sources = culprits.groupby('key')['source'].agg('、'.join)
+        result = grouped.reset_index()
+        net = grouped.to_numpy()
+        result.insert(0, 'dimension', dimension)
+        result['difference'] = (net[:, 2] - net[:, 3]) - (net[:, 0] - net[:, 1])
+        result['sources'] = result['key'].map(sources).fillna('')
+        return result[MISMATCH_COLUMNS]
+
+    def result(self):
+        """
+        汇总核对结果
+
+        返回: dict
+        - trial_balance: 试算平衡
+        - mismatches: 所有不一致的项目（dimension、key、导账前后借贷方金额、difference 导账后减导账前的借方净额、
+          sources 造成差异的源科目）
+        """
+        pairs = self.pair_frame()
+        target = pairs['target'].to_numpy()
+        take = np.maximum(target, 0)
+        known = target >= 0
+        frames = [self._mismatches(dimension, pairs, np.where(known, values[take], UNTRANSLATED).astype(object))
+                  for dimension, values in ((DIMENSION_TARGET, self.lookup.target_codes),
+                                            (DIMENSION_CATEGORY, self.category), (DIMENSION_SHEET, self.sheets))]
+        frames.append(self._item_mismatches(pairs, target))
+        frames.append(self._mismatches(DIMENSION_SOURCE, pairs, pairs['source_subject_code'].to_numpy(dtype=object)))
+        mismatches = pd.concat([f for f in frames if len(f)], ignore_index=True) if any(len(f) for f in frames) \
+            else pd.DataFrame(columns=MISMATCH_COLUMNS)
+        return {'trial_balance': self.trial_balance(), 'mismatches': mismatches}
+
+    def _item_mismatches(self, pairs, target):
+        """报表项目：每个对按其目标科目所属的全部报表项目展开（一个科目可属于多个项目，如营业利润、利润总额）"""
+        rollup = self.rollup
+        size = len(rollup.codes)
+        position = rollup.codes.get_indexer(self.lookup.target_codes)
+        is_item = rollup.group >= size
+        # 科目位置 -> 所属项目；rollup 的 member 为科目表位置，按 lookup 的科目表重新编号
+        node_to_chart = np.full(size, -1)
+        node_to_chart[position[position >= 0]] = np.flatnonzero(position >= 0)
+        links = pd.DataFrame({'target': node_to_chart[rollup.member[is_item]],
+                              'item': rollup.group[is_item] - size})
+        links = links[links['target'] >= 0].drop_duplicates(['target', 'item'])
+        expanded = pairs.assign(target=target).merge(links, on='target')
+        if not len(expanded):
+            return pd.DataFrame(columns=MISMATCH_COLUMNS)
+        names = np.array([f'{statement}-{item}' for statement, item in rollup.items], dtype=object)
+        return self._mismatches(DIMENSION_ITEM, expanded, names[expanded['item'].to_numpy()])
+
+
+def reconcile_files(before_path, after_path, reconciler, chunk_size=CHUNK_SIZE, encoding='utf-8-sig'):
+    """
+    按块读入导账前、导账后的余额/明细文件（CSV）并核对
+
+    参数:
+    - before_path: 源系统余额表或凭证明细（subject_code、debit_amount、credit_amount）
+    - after_path: 导账科目转换.translate_file 输出的转换结果
+    - reconciler: BalanceReconciler
+
+    返回: reconciler.result()
+    """
+    for path, feed in ((before_path, reconciler.feed_before), (after_path, reconciler.feed_after)):
+        for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size, encoding=encoding):
+            feed(chunk)
+    return reconciler.result()
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+
+    from 导账科目转换 import LedgerTranslator, MappingLookup, translate_file
+    from 科目拆分 import SplitEngine
+
+    index = load_target_index()
+    records = list(index)
+    mapping = pd.DataFrame({'source_subject_code': [r.code + '01' for r in records] + ['190101', '190101'],
+                            'target_subject_code': [r.code for r in records] + ['190101', '190102']})
+    lookup = MappingLookup(mapping.iloc[5:], index, split_codes=['1901'])
+
+    # 凭证明细：每张凭证一借一贷；前 5 个源科目未映射，导账后这部分金额缺失
+    codes = mapping['source_subject_code'].drop_duplicates().to_numpy(dtype=object)
+    rng = np.random.default_rng(0)
+    count = 2_000_000
+    amount = cents_to_text(np.repeat(rng.integers(1, 10_000_000, count // 2), 2))
+    debit_side = np.arange(count) % 2 == 0
+    ledger = pd.DataFrame({
+        SUBJECT_FIELD: codes[rng.integers(0, len(codes), count)],
+        'debit_amount': np.where(debit_side, amount, ''),
+        'credit_amount': np.where(debit_side, '', amount),
+    })
+    with tempfile.TemporaryDirectory() as directory:
+        before_path = os.path.join(directory, 'ledger.csv')
+        after_path = os.path.join(directory, 'translated.csv')
+        ledger.to_csv(before_path, index=False, encoding='utf-8-sig')
+        translate_file(before_path, after_path, os.path.join(directory, 'exceptions.csv'),
+                       LedgerTranslator(lookup, splitter=SplitEngine(target=index)))
+        reconciler = BalanceReconciler(lookup)
+        start = time.perf_counter()
+        result = reconcile_files(before_path, after_path, reconciler)
+        elapsed = time.perf_counter() - start
+
+    print(result['trial_balance'].to_string())
+    mismatches = result['mismatches']
+    shown = mismatches.assign(difference=cents_to_text(mismatches['difference'])).drop(columns=AMOUNT_COLUMNS)
+    print(shown.to_string(max_colwidth=60))
+    print(f"\n✅ 导账前 {reconciler.stats['before_lines']} 行、导账后 {reconciler.stats['after_lines']} 行，"
+          f"{len(reconciler.pairs)} 个科目对，核对耗时 {elapsed:.2f} 秒（含读文件）")
+    print(f"📊 不一致项目: {mismatches['dimension'].value_counts().to_dict()}")
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据源的列式缓存
+把 Excel / CSV 读取结果保存为列式快照（每列一个 .npy 文件，文本列为编码数组 + 字符串表），
+之后的读取直接载入快照，不再解析原文件；
+缓存按源文件的修改时间和内容哈希校验，源文件变化后自动重建
+
+快照目录位于源文件所在目录的 .columnar_cache/ 下
+目前接入缓存的是各分析脚本读取的科目工作簿（小企业会计准则 (1).xlsx）和默认科目 CSV；
+科目匹配用的目标科目索引（科目索引.py）仍直接读取 CSV，不经过本缓存
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR_NAME = '.columnar_cache'
+SNAPSHOT_VERSION = 1
+
+# 混合类型列中每个值的类型标记
+_TAG_NAN, _TAG_NONE, _TAG_STR, _TAG_INT, _TAG_FLOAT, _TAG_BOOL = range(6)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# 字符串表
+# ---------------------------------------------------------------------------
+
+def _save_strings(directory, name, strings):
+    """字符串表：所有字符串的UTF-8拼接 + 各字符串的结束偏移"""
+    encoded = [s.encode('utf-8') for s in strings]
+    np.save(os.path.join(directory, f'{name}.offsets.npy'),
+            np.cumsum([len(b) for b in encoded], dtype=np.int64))
+    with open(os.path.join(directory, f'{name}.strings'), 'wb') as f:
+        f.write(b''.join(encoded))
+
+
+def _load_strings(directory, name):
+    ends = np.load(os.path.join(directory, f'{name}.offsets.npy')).tolist()
+    with open(os.path.join(directory, f'{name}.strings'), 'rb') as f:
+        blob = f.read()
+    strings = np.empty(len(ends), dtype=object)
+    start = 0
+    for i, end in enumerate(ends):
+        strings[i] = blob[start:end].decode('utf-8')
+        start = end
+    return strings
+
+
+# ---------------------------------------------------------------------------
+# 列编码
+# ---------------------------------------------------------------------------
+
+def _is_text_column(series):
+    if isinstance(series.dtype, pd.StringDtype):
+        return True
+    if series.dtype != object:
+        return False
+    values = series.to_numpy()
+    mask = pd.isna(values)
+    return all(type(v) is str for v in values[~mask]) and all(v is not None for v in values[mask])
+
+
+def _encode_text(directory, name, values):
+    """文本列：字符串表 + int32编码（空值为-1）"""
+    values = np.asarray(values, dtype=object)
+    missing = pd.isna(values)
+    codes = np.full(len(values), -1, dtype=np.int32)
+    inverse, strings = pd.factorize(values[~missing])
+    codes[~missing] = inverse
+    np.save(os.path.join(directory, f'{name}.codes.npy'), codes)
+    _save_strings(directory, name, strings.tolist())
+
+
+def _decode_text(directory, name, mmap_mode):
+    codes = np.load(os.path.join(directory, f'{name}.codes.npy'), mmap_mode=mmap_mode)
+    strings = np.append(_load_strings(directory, name), np.nan)  # 编码-1取最后一个元素，即空值
+    return strings[codes]
+
+
+def _encode_mixed(directory, name, values):
+    """混合类型的object列（如Excel中同时有数字和文字的编码列）：每个值的类型标记 + 各类型的取值数组"""
+    count = len(values)
+    tags = np.empty(count, dtype=np.int8)
+    ints = np.zeros(count, dtype=np.int64)
+    floats = np.zeros(count, dtype=np.float64)
+    codes = np.full(count, -1, dtype=np.int32)
+    strings = {}
+    for i, value in enumerate(values):
+        kind = type(value)
+        if value is None:
+            tags[i] = _TAG_NONE
+        elif kind is str:
+            tags[i] = _TAG_STR
+            codes[i] = strings.setdefault(value, len(strings))
+        elif kind is bool:
+            tags[i] = _TAG_BOOL
+            ints[i] = value
+        elif kind is int:
+            tags[i] = _TAG_INT
+            ints[i] = value
+        elif kind is float:
+            tags[i] = _TAG_NAN if value != value else _TAG_FLOAT
+            floats[i] = value
+        else:
+            return False
+    for suffix, array in (('tags', tags), ('ints', ints), ('floats', floats), ('codes', codes)):
+        np.save(os.path.join(directory, f'{name}.{suffix}.npy'), array)
+    _save_strings(directory, name, list(strings))
+    return True
+
+
+def _decode_mixed(directory, name, mmap_mode):
+    load = lambda suffix: np.load(os.path.join(directory, f'{name}.{suffix}.npy'), mmap_mode=mmap_mode)
+    tags, ints, floats, codes = load('tags'), load('ints'), load('floats'), load('codes')
+    strings = _load_strings(directory, name)
+    values = np.empty(len(tags), dtype=object)
+    for tag, fill in ((_TAG_INT, ints), (_TAG_FLOAT, floats)):
+        mask = tags == tag
+        values[mask] = fill[mask].tolist()
+    values[tags == _TAG_BOOL] = ints[tags == _TAG_BOOL].astype(bool).tolist()
+    values[tags == _TAG_NAN] = np.nan
+    values[tags == _TAG_NONE] = None
+    mask = tags == _TAG_STR
+    values[mask] = strings[codes[mask]]
+    return values
+
+
+# ---------------------------------------------------------------------------
+# 快照读写
+# ---------------------------------------------------------------------------
+
+def write_snapshot(df, directory):
+    """把 DataFrame 保存为列式快照目录"""
+    os.makedirs(directory, exist_ok=True)
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df.iloc[:, i]
+        name = f'c{i}'
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+            np.save(os.path.join(directory, f'{name}.npy'), series.to_numpy())
+            kind = 'array'
+        elif _is_text_column(series):
+            _encode_text(directory, name, series.to_numpy(dtype=object))
+            kind = 'text'
+        elif series.dtype == object and _encode_mixed(directory, name, series.to_numpy()):
+            kind = 'mixed'
+        else:
+            with open(os.path.join(directory, f'{name}.pkl'), 'wb') as f:
+                pickle.dump(series.to_numpy(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            kind = 'pickle'
+        columns.append({'name': col, 'kind': kind, 'dtype': str(series.dtype)})
+
+    index = None
+    if not (isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1):
+        with open(os.path.join(directory, 'index.pkl'), 'wb') as f:
+            pickle.dump(df.index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        index = 'index.pkl'
+
+    meta = {'version': SNAPSHOT_VERSION, 'rows': len(df), 'columns': columns, 'index': index}
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+def read_snapshot(directory, mmap=False):
+    """
+    读取列式快照，文本列由编码数组和字符串表还原
+
+    参数:
+    - mmap: 数值/布尔/日期列是否直接内存映射（零拷贝，但列为只读，不能再用 .at/.loc 赋值）；
+      默认读入内存，返回的 DataFrame 与 pd.read_* 的结果一样可以修改
+    """
+    with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    mmap_mode = 'r' if mmap else None
+
+    data = {}
+    for i, spec in enumerate(meta['columns']):
+        name = f'c{i}'
+        kind = spec['kind']
+        if kind == 'array':
+            values = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+        elif kind == 'text':
+            values = _decode_text(directory, name, mmap_mode)
+            if spec['dtype'] != 'object':
+                values = pd.array(values, dtype=pd.api.types.pandas_dtype(spec['dtype']))
+        elif kind == 'mixed':
+            values = _decode_mixed(directory, name, mmap_mode)
+        else:
+            with open(os.path.join(directory, f'{name}.pkl'), 'rb') as f:
+                values = pickle.load(f)
+        data[i] = values
+
+    index = None
+    if meta['index']:
+        with open(os.path.join(directory, meta['index']), 'rb') as f:
+            index = pickle.load(f)
+    df = pd.DataFrame(data, index=index, copy=False)
+    df.columns = pd.Index([spec['name'] for spec in meta['columns']],
+                          dtype=object if meta['columns'] else None)
+    return df
+
+
+# ---------------------------------------------------------------------------
+# 按源文件缓存
+# ---------------------------------------------------------------------------
+
+def _snapshot_dir(source, variant, cache_dir):
+    source = os.path.abspath(source)
+    cache_dir = cache_dir or os.path.join(os.path.dirname(source), CACHE_DIR_NAME)
+    key = hashlib.sha256(variant.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, f'{os.path.basename(source)}.{key}')
+
+
+def _source_state(source):
+    stat = os.stat(source)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def cached_frame(source, loader, variant='', cache_dir=None, mmap=False):
+    """
+    读取 source 的数据，优先使用列式缓存
+
+    参数:
+    - source: 源文件路径
+    - loader: 缓存失效时读取源文件的函数，无参数，返回 DataFrame
+    - variant: 读取方式的标识（如读取参数），不同读取方式分别缓存
+    - cache_dir: 缓存目录，默认为源文件所在目录下的 .columnar_cache/
+    - mmap: 命中缓存时是否内存映射数值列（只读），见 read_snapshot
+
+    缓存有效性：源文件的修改时间和大小与记录一致时直接使用；不一致时计算内容哈希，
+    哈希一致（如文件只是被重新保存）则更新记录后使用，否则重新读取源文件并重建快照
+    """
+    directory = _snapshot_dir(source, variant, cache_dir)
+    state_file = os.path.join(directory, 'source.json')
+    state = _source_state(source)
+
+    if os.path.exists(state_file):
+        with open(state_file, 'r', encoding='utf-8') as f:
+            recorded = json.load(f)
+        if recorded.get('variant') == variant and recorded.get('version') == SNAPSHOT_VERSION:
+            if {k: recorded.get(k) for k in state} == state:
+                return read_snapshot(directory, mmap)
+            digest = file_hash(source)
+            if recorded.get('sha256') == digest:
+                recorded.update(state)
+                with open(state_file, 'w', encoding='utf-8') as f:
+                    json.dump(recorded, f, ensure_ascii=False, indent=2)
+                return read_snapshot(directory, mmap)
+        else:
+            digest = file_hash(source)
+    else:
+        digest = file_hash(source)
+
+    df = loader()
+
+    # 先写到临时目录再替换，读取中途失败不会留下不完整的快照
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        write_snapshot(df, staging)
+        with open(os.path.join(staging, 'source.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': SNAPSHOT_VERSION, 'source': os.path.abspath(source), 'variant': variant,
+                       'sha256': digest, **state}, f, ensure_ascii=False, indent=2)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return df
+
+
+def _variant(reader, kwargs):
+    return f"{reader}:{json.dumps(kwargs, ensure_ascii=False, sort_keys=True, default=str)}"
+
+
+def read_excel_cached(path, cache_dir=None, *, mmap=False, **kwargs):
+    """带列式缓存的 pd.read_excel(path, **kwargs)"""
+    return cached_frame(path, lambda: pd.read_excel(path, **kwargs), _variant('read_excel', kwargs), cache_dir,
+                        mmap)
+
+
+def read_csv_cached(path, cache_dir=None, *, mmap=False, **kwargs):
+    """带列式缓存的 pd.read_csv(path, **kwargs)"""
+    return cached_frame(path, lambda: pd.read_csv(path, **kwargs), _variant('read_csv', kwargs), cache_dir, mmap)
+
+
+if __name__ == "__main__":
+    import time
+
+    sources = [
+        ("小企业会计准则 (1).xlsx", lambda: read_excel_cached("小企业会计准则 (1).xlsx", sheet_name=0, header=0)),
+        ("04-参考资料/业务文档/小企业会计准则-默认科目.csv",
+         lambda: read_csv_cached("04-参考资料/业务文档/小企业会计准则-默认科目.csv", encoding='utf-8-sig')),
+    ]
+    for source, load in sources:
+        start = time.perf_counter()
+        df = load()
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        load()
+        second = time.perf_counter() - start
+        print(f"✅ {source}: {df.shape[0]} 行 × {df.shape[1]} 列，"
+              f"首次 {first * 1000:.1f} ms，缓存 {second * 1000:.1f} ms")
@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大模型语义匹配的批量调度（见 基于大模型的二级科目匹配方案.md 批量处理优化）
+1. 把仍未匹配的源科目及其候选科目按 token 预算打包为批量Prompt（"请匹配以下10个科目"）；
+   候选科目先按类别、报表、层级裁剪，批次内共用的候选和父科目等上下文只出现一次（紧凑Prompt）
+2. 用 asyncio 同时发出多个请求：并发数上限、每秒请求数限流、失败重试（指数退避，429按Retry-After等待）
+3. 解析返回的 best_match / candidate_matches JSON，写回中间表 account_mapping_temp 的匹配字段
+
+提供 大模型结果缓存.LLMResultCache 时，打包前先查缓存，只有未命中的科目才调用大模型，新结果写回缓存
+
+接口为 OpenAI Chat Completions 格式；离线测试可使用 大模型模拟服务.StubModelServer
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+from 大模型结果缓存 import cache_key
+from 科目候选裁剪 import DEFAULT_CANDIDATE_LIMIT, CandidatePruner
+from 科目精确匹配 import SOURCE_CODE_FIELD, SOURCE_NAME_FIELD, TARGET_FIELDS, load_target_index, target_table
+from 科目索引 import clean_value, normalize_code
+
+DEFAULT_TOKEN_BUDGET = 2000
+DEFAULT_BATCH_ITEMS = 10
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_TIMEOUT = 60
+
+# 置信度阈值（见 基于大模型的二级科目匹配方案.md 置信度阈值）
+HIGH_CONFIDENCE = 0.9
+MEDIUM_CONFIDENCE = 0.7
+
+PROMPT_HEADER = "你是一个财务科目匹配专家。请为以下{count}个对方系统科目，从各自的候选科目中选出本系统（小企业会计准则）的对应科目：\n\n"
+COMPACT_PROMPT_HEADER = (
+    "你是一个财务科目匹配专家。请为以下{count}个对方系统科目，从各自的候选科目中选出本系统（小企业会计准则）的对应科目。\n"
+    "各科目的候选以编号引用【候选科目】中的本系统科目，其前一行为共用的父科目、类别和余额方向：\n\n"
+)
+PROMPT_FOOTER = (
+    "\n请只返回JSON数组，每个科目一项，格式如下：\n"
+    '[{"no": 1, "source_code": "对方科目编码", '
+    '"best_match": {"target_code": "本系统科目编码", "target_name": "本系统科目名称", "confidence": 0.95, "reason": "匹配依据"}, '
+    '"candidate_matches": [{"target_code": "...", "target_name": "...", "confidence": 0.8, "reason": "..."}]}]\n'
+    "没有合适的候选时 best_match 为 null。\n"
+    "要求：\n"
+    "- 考虑科目编码的层级关系\n"
+    "- 考虑科目名称的语义相似性\n"
+    "- 考虑父科目的关联性\n"
+    "- 考虑科目类别和方向的一致性\n"
+)
+
+
+class LLMError(Exception):
+    """大模型调用失败（可重试）"""
+
+
+class RateLimitError(LLMError):
+    """被限流（HTTP 429）"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ---------------------------------------------------------------------------
+# Prompt
+# ---------------------------------------------------------------------------
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中文等非ASCII字符每字约1个，ASCII字符每4个约1个"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def format_subject(number, item):
+    """批量Prompt中的一个科目（含候选科目）"""
+    lines = [f"{number}. 科目：{item['source_code']} - {item['source_name']}"]
+    if item.get('parent'):
+        lines.append(f"   父科目：{item['parent']}")
+    attributes = [f"{label}：{item[key]}" for key, label in (('type', '类别'), ('direction', '余额方向')) if item.get(key)]
+    if attributes:
+        lines.append('   ' + '；'.join(attributes))
+    for i, candidate in enumerate(item['candidates'], start=1):
+        lines.append(f"   候选{i}：{candidate['code']} - {candidate['name']}")
+    return '\n'.join(lines) + '\n'
+
+
+def build_batch_prompt(items):
+    """批量Prompt"""
+    return (PROMPT_HEADER.format(count=len(items))
+            + ''.join(format_subject(i, item) for i, item in enumerate(items, start=1))
+            + PROMPT_FOOTER)
+
+
+def pack_batches(items, token_budget=DEFAULT_TOKEN_BUDGET, max_items=DEFAULT_BATCH_ITEMS, formatter=format_subject):
+    """
+    按 token 预算把科目打包为批次：每批的Prompt估算 token 数不超过 token_budget，且不超过 max_items 个科目
+    单个科目本身超出预算时单独成批
+    """
+    overhead = estimate_tokens(PROMPT_HEADER.format(count=max_items) + PROMPT_FOOTER)
+    batches, batch, used = [], [], overhead
+    for item in items:
+        cost = estimate_tokens(formatter(len(batch) + 1, item))
+        if batch and (used + cost > token_budget or len(batch) >= max_items):
+            batches.append(batch)
+            batch, used = [], overhead
+        batch.append(item)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _compact_group(item):
+    """紧凑Prompt中同组科目共用的上下文：父科目、类别、余额方向"""
+    attributes = [f"{label}：{item[key]}" for key, label in (('type', '类别'), ('direction', '余额方向'))
+                  if item.get(key)]
+    if item.get('parent'):
+        attributes.insert(0, f"父科目：{item['parent']}")
+    return '；'.join(attributes)
+
+
+def build_compact_prompt(items):
+    """
+    紧凑的批量Prompt：批次内的候选科目只列一次（以 C1、C2… 引用），
+    父科目、类别、余额方向相同的相邻科目共用一行上下文
+    """
+    labels = {}
+    for item in items:
+        for candidate in item['candidates']:
+            labels.setdefault(candidate['code'], (f"C{len(labels) + 1}", candidate['name']))
+    lines = [COMPACT_PROMPT_HEADER.format(count=len(items))]
+    if labels:
+        lines.append('【候选科目】\n')
+        lines.extend(f"{label}：{code} - {name}\n" for code, (label, name) in labels.items())
+        lines.append('\n')
+    lines.append('【对方系统科目】\n')
+    group = None
+    for number, item in enumerate(items, start=1):
+        if _compact_group(item) != group:
+            group = _compact_group(item)
+            if group:
+                lines.append(f"{group}\n")
+        refs = '、'.join(labels[c['code']][0] for c in item['candidates'])
+        lines.append(f"{number}. 科目：{item['source_code']} - {item['source_name']}"
+                     + (f"；候选：{refs}" if refs else '') + '\n')
+    lines.append(PROMPT_FOOTER)
+    return ''.join(lines)
+
+
+def _compact_cost(number, item, labels, group):
+    """科目加入紧凑Prompt的 token 成本：科目行、批次中新出现的候选科目、新的上下文行"""
+    new_codes = [c for c in item['candidates'] if c['code'] not in labels]
+    text = (f"{number}. 科目：{item['source_code']} - {item['source_name']}；候选："
+            + '、'.join(f"C{labels.get(c['code'], len(labels) + 1)}" for c in item['candidates'])
+            + ''.join(f"C{len(labels) + i}：{c['code']} - {c['name']}\n" for i, c in enumerate(new_codes, start=1))
+            + (f"{group}\n" if group else ''))
+    return estimate_tokens(text), new_codes
+
+
+def pack_compact_batches(items, token_budget=DEFAULT_TOKEN_BUDGET, max_items=DEFAULT_BATCH_ITEMS):
+    """
+    紧凑Prompt的打包：同组（父科目、类别、余额方向相同）的科目排在一起，
+    每个科目的 token 成本只计算批次中新出现的候选科目和上下文
+    """
+    overhead = estimate_tokens(COMPACT_PROMPT_HEADER.format(count=max_items) + PROMPT_FOOTER
+                               + '【候选科目】\n\n【对方系统科目】\n')
+    batches, batch = [], []
+    for item in sorted(items, key=_compact_group):
+        group = _compact_group(item)
+        if batch and len(batch) < max_items:
+            cost, new_codes = _compact_cost(len(batch) + 1, item, labels, group if group != last_group else '')
+            if used + cost > token_budget:
+                batches.append(batch)
+                batch = []
+        elif batch:
+            batches.append(batch)
+            batch = []
+        if not batch:
+            labels, used = {}, overhead
+            cost, new_codes = _compact_cost(1, item, labels, group)
+        batch.append(item)
+        used += cost
+        labels.update((c['code'], len(labels) + i) for i, c in enumerate(new_codes, start=1))
+        last_group = group
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def parse_response(content):
+    """
+    解析大模型返回的JSON（允许包在```json代码块或其他文字中）
+    返回: 结果列表，每项含 best_match / candidate_matches
+    """
+    text = content.strip()
+    fenced = re.search(r'```(?:json)?\s*(.*?)```', text, re.S)
+    if fenced:
+        text = fenced.group(1).strip()
+    if not text.startswith(('[', '{')):
+        start = min((i for i in (text.find('['), text.find('{')) if i >= 0), default=-1)
+        if start < 0:
+            raise LLMError(f"返回内容不是JSON: {content[:100]}")
+        text = text[start:]
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text)
+    except json.JSONDecodeError as exc:
+        raise LLMError(f"返回内容不是有效的JSON: {exc}") from None
+    if isinstance(data, dict):
+        data = data.get('results', [data])
+    if not isinstance(data, list):
+        raise LLMError("返回的JSON不是结果列表")
+    return [r for r in data if isinstance(r, dict)]
+
+
+# ---------------------------------------------------------------------------
+# HTTP 客户端（标准库 asyncio，无第三方依赖）
+# ---------------------------------------------------------------------------
+
+def parse_retry_after(value):
+    """
+    解析 Retry-After 响应头，返回需要等待的秒数
+    支持秒数（"120"）和HTTP日期（"Wed, 21 Oct 2015 07:28:00 GMT"）两种格式，无法解析时为 None
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+async def _read_chunked(reader):
+    """读取 Transfer-Encoding: chunked 的响应体（忽略分块扩展和尾部响应头）"""
+    parts = []
+    while True:
+        size = int((await reader.readline()).split(b';')[0].strip(), 16)
+        if size == 0:
+            break
+        parts.append(await reader.readexactly(size))
+        await reader.readline()
+    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+        pass
+    return b''.join(parts)
+
+
+class ChatCompletionClient:
+    """
+    OpenAI Chat Completions 格式的异步客户端
+
+    参数:
+    - url: 完整接口地址，如 http://127.0.0.1:8765/v1/chat/completions
+    - model: 模型名称
+    - api_key: 可选，作为 Bearer token 发送
+    """
+
+    def __init__(self, url, model='gpt-3.5-turbo', api_key=None, timeout=DEFAULT_TIMEOUT, temperature=0):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = parts.scheme == 'https'
+        self.path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.temperature = temperature
+
+    async def complete(self, prompt):
+        """发送Prompt，返回模型回复的文本"""
+        body = json.dumps({'model': self.model, 'temperature': self.temperature,
+                           'messages': [{'role': 'user', 'content': prompt}]}, ensure_ascii=False).encode('utf-8')
+        headers = [f'POST {self.path} HTTP/1.1', f'Host: {self.host}', 'Content-Type: application/json',
+                   f'Content-Length: {len(body)}', 'Connection: close']
+        if self.api_key:
+            headers.append(f'Authorization: Bearer {self.api_key}')
+        try:
+            status, response_headers, payload = await asyncio.wait_for(
+                self._request(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body), self.timeout)
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError) as exc:
+            # ValueError/IndexError: 状态行或分块长度无法解析
+            raise LLMError(f"请求失败: {exc!r}") from None
+
+        if status == 429:
+            raise RateLimitError("请求被限流（429）", parse_retry_after(response_headers.get('retry-after')))
+        if status >= 400:
+            raise LLMError(f"HTTP {status}: {payload[:200].decode('utf-8', 'replace')}")
+        try:
+            return json.loads(payload)['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError) as exc:
+            raise LLMError(f"响应格式不正确: {exc!r}") from None
+
+    async def _request(self, data):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+        try:
+            writer.write(data)
+            await writer.drain()
+            status_line = await reader.readline()
+            status = int(status_line.split()[1])
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip()
+            if 'chunked' in headers.get('transfer-encoding', '').lower():
+                payload = await _read_chunked(reader)
+            elif 'content-length' in headers:
+                payload = await reader.readexactly(int(headers['content-length']))
+            else:
+                payload = await reader.read()
+            return status, headers, payload
+        finally:
+            writer.close()
+
+
+# ---------------------------------------------------------------------------
+# 调度
+# ---------------------------------------------------------------------------
+
+class RateLimiter:
+    """令牌桶限流：平均每秒 rate 个请求，允许 burst 个突发"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BatchScheduler:
+    """
+    批量Prompt的并发调度
+
+    参数:
+    - client: 有 async complete(prompt) -> str 方法的客户端
+    - concurrency: 同时进行的请求数
+    - requests_per_second: 每秒请求数上限，None 为不限
+    - max_retries: 每批最多重试次数
+    - backoff / max_backoff: 指数退避的初始和最大等待秒数（加随机抖动）
+    """
+
+    def __init__(self, client, concurrency=DEFAULT_CONCURRENCY, requests_per_second=None,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=0.5, max_backoff=10.0, seed=None):
+        self.client = client
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(requests_per_second, burst=concurrency) if requests_per_second else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._rng = random.Random(seed)
+        self.stats = {'batches': 0, 'requests': 0, 'retries': 0, 'rate_limited': 0, 'failed_batches': 0,
+                      'prompt_tokens': 0}
+
+    async def run(self, batches, prompt_builder=build_batch_prompt):
+        """
+        执行全部批次，返回与 batches 对应的结果列表：
+        {'items', 'prompt', 'tokens', 'content', 'results', 'error', 'attempts'}，tokens 为Prompt的估算 token 数
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(items):
+            async with semaphore:
+                return await self._run_batch(items, prompt_builder(items))
+
+        self.stats['batches'] += len(batches)
+        return await asyncio.gather(*(run_one(items) for items in batches))
+
+    async def _run_batch(self, items, prompt):
+        outcome = {'items': items, 'prompt': prompt, 'tokens': estimate_tokens(prompt), 'content': None,
+                   'results': [], 'error': None, 'attempts': 0}
+        self.stats['prompt_tokens'] += outcome['tokens']
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                await self.limiter.acquire()
+            outcome['attempts'] = attempt + 1
+            self.stats['requests'] += 1
+            try:
+                content = await self.client.complete(prompt)
+                outcome['content'] = content
+                outcome['results'] = parse_response(content)
+                outcome['error'] = None
+                return outcome
+            except LLMError as exc:
+                outcome['error'] = str(exc)
+                if attempt == self.max_retries:
+                    break
+                self.stats['retries'] += 1
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * (0.5 + self._rng.random())
+                if isinstance(exc, RateLimitError):
+                    self.stats['rate_limited'] += 1
+                    if exc.retry_after is not None:
+                        delay = max(delay, exc.retry_after)
+                await asyncio.sleep(delay)
+        self.stats['failed_batches'] += 1
+        return outcome
+
+
+# ---------------------------------------------------------------------------
+# 与中间表的转换
+# ---------------------------------------------------------------------------
+
+def _candidate_list(value):
+    if isinstance(value, str) and value:
+        try:
+            return [{'code': c['code'], 'name': c['name']} for c in json.loads(value)]
+        except (ValueError, KeyError, TypeError):
+            return []
+    return []
+
+
+def pending_items(result, match_types=('unmatched',)):
+    """中间表中待大模型匹配的科目（行号、源科目信息、候选科目）"""
+    rows = np.flatnonzero(result['match_type'].isin(match_types).to_numpy())
+    columns = {name: result[name].to_numpy(dtype=object) if name in result.columns else None
+               for name in ('source_system_code', 'source_parent_code', 'source_parent_name',
+                            'source_subject_type', 'source_debit_credit', 'candidate_subjects')}
+    codes = result[SOURCE_CODE_FIELD].to_numpy(dtype=object)
+    names = result[SOURCE_NAME_FIELD].to_numpy(dtype=object)
+
+    # 已匹配的源科目 -> 目标科目编码，用于给下级科目提供层级上下文
+    matched_targets = {}
+    if 'target_subject_code' in result.columns:
+        matched = np.flatnonzero(~result['match_type'].isin(('unmatched',)).to_numpy())
+        target_codes = result['target_subject_code'].to_numpy(dtype=object)
+        matched_targets = {normalize_code(codes[row]): clean_value(target_codes[row]) for row in matched}
+
+    items = []
+    for row in rows:
+        get = lambda name: clean_value(columns[name][row]) if columns[name] is not None else ''
+        parent = ' - '.join(v for v in (get('source_parent_code'), get('source_parent_name')) if v)
+        items.append({
+            'row': int(row),
+            'source_system': get('source_system_code'),
+            'source_code': clean_value(codes[row]),
+            'source_name': clean_value(names[row]),
+            'parent': parent,
+            'parent_code': get('source_parent_code'),
+            'parent_name': get('source_parent_name'),
+            'parent_target': matched_targets.get(normalize_code(get('source_parent_code')), ''),
+            'type': get('source_subject_type'),
+            'direction': get('source_debit_credit'),
+            'candidates': _candidate_list(columns['candidate_subjects'][row])
+            if columns['candidate_subjects'] is not None else [],
+        })
+    return items
+
+
+def _confidence_label(confidence):
+    if confidence >= HIGH_CONFIDENCE:
+        return '高'
+    if confidence >= MEDIUM_CONFIDENCE:
+        return '中'
+    return '低'
+
+
+def outcome_answers(outcome):
+    """按序号（其次按源科目编码）把批次回复中的结果对应到批次中的科目 [(科目, 结果或None)]"""
+    by_number = {r.get('no'): r for r in outcome['results'] if r.get('no') is not None}
+    by_code = {clean_value(r.get('source_code')): r for r in outcome['results']}
+    return [(item, by_number.get(number) or by_code.get(item['source_code']))
+            for number, item in enumerate(outcome['items'], start=1)]
+
+
+def apply_llm_results(result, outcomes, target=None):
+    """
+    把大模型的匹配结果写回中间表
+
+    - best_match 的目标科目必须存在于目标科目表，否则视为未匹配
+    - 置信度 ≥0.7 为 matched（≥0.9 高置信度），<0.7 为 pending，需要人工处理
+    - candidate_matches 写入 candidate_subjects，原始回复写入 llm_response
+    """
+    if target is None:
+        target = load_target_index()
+    targets = target_table(target)
+    positions = dict(zip(targets['target_subject_code'], range(len(targets))))
+    result = result.copy()
+    columns = {field: (result[field].to_numpy(dtype=object).copy() if field in result.columns
+                       else np.full(len(result), None, dtype=object))
+               for field in TARGET_FIELDS + ['match_type', 'match_method', 'match_score', 'match_confidence',
+                                             'match_reason', 'candidate_subjects', 'mapping_status', 'llm_response']}
+
+    for outcome in outcomes:
+        for item, answer in outcome_answers(outcome):
+            row = item['row']
+            if answer is None:
+                reason = f"大模型调用失败：{outcome['error']}" if outcome['error'] else '大模型未返回该科目的结果'
+                columns['match_reason'][row] = reason
+                continue
+            columns['llm_response'][row] = json.dumps(answer, ensure_ascii=False)
+            candidates = [{'code': c.get('target_code'), 'name': c.get('target_name'),
+                           'score': c.get('confidence')} for c in answer.get('candidate_matches') or []]
+            columns['candidate_subjects'][row] = json.dumps(candidates, ensure_ascii=False) if candidates else None
+
+            best = answer.get('best_match') or {}
+            position = positions.get(normalize_code(best.get('target_code')))
+            if position is None:
+                columns['match_reason'][row] = ('大模型未给出匹配' if not best else
+                                                f"大模型给出的科目 {best.get('target_code')} 不在目标科目表中")
+                continue
+            try:
+                confidence = min(max(float(best.get('confidence', 0)), 0.0), 1.0)
+            except (TypeError, ValueError):
+                confidence = 0.0
+            for field in TARGET_FIELDS:
+                columns[field][row] = targets[field].iat[position]
+            columns['match_type'][row] = 'semantic_match'
+            columns['match_method'][row] = 'llm_semantic'
+            columns['match_score'][row] = int(round(confidence * 100))
+            columns['match_confidence'][row] = _confidence_label(confidence)
+            columns['mapping_status'][row] = 'matched' if confidence >= MEDIUM_CONFIDENCE else 'pending'
+            columns['match_reason'][row] = f"大模型分析：{best.get('reason') or ''}".rstrip('：')
+
+    for field, values in columns.items():
+        result[field] = values
+    # 输入没有 match_score 列、或大模型未给出结果的行没有分数，按0处理
+    result['match_score'] = result['match_score'].fillna(0).astype(np.int64)
+    return result
+
+
+async def match_with_llm_async(result, client, target=None, token_budget=DEFAULT_TOKEN_BUDGET,
+                               max_items=DEFAULT_BATCH_ITEMS, concurrency=DEFAULT_CONCURRENCY,
+                               requests_per_second=None, max_retries=DEFAULT_MAX_RETRIES,
+                               cache=None, source_system='', candidate_limit=DEFAULT_CANDIDATE_LIMIT):
+    """
+    对中间表中仍未匹配的科目执行大模型匹配
+
+    参数:
+    - cache: 大模型结果缓存.LLMResultCache，命中的科目直接使用缓存结果，不再调用大模型
+    - source_system: 源系统编码（中间表没有 source_system_code 列时用于缓存键）
+    - candidate_limit: 候选科目按类别、报表、层级裁剪后保留的个数，并使用紧凑Prompt
+      （见 科目候选裁剪.py、build_compact_prompt）；None 为不裁剪，使用原始的逐科目Prompt
+
+    返回: (新的中间表 DataFrame, 调度统计)
+    """
+    if target is None:
+        target = load_target_index()
+    items = pending_items(result)
+    start = time.perf_counter()
+
+    cached = []
+    if cache is not None:
+        keys = [cache_key(item, source_system) for item in items]
+        found = cache.get_many(keys)
+        misses = []
+        for item, key in zip(items, keys):
+            entry = found.get(key)
+            if entry is None:
+                misses.append(dict(item, cache_key=key))
+            else:
+                cached.append({'items': [item], 'prompt': None, 'content': entry[1],
+                               'results': [dict(entry[0], no=1)], 'error': None, 'attempts': 0})
+        items = misses
+
+    if candidate_limit is None:
+        batches, prompt_builder = pack_batches(items, token_budget, max_items), build_batch_prompt
+    else:
+        items = CandidatePruner(target, candidate_limit).prune(items)
+        batches, prompt_builder = pack_compact_batches(items, token_budget, max_items), build_compact_prompt
+    scheduler = BatchScheduler(client, concurrency, requests_per_second, max_retries)
+    outcomes = await scheduler.run(batches, prompt_builder)
+    if cache is not None:
+        cache.put_many((item['cache_key'], {k: v for k, v in answer.items() if k != 'no'}, outcome['content'])
+                       for outcome in outcomes for item, answer in outcome_answers(outcome) if answer is not None)
+
+    stats = dict(scheduler.stats, subjects=len(items) + len(cached), cache_hits=len(cached),
+                 elapsed=time.perf_counter() - start)
+    return apply_llm_results(result, cached + list(outcomes), target), stats
+
+
+def match_with_llm(result, client, **options):
+    """match_with_llm_async 的同步版本"""
+    return asyncio.run(match_with_llm_async(result, client, **options))
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from 大模型模拟服务 import StubModelServer
+    from 大模型结果缓存 import LLMResultCache
+    from 科目候选生成 import fill_candidates
+    from 科目层级匹配 import match_traditional
+
+    async def demo():
+        index = load_target_index()
+        chart = target_table(index)
+        rng = np.random.default_rng(0)
+        picks = rng.integers(0, len(chart), 500)
+        source = pd.DataFrame({
+            'source_subject_code': [f"S{i:04d}" for i in range(len(picks))],
+            'source_subject_name': chart['target_subject_name'].to_numpy(dtype=object)[picks] + '（旧）',
+            'source_parent_code': chart['target_parent_code'].to_numpy(dtype=object)[picks],
+            'source_parent_name': chart['target_parent_name'].to_numpy(dtype=object)[picks],
+            'source_subject_type': chart['target_subject_type'].to_numpy(dtype=object)[picks],
+            'source_debit_credit': chart['target_debit_credit'].to_numpy(dtype=object)[picks],
+        })
+        result = fill_candidates(match_traditional(source, index), index, k=10)
+
+        # Prompt大小：整个科目表作为候选（原始模板） / 逐科目列出候选 / 裁剪后的紧凑Prompt
+        items = pending_items(result)
+        answers = dict(zip(range(len(picks)), chart['target_subject_code'].to_numpy(dtype=object)[picks]))
+        whole_chart = [{'code': c, 'name': n} for c, n in zip(chart['target_subject_code'], chart['target_subject_name'])]
+        pruned = CandidatePruner(index).prune(items)
+        variants = [
+            ('整个科目表', [dict(item, candidates=whole_chart) for item in items], pack_batches, build_batch_prompt),
+            ('逐科目候选', items, pack_batches, build_batch_prompt),
+            ('紧凑Prompt', pruned, pack_compact_batches, build_compact_prompt),
+        ]
+        for label, variant, packer, builder in variants:
+            tokens = [estimate_tokens(builder(batch)) for batch in packer(variant, 100000, DEFAULT_BATCH_ITEMS)]
+            recall = np.mean([answers[item['row']] in {c['code'] for c in item['candidates']} for item in variant])
+            first = np.mean([bool(item['candidates']) and item['candidates'][0]['code'] == answers[item['row']]
+                             for item in variant])
+            print(f"📊 {label}: {len(tokens)} 批，共 {sum(tokens)} tokens，平均每批 {np.mean(tokens):.0f}，"
+                  f"候选包含正确科目 {recall:.1%}，首位为正确科目 {first:.1%}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = LLMResultCache(f'{directory}/llm_results.sqlite3')
+            async with StubModelServer(port=0, latency=0.2, per_item_latency=0.01, rate_limit=20,
+                                       error_rate=0.05) as server:
+                client = ChatCompletionClient(server.url, model='stub')
+                # 第二轮相同的科目全部命中缓存，不再调用大模型
+                for _ in range(2):
+                    matched, stats = await match_with_llm_async(result, client, index, concurrency=8,
+                                                                requests_per_second=15, cache=cache,
+                                                                source_system='DEMO')
+                    print(f"✅ 大模型匹配完成: {stats['subjects']} 个科目（缓存命中 {stats['cache_hits']}），"
+                          f"{stats['batches']} 批，{stats['requests']} 次请求（重试 {stats['retries']}，"
+                          f"限流 {stats['rate_limited']}，失败 {stats['failed_batches']} 批），"
+                          f"耗时 {stats['elapsed']:.2f} 秒，{stats['subjects'] / stats['elapsed'] * 60:.0f} 个科目/分钟")
+            print(f"📊 匹配类型: {matched['match_type'].value_counts().to_dict()}")
+            print(f"📊 置信度: {matched['match_confidence'].value_counts().to_dict()}")
+            print(f"📊 模拟服务: {server.stats}")
+            print(f"📊 缓存: {cache.stats}，{cache.info()}")
+            cache.close()
+
+    asyncio.run(demo())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地大模型模拟服务（仅用于离线测试匹配调度的吞吐量）
+提供与 OpenAI Chat Completions 相同格式的 POST /v1/chat/completions 接口，
+从批量Prompt中解析出各源科目及其候选科目，返回 best_match / candidate_matches 结构的JSON
+
+可模拟：
+- 响应延迟：基础延迟 + 每个科目的处理时间
+- 限流：每秒请求数超过 rate_limit 时返回 429（带 Retry-After）
+- 偶发故障：按 error_rate 返回 500
+
+用法：python 大模型模拟服务.py [端口]
+"""
+
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# 与 大模型匹配调度.build_batch_prompt / build_compact_prompt 的格式对应
+_SUBJECT_LINE = re.compile(r'^(\d+)\. 科目：(.+?) - (.*?)(?:；候选：(.*))?$')
+_CANDIDATE_LINE = re.compile(r'^\s+候选\d+：(.+?) - (.*)$')
+_LABEL_LINE = re.compile(r'^(C\d+)：(.+?) - (.*)$')
+
+
+def parse_prompt(prompt):
+    """从批量Prompt中解析源科目及其候选科目 [(序号, 编码, 名称, [(候选编码, 候选名称)])]"""
+    subjects = []
+    labels = {}
+    for line in prompt.splitlines():
+        match = _LABEL_LINE.match(line)
+        if match:
+            labels[match.group(1)] = (match.group(2), match.group(3))
+            continue
+        match = _SUBJECT_LINE.match(line)
+        if match:
+            refs = match.group(4).split('、') if match.group(4) else []
+            subjects.append((int(match.group(1)), match.group(2), match.group(3),
+                             [labels[r] for r in refs if r in labels]))
+            continue
+        match = _CANDIDATE_LINE.match(line)
+        if match and subjects:
+            subjects[-1][3].append((match.group(1), match.group(2)))
+    return subjects
+
+
+def fake_answer(subjects, rng):
+    """模拟的匹配结果：第一个候选为最佳匹配，其余为候选匹配"""
+    results = []
+    for number, code, name, candidates in subjects:
+        result = {'no': number, 'source_code': code, 'source_name': name, 'best_match': None, 'candidate_matches': []}
+        if candidates:
+            confidence = round(rng.uniform(0.6, 0.99), 2)
+            target_code, target_name = candidates[0]
+            result['best_match'] = {'target_code': target_code, 'target_name': target_name,
+                                    'confidence': confidence, 'reason': '名称语义相近（模拟）'}
+            result['candidate_matches'] = [
+                {'target_code': c, 'target_name': n, 'confidence': round(confidence * 0.8 ** (i + 1), 2),
+                 'reason': '候选（模拟）'}
+                for i, (c, n) in enumerate(candidates[1:3])
+            ]
+        results.append(result)
+    return results
+
+
+class StubModelServer:
+    """
+    模拟大模型服务
+
+    参数:
+    - latency: 每次请求的基础延迟（秒）
+    - per_item_latency: 每个科目增加的延迟（秒）
+    - rate_limit: 每秒最多处理的请求数，超出返回429；None 为不限流
+    - error_rate: 随机返回500的比例
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, latency=0.2, per_item_latency=0.01,
+                 rate_limit=None, error_rate=0.0, seed=0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._window = []
+        self._server = None
+        self.stats = {'requests': 0, 'rate_limited': 0, 'errors': 0, 'subjects': 0}
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/v1/chat/completions'
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def _rate_limited(self):
+        if self.rate_limit is None:
+            return False
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < 1.0]
+        if len(self._window) >= self.rate_limit:
+            return True
+        self._window.append(now)
+        return False
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            self.stats['requests'] += 1
+
+            method, path, _ = request_line.decode('latin-1').split(' ', 2)
+            if method != 'POST' or path != '/v1/chat/completions':
+                await self._respond(writer, 404, {'error': {'message': 'not found'}})
+                return
+            if self._rate_limited():
+                self.stats['rate_limited'] += 1
+                await self._respond(writer, 429, {'error': {'message': 'rate limit exceeded'}},
+                                    {'Retry-After': '1'})
+                return
+            if self._rng.random() < self.error_rate:
+                self.stats['errors'] += 1
+                await self._respond(writer, 500, {'error': {'message': 'internal error (simulated)'}})
+                return
+
+            payload = json.loads(body)
+            prompt = '\n'.join(m.get('content', '') for m in payload.get('messages', []))
+            subjects = parse_prompt(prompt)
+            self.stats['subjects'] += len(subjects)
+            await asyncio.sleep(self.latency + self.per_item_latency * len(subjects))
+            content = json.dumps(fake_answer(subjects, self._rng), ensure_ascii=False)
+            await self._respond(writer, 200, {
+                'model': payload.get('model', 'stub'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(prompt), 'completion_tokens': len(content)},
+            })
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        reason = {200: 'OK', 404: 'Not Found', 429: 'Too Many Requests', 500: 'Internal Server Error'}[status]
+        lines = [f'HTTP/1.1 {status} {reason}', 'Content-Type: application/json; charset=utf-8',
+                 f'Content-Length: {len(body)}', 'Connection: close']
+        lines += [f'{k}: {v}' for k, v in (headers or {}).items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(port=DEFAULT_PORT, **options):
+    server = await StubModelServer(port=port, **options).start()
+    print(f"✅ 模拟大模型服务已启动: {server.url}")
+    await server._server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT, rate_limit=20, error_rate=0.02))
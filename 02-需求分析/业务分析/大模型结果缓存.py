@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大模型匹配结果缓存（见 基于大模型的二级科目匹配方案.md 成本优化：缓存相同来源系统、相似科目的匹配结果）
+每次导账都会遇到同样的科目（银行存款、应交税费的各个明细等），大模型只需回答一次：
+- 键：(源系统编码, 规范化科目编码, 规范化科目名称, 父科目, 类别, 借贷方向, 候选科目集合指纹) 的哈希
+- 值：该科目解析后的匹配结果（best_match / candidate_matches）和大模型的原始回复
+- 存储：本地 SQLite 文件，过期（TTL）和超出容量（条数、字节数）时按最近最少使用淘汰
+
+大模型匹配调度.match_with_llm_async 在打包批次之前先查缓存，命中的科目不再调用大模型
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from 科目索引 import clean_value, normalize_code, normalize_name
+
+DEFAULT_CACHE_FILE = "04-参考资料/业务文档/.llm_cache/llm_results.sqlite3"
+DEFAULT_TTL = 90 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 200000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# 键的组成或结果格式变化时递增，旧缓存自然失效
+CACHE_VERSION = 1
+
+# SQLite 单条语句的参数个数有上限，批量查询按此分组
+_QUERY_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_result_cache (
+    cache_key    TEXT PRIMARY KEY,
+    result       TEXT NOT NULL,
+    llm_response TEXT,
+    size         INTEGER NOT NULL,
+    created_at   REAL NOT NULL,
+    accessed_at  REAL NOT NULL,
+    hit_count    INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_result_cache_accessed ON llm_result_cache (accessed_at);
+CREATE INDEX IF NOT EXISTS idx_llm_result_cache_created ON llm_result_cache (created_at);
+"""
+
+
+# ---------------------------------------------------------------------------
+# 缓存键
+# ---------------------------------------------------------------------------
+
+def candidate_fingerprint(candidates):
+    """候选科目集合的指纹（与顺序无关）；候选不同，大模型的回答也可能不同"""
+    codes = sorted({normalize_code(c.get('code')) for c in candidates or []} - {''})
+    return hashlib.sha256('\n'.join(codes).encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(item, source_system=''):
+    """
+    科目的缓存键
+
+    参数:
+    - item: 大模型匹配调度.pending_items 返回的科目
+    - source_system: 源系统编码，item 中没有 source_system 时使用
+    """
+    parts = [
+        CACHE_VERSION,
+        clean_value(item.get('source_system')) or clean_value(source_system),
+        normalize_code(item.get('source_code')),
+        normalize_name(item.get('source_name')),
+        normalize_name(item.get('parent')),
+        normalize_name(item.get('type')),
+        normalize_name(item.get('direction')),
+        candidate_fingerprint(item.get('candidates')),
+    ]
+    key = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# 缓存
+# ---------------------------------------------------------------------------
+
+class LLMResultCache:
+    """
+    大模型匹配结果缓存（SQLite）
+
+    参数:
+    - path: 缓存文件路径，':memory:' 为仅内存
+    - ttl: 结果的有效期（秒），None 为不过期
+    - max_entries / max_bytes: 容量上限，超出时淘汰最久未被命中的结果
+
+    stats 记录 hits / misses / writes / expired / evicted
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'expired': 0, 'evicted': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _expiry(self, now):
+        return now - self.ttl if self.ttl is not None else None
+
+    def get_many(self, keys):
+        """批量查询，返回 {键: (解析后的结果, 原始回复)}；命中的结果刷新最近使用时间"""
+        now = time.time()
+        expiry = self._expiry(now)
+        unique = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(unique), _QUERY_CHUNK):
+            chunk = unique[start:start + _QUERY_CHUNK]
+            rows = self._conn.execute(
+                f"SELECT cache_key, result, llm_response, created_at FROM llm_result_cache "
+                f"WHERE cache_key IN ({','.join('?' * len(chunk))})", chunk)
+            for key, result, raw, created_at in rows:
+                if expiry is None or created_at >= expiry:
+                    found[key] = (json.loads(result), raw)
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE llm_result_cache SET accessed_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                [(now, key) for key in found])
+        hits = sum(key in found for key in keys)
+        self.stats['hits'] += hits
+        self.stats['misses'] += len(keys) - hits
+        return found
+
+    def get(self, key):
+        """查询单个科目，未命中返回 None"""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries):
+        """批量写入 [(键, 解析后的结果, 原始回复)]，写入后按容量淘汰"""
+        now = time.time()
+        rows = []
+        for key, result, raw in entries:
+            text = json.dumps(result, ensure_ascii=False)
+            size = len(text.encode('utf-8')) + len((raw or '').encode('utf-8'))
+            rows.append((key, text, raw, size, now, now))
+        if not rows:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO llm_result_cache "
+                "(cache_key, result, llm_response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.stats['writes'] += len(rows)
+        self.evict()
+
+    def put(self, key, result, raw=None):
+        self.put_many([(key, result, raw)])
+
+    def evict(self):
+        """删除过期结果；超出条数或字节数上限时，从最久未被命中的结果开始删除"""
+        with self._conn:
+            expiry = self._expiry(time.time())
+            if expiry is not None:
+                self.stats['expired'] += self._conn.execute(
+                    "DELETE FROM llm_result_cache WHERE created_at < ?", (expiry,)).rowcount
+
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_result_cache").fetchone()
+            excess_entries = max(0, count - self.max_entries) if self.max_entries is not None else 0
+            excess_bytes = max(0, total - self.max_bytes) if self.max_bytes is not None else 0
+            if not excess_entries and not excess_bytes:
+                return
+
+            victims = []
+            rows = self._conn.execute("SELECT cache_key, size FROM llm_result_cache ORDER BY accessed_at")
+            for key, size in rows:
+                if len(victims) >= excess_entries and excess_bytes <= 0:
+                    break
+                victims.append((key,))
+                excess_bytes -= size
+            self._conn.executemany("DELETE FROM llm_result_cache WHERE cache_key = ?", victims)
+            self.stats['evicted'] += len(victims)
+
+    def clear(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM llm_result_cache")
+
+    def info(self):
+        """缓存现状：条数、字节数、累计命中次数"""
+        count, total, hits = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hit_count), 0) FROM llm_result_cache").fetchone()
+        return {'entries': count, 'bytes': total, 'total_hits': hits}
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LLMResultCache(os.path.join(directory, 'cache.sqlite3'), max_entries=1000)
+        items = [{'source_system': 'U8', 'source_code': f'1002.{i:02d}', 'source_name': f'银行存款-账户{i}',
+                  'parent': '1002 - 银行存款', 'type': '资产', 'direction': '借',
+                  'candidates': [{'code': '1002', 'name': '银行存款'}]} for i in range(1500)]
+        keys = [cache_key(item) for item in items]
+        start = time.perf_counter()
+        cache.put_many((key, {'best_match': {'target_code': '1002', 'confidence': 0.95}}, '[]') for key in keys)
+        found = cache.get_many(keys)
+        print(f"✅ 写入 {len(keys)} 条、查询命中 {len(found)} 条，耗时 {time.perf_counter() - start:.3f} 秒")
+        print(f"📊 统计: {cache.stats}，现状: {cache.info()}")
+        cache.close()
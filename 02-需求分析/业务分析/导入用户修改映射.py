@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+读取用户审核后的科目映射对比Excel，提取用户操作区域（AA-AD列）的修改
+以只读流式方式逐行读取（只读模式仍按行解析整张表；行内只取从第一列到用户操作这一段，
+再按表头位置取出源系统科目编码和用户操作区域的5列），输出每个源科目需要写回中间表
+account_mapping_temp 的字段，由 apply_user_updates 按 MappingStore.update 集合更新
+"""
+
+from openpyxl import load_workbook
+import os
+
+import pandas as pd
+
+SHEET_NAME = '映射对比表'
+
+# 需要读取的列：源系统科目编码（定位映射记录）+ 用户操作区域
+SOURCE_KEY_COLUMN = '源系统科目编码'
+USER_OPERATION_COLUMNS = ['用户修改目标编码', '用户修改目标名称', '用户备注', '用户操作']
+
+# 用户操作 -> 映射状态（mapping_status）
+USER_OPERATION_STATUS = {
+    '确认': 'confirmed',
+    '拒绝': 'rejected',
+    '跳过': 'skipped',
+    '待处理': None,
+}
+
+# 导出Excel时用户操作列的默认值
+PENDING_OPERATION = '待处理'
+
+
+def _cell_text(value):
+    """单元格值转为去空格的文本，空单元格为''；数字编码（如1001.0）还原为'1001'"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _locate_columns(header_row):
+    """根据表头定位需要的列，返回 {Excel列名: 列序号(0起)}"""
+    headers = [_cell_text(v) for v in header_row]
+    positions = {}
+    for name in [SOURCE_KEY_COLUMN, *USER_OPERATION_COLUMNS]:
+        if name not in headers:
+            raise ValueError(f"'{SHEET_NAME}' 缺少列: {name}")
+        positions[name] = headers.index(name)
+    return positions
+
+
+def _changed_fields(operation, target_code, target_name, remark):
+    """一行用户修改实际要更新的中间表字段；未填写的内容和待处理不出现在结果中"""
+    fields = {}
+    if target_code or target_name:
+        if target_code:
+            fields['target_subject_code'] = target_code
+        if target_name:
+            fields['target_subject_name'] = target_name
+        fields.update(is_modified=1, match_type='manual_mapping', match_method='manual')
+    if remark:
+        fields['remark'] = remark
+    status = USER_OPERATION_STATUS[operation]
+    if status is not None:
+        fields.update(mapping_status=status, is_confirmed=1 if status == 'confirmed' else 0)
+    return fields
+
+
+def iter_user_updates(excel_file, mapping_batch_id=None):
+    """
+    逐行读取用户修改，只输出需要更新的记录
+
+    只有用户操作不是"待处理"，或用户修改目标编码/名称/备注有值的行才会输出
+
+    参数:
+    - excel_file: 用户上传的映射对比Excel文件
+    - mapping_batch_id: 映射批次ID，写入每条记录
+
+    输出的每条记录:
+    - mapping_batch_id, source_subject_code: 定位中间表中的映射记录
+    - set: 要更新的中间表字段 {字段: 值}，只包含这一行实际修改的字段（其余字段保持中间表原值）：
+      - 填写了用户修改目标编码/名称：填写的 target_subject_code / target_subject_name，
+        以及 is_modified=1、match_type=manual_mapping、match_method=manual
+      - 填写了用户备注：remark
+      - 确认/拒绝/跳过：mapping_status 和 is_confirmed（确认为1，拒绝、跳过为0）；待处理不改状态
+    - operation: 用户操作
+    - excel_row: Excel中的行号，便于定位问题（不写入中间表）
+    """
+    wb = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        ws = wb[SHEET_NAME]
+        header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), None)
+        if header_row is None:
+            return
+        positions = _locate_columns(header_row)
+
+        # 只取到最后一个需要的列为止，行内再按位置取值
+        min_col = min(positions.values()) + 1
+        max_col = max(positions.values()) + 1
+        offsets = {name: pos - (min_col - 1) for name, pos in positions.items()}
+        key_offset = offsets[SOURCE_KEY_COLUMN]
+        code_offset = offsets['用户修改目标编码']
+        name_offset = offsets['用户修改目标名称']
+        remark_offset = offsets['用户备注']
+        operation_offset = offsets['用户操作']
+
+        for excel_row, values in enumerate(
+                ws.iter_rows(min_row=2, min_col=min_col, max_col=max_col, values_only=True), start=2):
+            # 末尾的空行在只读模式下可能返回较短的元组
+            if len(values) <= max(offsets.values()):
+                values = tuple(values) + (None,) * (max(offsets.values()) + 1 - len(values))
+
+            target_code = _cell_text(values[code_offset])
+            target_name = _cell_text(values[name_offset])
+            remark = _cell_text(values[remark_offset])
+            operation = _cell_text(values[operation_offset]) or PENDING_OPERATION
+
+            if operation == PENDING_OPERATION and not (target_code or target_name or remark):
+                continue
+
+            source_code = _cell_text(values[key_offset])
+            if not source_code:
+                raise ValueError(f"第{excel_row}行: 源系统科目编码为空，无法定位映射记录")
+            if operation not in USER_OPERATION_STATUS:
+                raise ValueError(f"第{excel_row}行: 无效的用户操作 '{operation}'，"
+                                 f"可选值: {'/'.join(USER_OPERATION_STATUS)}")
+
+            yield {
+                'mapping_batch_id': mapping_batch_id,
+                'source_subject_code': source_code,
+                'set': _changed_fields(operation, target_code, target_name, remark),
+                'operation': operation,
+                'excel_row': excel_row,
+            }
+    finally:
+        wb.close()
+
+
+def iter_user_update_batches(excel_file, mapping_batch_id=None, batch_size=1000):
+    """按批输出用户修改记录（每批最多 batch_size 条），便于批量更新中间表"""
+    batch = []
+    for record in iter_user_updates(excel_file, mapping_batch_id):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def apply_user_updates(store, batch_id, records):
+    """
+    把用户修改写回中间表
+    同一源科目出现多次时后面的行覆盖前面的同名字段；按要更新的字段组合分组，每组一次 MappingStore.update
+
+    参数:
+    - store: 映射中间表存储.MappingStore
+    - batch_id: 映射批次ID
+    - records: iter_user_updates 输出的记录
+
+    返回: 更新的行数
+    """
+    changes = {}
+    for record in records:
+        changes.setdefault(record['source_subject_code'], {}).update(record['set'])
+    groups = {}
+    for code, fields in changes.items():
+        if fields:
+            groups.setdefault(tuple(fields), []).append({'source_subject_code': code, **fields})
+    return sum(store.update(batch_id, pd.DataFrame(rows), list(fields)) for fields, rows in groups.items())
+
+
+if __name__ == "__main__":
+    # 示例：读取用户修改后的映射对比表
+    excel_file = os.path.join("06-输出物/其他输出", "科目映射对比表_示例.xlsx")
+
+    total = 0
+    operation_stats = {}
+    for batch in iter_user_update_batches(excel_file, mapping_batch_id='BATCH001'):
+        for record in batch:
+            operation_stats[record['operation']] = operation_stats.get(record['operation'], 0) + 1
+        total += len(batch)
+
+    print(f"✅ 读取用户修改: {excel_file}")
+    print(f"   - 需要更新的记录: {total} 条")
+    for operation, count in operation_stats.items():
+        print(f"   - {operation}: {count} 条")
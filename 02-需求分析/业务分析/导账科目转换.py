@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导账科目转换（见 科目映射中间表设计方案.md 确认后处理：确认的映射关系用于后续导账处理流程）
+按已确认的映射把源系统的余额表、凭证明细转换为本系统科目：
+1. 映射：从中间表 account_mapping_temp 读取已确认（is_confirmed=1、export_flag=1）的映射，
+   编译为紧凑的查找数组（源科目编码的 pd.Index + 目标科目在科目表中的位置 int32）
+2. 转换：明细文件按固定行数分块读取，科目编码、对方科目编码整列查找替换；
+   辅助核算类型中的 "往来单位/客商" 按目标科目的辅助核算改为 客户/供应商，辅助核算编码可按对照表整列替换
+3. 输出：转换后的行按块写出；未映射、一对多未拆分、缺少必要辅助核算的行写入例外文件，不进入导账
+4. 拆分：目标为需拆分的父科目（如 1901）的行交给 科目拆分.SplitEngine（规则按转换后的科目编码匹配）
+
+内存只与映射表和一块明细的大小有关，与账簿总行数无关
+"""
+
+import numpy as np
+import pandas as pd
+
+from 数据导出 import CsvWriter
+from 映射中间表存储 import MAPPING_TABLE
+from 科目拆分 import CHUNK_SIZE, COUNTERPART_FIELD, SUBJECT_FIELD
+from 科目索引 import clean_value
+from 科目精确匹配 import SOURCE_CODE_FIELD, load_target_index, normalize_code_column
+
+# 明细行的可选字段：科目名称、辅助核算类型、辅助核算编码
+SUBJECT_NAME_FIELD = 'subject_name'
+AUXILIARY_TYPE_FIELD = 'auxiliary_type'
+AUXILIARY_CODE_FIELD = 'auxiliary_code'
+
+# 转换后追加的字段：源科目编码、源科目名称；例外文件追加例外原因
+SOURCE_SUBJECT_FIELD = 'source_subject_code'
+SOURCE_SUBJECT_NAME_FIELD = 'source_subject_name'
+EXCEPTION_FIELD = 'exception_reason'
+
+# 源系统的往来类辅助核算，按目标科目的辅助核算（1122 客户、2202 供应商）确定
+PARTNER_AUXILIARY_TYPES = ('往来单位', '客商', '往来')
+# 其余辅助核算类型的别名
+AUXILIARY_ALIASES = {'物料': '存货', '商品': '存货', '存货档案': '存货', '客户档案': '客户', '供应商档案': '供应商'}
+
+# 例外原因
+UNMAPPED = '科目未映射'
+AMBIGUOUS = '一对多映射未配置拆分规则'
+UNKNOWN_TARGET = '目标科目不在科目表中'
+MISSING_AUXILIARY = '缺少必要的辅助核算'
+
+# 查找数组中目标位置的特殊值
+_UNMAPPED = -3
+_AMBIGUOUS = -2
+_UNKNOWN = -1
+
+
+def read_confirmed_mapping(conn, batch_id, chunk_size=CHUNK_SIZE, placeholder='?'):
+    """
+    读取一个批次已确认、进入导账的映射（fetchmany 分块）
+
+    返回: DataFrame（source_subject_code、target_subject_code）
+    """
+    cursor = conn.cursor()
+    rows = []
+    try:
+        cursor.execute(f"SELECT source_subject_code, target_subject_code FROM {MAPPING_TABLE} "
+                       f"WHERE mapping_batch_id = {placeholder} AND is_confirmed = 1 AND export_flag = 1",
+                       (batch_id,))
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            rows.extend(chunk)
+    finally:
+        cursor.close()
+    return pd.DataFrame(rows, columns=[SOURCE_CODE_FIELD, 'target_subject_code'])
+
+
+def _clean_column(values, aliases=None):
+    """整列清洗（每个不同的值只清洗一次），可按别名替换"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+    cleaned = [clean_value(v) for v in uniques]
+    if aliases:
+        cleaned = [aliases.get(v, v) for v in cleaned]
+    return np.array(cleaned, dtype=object)[codes] if len(cleaned) else np.array([], dtype=object)
+
+
+class MappingLookup:
+    """
+    已确认映射的查找数组
+
+    参数:
+    - mapping: DataFrame（source_subject_code、target_subject_code）
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    - split_codes: 需拆分的目标父科目编码；映射到多个目标科目的源科目只有在目标都属于同一个需拆分的科目时才能转换，
+      此时转换为该父科目，由拆分引擎分配到子科目
+
+    同一源科目确认了多个不同目标（一对多）且不能拆分时，该科目的行进入例外文件
+    """
+
+    def __init__(self, mapping, target=None, split_codes=()):
+        if target is None:
+            target = load_target_index()
+        records = list(target)
+        self.target_codes = np.array([r.code for r in records], dtype=object)
+        self.target_names = np.array([r.name for r in records], dtype=object)
+        self.target_auxiliary = np.array([r.auxiliary for r in records], dtype=object)
+        self.target_required = np.array([r.auxiliary_required == '是' for r in records])
+        self.chart = chart = pd.Index(self.target_codes)
+
+        source = normalize_code_column(mapping[SOURCE_CODE_FIELD])
+        targets = normalize_code_column(mapping['target_subject_code'])
+        pairs = pd.DataFrame({'source': source, 'target': targets}).drop_duplicates()
+        pairs = pairs[(pairs['source'] != '') & (pairs['target'] != '')]
+        position = chart.get_indexer(pairs['target'])
+
+        # 一对多：同一源科目的多个目标都在同一个需拆分的父科目之下时转换为该父科目；
+        # 只有一个目标的映射（包括直接映射到子科目的）保持不变，不能再交给拆分引擎重新分配
+        sources = pairs['source'].to_numpy(dtype=object)
+        multiple = pairs.groupby('source')['target'].transform('size').to_numpy() > 1
+        for code in normalize_code_column(pd.Series(list(split_codes), dtype=object)):
+            if code in chart:
+                under = pairs['target'].str.startswith(code).to_numpy(dtype=bool)
+                all_under = pd.Series(under).groupby(sources).transform('all').to_numpy(dtype=bool)
+                position = np.where(multiple & all_under, chart.get_loc(code), position)
+        pairs = pairs.assign(position=position).drop_duplicates(['source', 'position'])
+
+        counts = pairs.groupby('source')['position'].transform('size').to_numpy()
+        pairs['position'] = np.where(counts > 1, _AMBIGUOUS, pairs['position'].to_numpy())
+        pairs = pairs.drop_duplicates('source')
+        self.sources = pd.Index(pairs['source'].to_numpy(dtype=object))
+        self.positions = pairs['position'].to_numpy(dtype=np.int32)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def resolve(self, codes):
+        """源科目编码（已规范化）-> 目标科目位置；未映射为 -3，一对多为 -2，目标不在科目表中为 -1"""
+        hit = self.sources.get_indexer(codes)
+        return np.where(hit >= 0, self.positions[np.maximum(hit, 0)], _UNMAPPED)
+
+
+class LedgerTranslator:
+    """
+    明细行转换器：translate() 逐块转换，返回 (转换后的行, 例外行)
+
+    参数:
+    - lookup: MappingLookup
+    - splitter: 可选，科目拆分.SplitEngine，对转换后的行按目标父科目拆分
+    - auxiliary_map: 可选，辅助核算编码对照表 DataFrame（auxiliary_type、source_auxiliary_code、target_auxiliary_code），
+      auxiliary_type 为转换后的辅助核算类型
+    """
+
+    def __init__(self, lookup, splitter=None, auxiliary_map=None):
+        self.lookup = lookup
+        self.splitter = splitter
+        self.auxiliary_keys = None
+        if auxiliary_map is not None and len(auxiliary_map):
+            keys = self._auxiliary_key(auxiliary_map['auxiliary_type'], auxiliary_map['source_auxiliary_code'])
+            unique = ~pd.Index(keys).duplicated()
+            self.auxiliary_keys = pd.Index(keys[unique])
+            self.auxiliary_values = _clean_column(auxiliary_map['target_auxiliary_code'])[unique]
+        self.stats = {'lines': 0, 'translated': 0, 'output_lines': 0, 'exceptions': {}}
+
+    @staticmethod
+    def _auxiliary_key(types, codes):
+        return (pd.Series(_clean_column(types)) + '\x1f' + pd.Series(_clean_column(codes))).to_numpy(dtype=object)
+
+    def translate(self, chunk):
+        """
+        转换一块明细行
+
+        返回: (translated, exceptions)
+        - translated: 科目编码、对方科目编码、科目名称改为本系统科目，另加 source_subject_code、source_subject_name
+        - exceptions: 不能转换的原始行，另加 exception_reason
+        """
+        chunk = chunk.reset_index(drop=True)
+        lookup = self.lookup
+        codes = normalize_code_column(chunk[SUBJECT_FIELD])
+        position = lookup.resolve(codes)
+        reason = np.full(len(chunk), '', dtype=object)
+        reason[position == _UNMAPPED] = UNMAPPED
+        reason[position == _AMBIGUOUS] = AMBIGUOUS
+        reason[position == _UNKNOWN] = UNKNOWN_TARGET
+        take = np.maximum(position, 0)
+
+        auxiliary = None
+        if AUXILIARY_TYPE_FIELD in chunk.columns:
+            types = _clean_column(chunk[AUXILIARY_TYPE_FIELD], AUXILIARY_ALIASES)
+            dimension = lookup.target_auxiliary[take]
+            partner = np.isin(types, PARTNER_AUXILIARY_TYPES) & (dimension != '')
+            types = np.where(partner, dimension, types)
+            values = _clean_column(chunk[AUXILIARY_CODE_FIELD]) \
+                if AUXILIARY_CODE_FIELD in chunk.columns else np.full(len(chunk), '', dtype=object)
+            if self.auxiliary_keys is not None:
+                hit = self.auxiliary_keys.get_indexer(self._auxiliary_key(types, values))
+                values = np.where(hit >= 0, self.auxiliary_values[np.maximum(hit, 0)], values)
+            missing = (position >= 0) & lookup.target_required[take] & ((values == '') | (types != dimension))
+            reason[(reason == '') & missing] = MISSING_AUXILIARY
+            auxiliary = types, values
+
+        ok = reason == ''
+        exceptions = chunk[~ok].assign(**{EXCEPTION_FIELD: reason[~ok]})
+        for key, count in pd.Series(reason[~ok], dtype=object).value_counts().items():
+            self.stats['exceptions'][key] = self.stats['exceptions'].get(key, 0) + int(count)
+
+        rows = np.flatnonzero(ok)
+        translated = chunk.iloc[rows].reset_index(drop=True)
+        targets = position[rows]
+        translated[SOURCE_SUBJECT_FIELD] = translated[SUBJECT_FIELD]
+        translated[SUBJECT_FIELD] = lookup.target_codes[targets]
+        if SUBJECT_NAME_FIELD in translated.columns:
+            translated[SOURCE_SUBJECT_NAME_FIELD] = translated[SUBJECT_NAME_FIELD]
+        if COUNTERPART_FIELD in translated.columns:
+            # 对方科目能映射的改为本系统科目，不能映射的保留原编码
+            counterpart = normalize_code_column(translated[COUNTERPART_FIELD])
+            mapped = lookup.resolve(counterpart)
+            translated[COUNTERPART_FIELD] = np.where(mapped >= 0, lookup.target_codes[np.maximum(mapped, 0)],
+                                                     translated[COUNTERPART_FIELD].to_numpy(dtype=object))
+        if auxiliary is not None:
+            translated[AUXILIARY_TYPE_FIELD] = auxiliary[0][rows]
+            translated[AUXILIARY_CODE_FIELD] = auxiliary[1][rows]
+        if self.splitter is not None:
+            translated = self.splitter.split(translated)
+        # 科目名称按最终科目（拆分后为子科目）取本系统名称
+        translated[SUBJECT_NAME_FIELD] = lookup.target_names[lookup.chart.get_indexer(translated[SUBJECT_FIELD])]
+
+        self.stats['lines'] += len(chunk)
+        self.stats['translated'] += len(rows)
+        self.stats['output_lines'] += len(translated)
+        return translated, exceptions
+
+
+def translate_file(input_path, output_path, exceptions_path, translator, chunk_size=CHUNK_SIZE,
+                   encoding='utf-8-sig'):
+    """
+    按块转换明细文件（CSV），转换结果和例外行分别写出为 CSV
+
+    参数:
+    - input_path: 源系统余额表或凭证明细，至少包含 subject_code
+    - output_path / exceptions_path: 转换结果和例外行的输出路径
+    - translator: LedgerTranslator
+
+    返回: translator.stats
+    """
+    outputs = {'translated': CsvWriter(output_path), 'exceptions': CsvWriter(exceptions_path)}
+    opened = []
+    try:
+        for chunk in pd.read_csv(input_path, dtype=str, keep_default_na=False, chunksize=chunk_size,
+                                 encoding=encoding):
+            translated, exceptions = translator.translate(chunk)
+            for name, frame in (('translated', translated), ('exceptions', exceptions)):
+                writer = outputs[name]
+                if writer not in opened:
+                    writer.open(frame.columns)
+                    opened.append(writer)
+                writer.write(frame)
+    finally:
+        for writer in opened:
+            writer.close()
+    return translator.stats
+
+
+if __name__ == "__main__":
+    import os
+    import sqlite3
+    import tempfile
+    import time
+
+    from 科目拆分 import SplitEngine
+
+    index = load_target_index()
+    records = list(index)
+
+    # 中间表中的已确认映射：源系统编码为 本系统编码 + '01' 的明细，部分未确认、部分一对多
+    conn = sqlite3.connect(':memory:')
+    conn.execute(f"CREATE TABLE {MAPPING_TABLE} (id INTEGER PRIMARY KEY, mapping_batch_id TEXT, "
+                 "source_subject_code TEXT, target_subject_code TEXT, is_confirmed INTEGER, export_flag INTEGER)")
+    mapping_rows = [(r.code + '01', r.code, int(i % 10 != 0), 1) for i, r in enumerate(records)]
+    mapping_rows += [('122101', '1122', 1, 1), ('190101', '190101', 1, 1), ('190101', '190102', 1, 1)]
+    conn.executemany(f"INSERT INTO {MAPPING_TABLE} (mapping_batch_id, source_subject_code, target_subject_code, "
+                     "is_confirmed, export_flag) VALUES ('DEMO', ?, ?, ?, ?)", mapping_rows)
+    mapping = read_confirmed_mapping(conn, 'DEMO')
+    lookup = MappingLookup(mapping, index, split_codes=['1901'])
+    translator = LedgerTranslator(lookup, splitter=SplitEngine(target=index), auxiliary_map=pd.DataFrame({
+        'auxiliary_type': ['客户'], 'source_auxiliary_code': ['C001'], 'target_auxiliary_code': ['KH0001']}))
+    print(f"📊 已确认映射 {len(mapping)} 条，查找数组 {len(lookup)} 个源科目")
+
+    lines = pd.DataFrame([
+        ('记-001', '100201', '银行存款', '112201', '', '', '500.00', ''),
+        ('记-001', '112201', '应收账款', '100201', '往来单位', 'C001', '', '500.00'),
+        ('记-002', '112201', '应收账款', '600101', '往来单位', '', '800.00', ''),
+        ('记-003', '190101', '待处理财产损溢', '160101', '', '', '1200.00', ''),
+        ('记-004', '999901', '未知科目', '100201', '', '', '10.00', ''),
+    ], columns=['voucher_no', SUBJECT_FIELD, SUBJECT_NAME_FIELD, COUNTERPART_FIELD, AUXILIARY_TYPE_FIELD,
+                AUXILIARY_CODE_FIELD, 'debit_amount', 'credit_amount'])
+    translated, exceptions = translator.translate(lines)
+    print(translated.to_string())
+    print(exceptions.to_string())
+
+    # 性能：100万行凭证明细，按块读写
+    rng = np.random.default_rng(0)
+    count = 1_000_000
+    codes = mapping['source_subject_code'].to_numpy(dtype=object)
+    subjects = np.append(codes, ['999901', '888801'])
+    big = pd.DataFrame({
+        'voucher_no': [f'记-{i // 2:07d}' for i in range(count)],
+        SUBJECT_FIELD: subjects[rng.integers(0, len(subjects), count)],
+        COUNTERPART_FIELD: codes[rng.integers(0, len(codes), count)],
+        AUXILIARY_TYPE_FIELD: np.where(rng.random(count) < 0.2, '往来单位', ''),
+        AUXILIARY_CODE_FIELD: np.where(rng.random(count) < 0.19, 'C001', ''),
+        'debit_amount': [f'{v / 100:.2f}' for v in rng.integers(1, 10_000_000, count)],
+        'credit_amount': '',
+    })
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, 'ledger.csv')
+        big.to_csv(source_path, index=False, encoding='utf-8-sig')
+        translator = LedgerTranslator(lookup, splitter=SplitEngine(target=index))
+        start = time.perf_counter()
+        stats = translate_file(source_path, os.path.join(directory, 'translated.csv'),
+                               os.path.join(directory, 'exceptions.csv'), translator)
+        print(f"\n✅ 转换 {stats['lines']} 行，输出 {stats['output_lines']} 行，耗时 {time.perf_counter() - start:.2f} 秒")
+        print(f"📊 {stats}")
+    conn.close()
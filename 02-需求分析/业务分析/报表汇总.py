@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+资产负债表/利润表汇总（见 报表编制与科目层级关系分析.md：报表项目是一级科目余额或发生额的汇总）
+目标科目表预先构建闭包表（每个科目与其自身及全部上级的 (下级, 上级) 对），
+报表项目也表示为 (项目, 科目, 符号) 对并展开到闭包表上，科目余额汇总到各级科目和报表项目只需一次分组求和：
+- 余额为借方为正的整数分（借方 - 贷方），np.add.at 整数累加，结果精确
+- 报表项目按项目方向取符号：借方项目（资产、费用）为 +，贷方项目（负债、权益、收入）为 -，
+  备抵科目（累计折旧等）自然抵减
+- 同一批余额中父科目和其下级科目都有数时只取下级科目（父科目余额是下级之和，见 5.1 案例）
+
+导账前后的余额分别汇总后逐项比较（compare），映射调整后可以立即看到报表是否变化
+"""
+
+import numpy as np
+import pandas as pd
+
+from 科目拆分 import AMOUNT_FIELDS, SUBJECT_FIELD, cents_to_text, to_cents
+from 科目精确匹配 import load_target_index, normalize_code_column
+
+BALANCE_SHEET = '资产负债表'
+PROFIT_SHEET = '利润表'
+
+# 报表项目：(报表, 项目, 方向, 科目编码)；科目可以是任意级次，汇总时包含其全部下级科目
+STATEMENT_ITEMS = [
+    (BALANCE_SHEET, '货币资金', '借', ['1001', '1002', '1012']),
+    (BALANCE_SHEET, '短期投资', '借', ['1101']),
+    (BALANCE_SHEET, '应收票据', '借', ['1121']),
+    (BALANCE_SHEET, '应收账款', '借', ['1122']),
+    (BALANCE_SHEET, '预付账款', '借', ['1123']),
+    (BALANCE_SHEET, '应收股利', '借', ['1131']),
+    (BALANCE_SHEET, '应收利息', '借', ['1132']),
+    (BALANCE_SHEET, '其他应收款', '借', ['1221']),
+    (BALANCE_SHEET, '存货', '借', ['1401', '1402', '1403', '1404', '1405', '1407', '1408', '1411', '1412', '1413',
+                                   '1421', '4001', '4002', '4101']),
+    (BALANCE_SHEET, '其他流动资产', '借', ['190101']),
+    (BALANCE_SHEET, '长期债券投资', '借', ['1501']),
+    (BALANCE_SHEET, '长期股权投资', '借', ['1511']),
+    (BALANCE_SHEET, '固定资产账面价值', '借', ['1601', '1602']),
+    (BALANCE_SHEET, '在建工程', '借', ['1604']),
+    (BALANCE_SHEET, '工程物资', '借', ['1605']),
+    (BALANCE_SHEET, '固定资产清理', '借', ['1606']),
+    (BALANCE_SHEET, '生产性生物资产', '借', ['1621', '1622']),
+    (BALANCE_SHEET, '无形资产', '借', ['1701', '1702']),
+    (BALANCE_SHEET, '开发支出', '借', ['4301']),
+    (BALANCE_SHEET, '长期待摊费用', '借', ['1801']),
+    (BALANCE_SHEET, '其他非流动资产', '借', ['190102']),
+    (BALANCE_SHEET, '短期借款', '贷', ['2001']),
+    (BALANCE_SHEET, '应付票据', '贷', ['2201']),
+    (BALANCE_SHEET, '应付账款', '贷', ['2202']),
+    (BALANCE_SHEET, '预收账款', '贷', ['2203']),
+    (BALANCE_SHEET, '应付职工薪酬', '贷', ['2211']),
+    (BALANCE_SHEET, '应交税费', '贷', ['2221']),
+    (BALANCE_SHEET, '应付利息', '贷', ['2231']),
+    (BALANCE_SHEET, '应付利润', '贷', ['2232']),
+    (BALANCE_SHEET, '其他应付款', '贷', ['2241']),
+    (BALANCE_SHEET, '递延收益', '贷', ['2401']),
+    (BALANCE_SHEET, '长期借款', '贷', ['2501']),
+    (BALANCE_SHEET, '长期应付款', '贷', ['2701']),
+    (BALANCE_SHEET, '实收资本', '贷', ['3001']),
+    (BALANCE_SHEET, '资本公积', '贷', ['3002']),
+    (BALANCE_SHEET, '盈余公积', '贷', ['3101']),
+    (BALANCE_SHEET, '未分配利润', '贷', ['3103', '3104']),
+    (PROFIT_SHEET, '营业收入', '贷', ['5001', '5051']),
+    (PROFIT_SHEET, '营业成本', '借', ['5401', '5402']),
+    (PROFIT_SHEET, '税金及附加', '借', ['5403']),
+    (PROFIT_SHEET, '销售费用', '借', ['5601']),
+    (PROFIT_SHEET, '管理费用', '借', ['5602']),
+    (PROFIT_SHEET, '财务费用', '借', ['5603']),
+    (PROFIT_SHEET, '投资收益', '贷', ['5111']),
+    (PROFIT_SHEET, '营业利润', '贷', ['5001', '5051', '5401', '5402', '5403', '5601', '5602', '5603', '5111']),
+    (PROFIT_SHEET, '营业外收入', '贷', ['5301']),
+    (PROFIT_SHEET, '营业外支出', '借', ['5711']),
+    (PROFIT_SHEET, '利润总额', '贷', ['5001', '5051', '5401', '5402', '5403', '5601', '5602', '5603', '5111',
+                                  '5301', '5711']),
+    (PROFIT_SHEET, '所得税费用', '借', ['5801']),
+    (PROFIT_SHEET, '净利润', '贷', ['5001', '5051', '5401', '5402', '5403', '5601', '5602', '5603', '5111',
+                                 '5301', '5711', '5801']),
+]
+
+
+def closure_pairs(parent):
+    """
+    闭包表：parent 为每个科目的父科目位置（-1 为一级科目）
+
+    返回: (descendant, ancestor) 两个位置数组，包含每个科目与自身的对
+    """
+    size = len(parent)
+    descendant = [np.arange(size)]
+    ancestor = [np.arange(size)]
+    rows, current = np.arange(size), np.asarray(parent)
+    while True:
+        has_parent = current >= 0
+        rows, current = rows[has_parent], current[has_parent]
+        if not len(rows):
+            break
+        if len(descendant) > size:
+            raise ValueError("科目层级存在循环")
+        descendant.append(rows)
+        ancestor.append(current)
+        current = parent[current]
+    return np.concatenate(descendant), np.concatenate(ancestor)
+
+
+def balances(frame, amount_fields=AMOUNT_FIELDS):
+    """余额表或明细行的 (科目编码, 借方为正的余额分)：借方金额 - 贷方金额"""
+    debit, credit = amount_fields
+    codes = normalize_code_column(frame[SUBJECT_FIELD])
+    amount = to_cents(frame[debit]) if debit in frame.columns else np.zeros(len(frame), dtype=np.int64)
+    if credit in frame.columns:
+        amount = amount - to_cents(frame[credit])
+    return codes, amount
+
+
+class StatementRollup:
+    """
+    科目余额汇总器（闭包表和报表项目只构建一次）
+
+    参数:
+    - codes / parent_codes / names: 目标科目表的编码、父科目编码、名称
+    - items: 报表项目，默认 STATEMENT_ITEMS；科目表中不存在的科目忽略
+    """
+
+    def __init__(self, codes, parent_codes, names=None, items=STATEMENT_ITEMS):
+        self.codes = pd.Index(codes)
+        self.names = np.asarray(names if names is not None else [''] * len(codes), dtype=object)
+        parent = self.codes.get_indexer(parent_codes)
+        parent[parent == np.arange(len(parent))] = -1
+        size = len(self.codes)
+        descendant, ancestor = closure_pairs(parent)
+        self.levels = np.bincount(descendant, minlength=size)
+        self.strict = (descendant[descendant != ancestor], ancestor[descendant != ancestor])
+
+        # 报表项目展开到闭包表：(项目, 科目, 符号) 与 (下级, 上级) 连接为 (项目, 下级, 符号)
+        self.items = [(statement, item) for statement, item, _, _ in items]
+        item_number, item_node, item_sign = [], [], []
+        for number, (_, _, direction, item_codes) in enumerate(items):
+            for position in self.codes.get_indexer(item_codes):
+                if position >= 0:
+                    item_number.append(number)
+                    item_node.append(position)
+                    item_sign.append(1 if direction == '借' else -1)
+        order = np.argsort(ancestor, kind='stable')
+        starts = np.searchsorted(ancestor[order], item_node)
+        ends = np.searchsorted(ancestor[order], item_node, side='right')
+        counts = ends - starts
+        members = order[np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])] if len(counts) else \
+            np.array([], dtype=np.int64)
+
+        # 分组：0..size-1 为各科目，size.. 为报表项目
+        self.group = np.concatenate([ancestor, size + np.repeat(item_number, counts)]).astype(np.int64)
+        self.member = np.concatenate([descendant, descendant[members]]).astype(np.int64)
+        self.sign = np.concatenate([np.ones(len(ancestor), dtype=np.int64),
+                                    np.repeat(np.asarray(item_sign, dtype=np.int64), counts)])
+        self.stats = {}
+
+    @classmethod
+    def from_index(cls, target=None, items=STATEMENT_ITEMS):
+        """由 SubjectIndex 构建，默认加载小企业会计准则默认科目"""
+        if target is None:
+            target = load_target_index()
+        records = list(target)
+        return cls([r.code for r in records], [r.parent_code for r in records], [r.name for r in records], items)
+
+    def node_amounts(self, codes, amounts):
+        """
+        各科目本身的余额（整数分）：编码不在科目表中的忽略；父科目和其下级都有余额时只取下级
+
+        stats 记录 unknown（不在科目表中的行数）、replaced（被下级替代的父科目数）
+        """
+        size = len(self.codes)
+        position = self.codes.get_indexer(codes)
+        known = position >= 0
+        node = np.zeros(size, dtype=np.int64)
+        np.add.at(node, position[known], np.asarray(amounts, dtype=np.int64)[known])
+        present = np.zeros(size, dtype=bool)
+        present[position[known]] = True
+        descendant, ancestor = self.strict
+        replaced = np.zeros(size, dtype=bool)
+        replaced[ancestor[present[descendant]]] = True
+        replaced &= present
+        node[replaced] = 0
+        self.stats = {'rows': len(position), 'unknown': int((~known).sum()), 'replaced': int(replaced.sum())}
+        return node
+
+    def rollup(self, codes, amounts):
+        """
+        汇总到各级科目和报表项目
+
+        参数:
+        - codes: 科目编码（已规范化）
+        - amounts: 借方为正的余额（整数分）
+
+        返回: (subjects, statement)
+        - subjects: 每个科目一行（code、name、level、balance 汇总余额分）
+        - statement: 每个报表项目一行（statement、item、amount 分，按项目方向为正）
+        """
+        node = self.node_amounts(codes, amounts)
+        size = len(self.codes)
+        total = np.zeros(size + len(self.items), dtype=np.int64)
+        np.add.at(total, self.group, self.sign * node[self.member])
+        subjects = pd.DataFrame({'code': self.codes, 'name': self.names, 'level': self.levels,
+                                 'balance': total[:size]})
+        statement = pd.DataFrame(self.items, columns=['statement', 'item']).assign(amount=total[size:])
+        return subjects, statement
+
+    def compare(self, before, after):
+        """
+        导账前后的报表逐项比较
+
+        参数:
+        - before / after: (codes, amounts)，如 balances(源余额表) 与 balances(转换后的余额表)
+
+        返回: DataFrame（statement、item、before、after、difference，单位为分）
+        """
+        _, first = self.rollup(*before)
+        _, second = self.rollup(*after)
+        result = first.rename(columns={'amount': 'before'})
+        result['after'] = second['amount'].to_numpy()
+        result['difference'] = result['after'] - result['before']
+        return result
+
+
+if __name__ == "__main__":
+    import time
+
+    index = load_target_index()
+    engine = StatementRollup.from_index(index)
+
+    # 报表编制与科目层级关系分析.md 中的案例：源系统同时有父科目和明细科目余额
+    before = pd.DataFrame([
+        ('1501', '1000.00', ''), ('150101', '600.00', ''), ('150102', '400.00', ''),
+        ('1601', '5000.00', ''), ('1602', '', '1200.00'),
+        ('1002', '3800.00', ''), ('3001', '', '9200.00'),
+        ('5602', '5000.00', ''), ('560201', '2000.00', ''), ('560202', '3000.00', ''), ('5001', '', '5000.00'),
+    ], columns=[SUBJECT_FIELD, *AMOUNT_FIELDS])
+    subjects, statement = engine.rollup(*balances(before))
+    shown = statement[statement['amount'] != 0]
+    print(shown.assign(amount=cents_to_text(shown['amount'])).to_string())
+    print(f"📊 {engine.stats}")
+
+    # 导账后：150102 误映射到 1122
+    after = before.replace({'150102': '1122'})
+    comparison = engine.compare(balances(before), balances(after))
+    print(comparison[comparison['difference'] != 0].to_string())
+
+    # 性能：10万个科目的科目表（每个一级科目下扩展三级明细），20万行余额
+    records = list(index)
+    codes = [r.code for r in records]
+    parents = [r.parent_code for r in records]
+    rng = np.random.default_rng(0)
+    leaves = [r.code for r in records if r.level == 1]
+    while len(codes) < 100_000:
+        parent = leaves[rng.integers(0, len(leaves))]
+        child = f"{parent}{rng.integers(0, 10**6):06d}"
+        if len(child) > 16:
+            continue
+        codes.append(child)
+        parents.append(parent)
+        leaves.append(child)
+    codes, unique = np.unique(codes, return_index=True)
+    parents = np.asarray(parents, dtype=object)[unique]
+    start = time.perf_counter()
+    engine = StatementRollup(codes, parents)
+    built = time.perf_counter() - start
+    sample = codes[rng.integers(0, len(codes), 200_000)]
+    amounts = rng.integers(-10**9, 10**9, len(sample))
+    start = time.perf_counter()
+    subjects, statement = engine.rollup(sample, amounts)
+    comparison = engine.compare((sample, amounts), (sample, amounts[::-1]))
+    print(f"\n✅ {len(codes)} 个科目（闭包表 {len(engine.group)} 对），构建 {built:.2f} 秒；"
+          f"导账前后两次汇总并比较 {time.perf_counter() - start:.3f} 秒")
+    print(f"📊 {engine.stats}")
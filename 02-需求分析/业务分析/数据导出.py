@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表格数据导出：CSV / JSON / JSON Lines / Markdown / Parquet
+按块（默认每块10000行）处理 DataFrame 或记录迭代器，整列一次性转换为文本，每块一次写入；
+多个格式可以在同一次遍历中同时写出
+
+JSON 与 json.dump(df.to_dict('records'), f, ensure_ascii=False, indent=2) 输出一致，
+Markdown 数据行与 "| " + " | ".join(str(val) if pd.notna(val) else "" for val in row) + " |" 一致
+
+Parquet 需要可选依赖 pyarrow（pip install pyarrow），其他格式只需要 pandas/numpy；
+未安装 pyarrow 时创建 Parquet 写出器即报 ImportError，export 在打开任何输出文件之前失败
+"""
+
+import abc
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+# ensure_ascii=False 时 json 模块使用的字符串编码函数（有C加速时为C实现）
+from json.encoder import encode_basestring as _encode_str
+
+DEFAULT_CHUNK_SIZE = 10000
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+# ---------------------------------------------------------------------------
+# 整列转换
+# ---------------------------------------------------------------------------
+
+def _json_scalar(value, nan='NaN'):
+    """单个值的JSON文本（与 json.dumps(value, ensure_ascii=False) 一致，NaN 按 nan 参数输出）"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None:
+        return 'null'
+    kind = type(value)
+    if kind is str:
+        return _encode_str(value)
+    if kind is bool:
+        return 'true' if value else 'false'
+    if kind is int:
+        return int.__repr__(value)
+    if kind is float:
+        if value != value:
+            return nan
+        if math.isinf(value):
+            return 'Infinity' if value > 0 else '-Infinity'
+        return float.__repr__(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _json_key(key):
+    """字典键的JSON文本（非字符串键按 json 模块的规则转换）"""
+    if isinstance(key, str):
+        return _encode_str(key)
+    return _encode_str(json.dumps(key) if isinstance(key, (bool, type(None))) else str(key))
+
+
+def json_column(values, nan='NaN'):
+    """把一列值转换为JSON文本列表；整数列直接整列转换"""
+    array = np.asarray(values)
+    if array.dtype.kind in 'iu':
+        return array.astype(str).tolist()
+    return [_json_scalar(v, nan) for v in array.astype(object, copy=False).tolist()]
+
+
+def text_column(values):
+    """把一列值转换为 str(val)，空值为''（与 Markdown 表格中的取值一致）"""
+    array = np.asarray(values, dtype=object)
+    text = array.astype(str)
+    missing = pd.isna(array)
+    if missing.any():
+        text[missing] = ''
+    return text.tolist()
+
+
+def json_records(df, indent=2, level=1, nan='NaN'):
+    """
+    把 df 的每一行转换为JSON对象文本
+
+    - indent: 缩进空格数，None 为单行（与 json.dumps 默认分隔符一致）
+    - level: 对象所在的嵌套层级（记录列表中的对象为1）
+    """
+    columns = df.columns
+    if not len(columns):
+        return ['{}'] * len(df)
+    if indent is None:
+        opener, separator, closer = '{', ', ', '}'
+    else:
+        opener = '{\n' + ' ' * (indent * (level + 1))
+        separator = ',\n' + ' ' * (indent * (level + 1))
+        closer = '\n' + ' ' * (indent * level) + '}'
+    encoded = []
+    for i, col in enumerate(columns):
+        key = _json_key(col) + ': '
+        encoded.append([key + v for v in json_column(df.iloc[:, i].to_numpy(), nan)])
+    return [opener + separator.join(row) + closer for row in zip(*encoded)]
+
+
+def markdown_rows(df):
+    """把 df 的每一行转换为Markdown表格行（含换行符）"""
+    # 与 iterrows 一致：按 df.values 的公共类型取值（全部为数值列时整数会随浮点列转为浮点）
+    values = df.to_numpy()
+    if not df.shape[1]:
+        return ['|  |\n'] * len(df)
+    columns = [text_column(values[:, i]) for i in range(values.shape[1])]
+    return ['| ' + ' | '.join(row) + ' |\n' for row in zip(*columns)]
+
+
+def markdown_header(columns):
+    """Markdown表格的表头和分隔行"""
+    headers = list(columns)
+    return ("| " + " | ".join(str(h) for h in headers) + " |\n"
+            + "| " + " | ".join(["---"] * len(headers)) + " |\n")
+
+
+# ---------------------------------------------------------------------------
+# 各格式写出器
+# ---------------------------------------------------------------------------
+
+class _FileWriter(abc.ABC):
+    """按块写出的文本文件，子类实现 write"""
+
+    encoding = 'utf-8'
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self.rows = 0
+
+    def open(self, columns):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'w', encoding=self.encoding, newline='', buffering=WRITE_BUFFER_SIZE)
+        self.columns = list(columns)
+
+    @abc.abstractmethod
+    def write(self, chunk):
+        """写出一块 DataFrame"""
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CsvWriter(_FileWriter):
+    """CSV（与 df.to_csv(path, index=False, encoding='utf-8-sig') 一致）"""
+
+    def __init__(self, path, encoding='utf-8-sig'):
+        super().__init__(path)
+        self.encoding = encoding
+
+    def open(self, columns):
+        super().open(columns)
+        self._header_written = False
+
+    def write(self, chunk):
+        chunk.to_csv(self._file, index=False, header=not self._header_written)
+        self._header_written = True
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._file is not None and not self._header_written:
+            pd.DataFrame(columns=self.columns).to_csv(self._file, index=False)
+        super().close()
+
+
+class JsonWriter(_FileWriter):
+    """JSON记录数组（与 json.dump(records, ensure_ascii=False, indent=indent) 一致）"""
+
+    def __init__(self, path, indent=2):
+        super().__init__(path)
+        self.indent = indent
+
+    def write(self, chunk):
+        if not len(chunk):
+            return
+        records = json_records(chunk, indent=self.indent, level=1)
+        if self.indent is None:
+            separator = ', '
+            head = '[' if self.rows == 0 else separator
+        else:
+            separator = ',\n' + ' ' * self.indent
+            head = '[\n' + ' ' * self.indent if self.rows == 0 else separator
+        self._file.write(head + separator.join(records))
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._file is not None:
+            if self.rows == 0:
+                self._file.write('[]')
+            else:
+                self._file.write(']' if self.indent is None else '\n]')
+        super().close()
+
+
+class JsonLinesWriter(_FileWriter):
+    """JSON Lines：每行一条记录，空值写为 null"""
+
+    def write(self, chunk):
+        if len(chunk):
+            self._file.write('\n'.join(json_records(chunk, indent=None, nan='null')) + '\n')
+            self.rows += len(chunk)
+
+
+class MarkdownWriter(_FileWriter):
+    """
+    Markdown表格
+
+    参数:
+    - preface: 写在表格之前的文本（标题、数据来源、说明等）
+    """
+
+    def __init__(self, path, preface=''):
+        super().__init__(path)
+        self.preface = preface
+
+    def open(self, columns):
+        super().open(columns)
+        self._file.write(self.preface + markdown_header(self.columns))
+
+    def write(self, chunk):
+        if len(chunk):
+            self._file.write(''.join(markdown_rows(chunk)))
+            self.rows += len(chunk)
+
+
+class ParquetWriter:
+    """Parquet（需要 pyarrow）"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("写出Parquet需要安装pyarrow: pip install pyarrow") from None
+        self.path = path
+        self._writer = None
+        self.rows = 0
+
+    def open(self, columns):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.columns = list(columns)
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._writer is None:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            pq.write_table(pa.Table.from_pandas(pd.DataFrame(columns=self.columns), preserve_index=False),
+                           self.path)
+        else:
+            self._writer.close()
+            self._writer = None
+
+
+FORMAT_WRITERS = {
+    'csv': CsvWriter,
+    'json': JsonWriter,
+    'jsonl': JsonLinesWriter,
+    'md': MarkdownWriter,
+    'parquet': ParquetWriter,
+}
+
+
+# ---------------------------------------------------------------------------
+# 导出
+# ---------------------------------------------------------------------------
+
+def iter_chunks(data, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    把 DataFrame 或记录迭代器（dict 或与 columns 对应的元组）切分为 DataFrame 块
+    记录迭代器的各列类型按块推断
+    """
+    if isinstance(data, pd.DataFrame):
+        if columns is not None:
+            data = data[list(columns)]
+        for start in range(0, len(data), chunk_size):
+            yield data.iloc[start:start + chunk_size]
+        return
+
+    batch = []
+    for record in data:
+        batch.append(record)
+        if len(batch) >= chunk_size:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch, columns=columns)
+
+
+def _make_writer(fmt, target):
+    if fmt not in FORMAT_WRITERS:
+        raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(FORMAT_WRITERS)}")
+    if isinstance(target, dict):
+        return FORMAT_WRITERS[fmt](**target)
+    return FORMAT_WRITERS[fmt](target)
+
+
+def export(data, outputs, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    一次遍历数据，同时写出多个格式
+
+    参数:
+    - data: DataFrame 或记录迭代器
+    - outputs: {格式: 文件路径 或 写出器参数dict}，或写出器对象列表；
+      格式见 FORMAT_WRITERS，如 {'csv': 'a.csv', 'md': {'path': 'a.md', 'preface': '# 标题\\n\\n'}}
+    - columns: 输出的列（记录迭代器为元组时必须指定）
+
+    返回: 写出的行数
+    """
+    if isinstance(outputs, dict):
+        writers = [_make_writer(fmt, target) for fmt, target in outputs.items()]
+    else:
+        writers = list(outputs)
+
+    chunks = iter_chunks(data, columns, chunk_size)
+    first = next(chunks, None)
+    if first is None:
+        first = pd.DataFrame(columns=columns if columns is not None else
+                             (data.columns if isinstance(data, pd.DataFrame) else []))
+
+    rows = 0
+    opened = []
+    try:
+        for writer in writers:
+            writer.open(first.columns)
+            opened.append(writer)
+        chunk = first
+        while chunk is not None:
+            for writer in writers:
+                writer.write(chunk)
+            rows += len(chunk)
+            chunk = next(chunks, None)
+    finally:
+        for writer in opened:
+            writer.close()
+    return rows
+
+
+def export_format(data, fmt, path, **options):
+    """写出单个格式，如 export_format(df, 'jsonl', 'a.jsonl')"""
+    return export(data, [_make_writer(fmt, {'path': path, **options})])
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+映射中间表（account_mapping_temp，见 科目映射中间表设计方案.md）的批量读写
+一个批次常有十万行以上的匹配结果，逐条 INSERT/UPDATE 时往返次数和事务数与行数相同，这里改为：
+- 写入：按 chunk_size 分块 executemany，每块一个事务；同一批次同一源科目已存在时覆盖（upsert），
+  唯一键 (mapping_batch_id, source_subject_code)
+- 更新：先把 (源科目编码, 新值) 分块写入临时表，再用一条 UPDATE ... 连接临时表完成（集合更新）
+- 连接池：少量长连接复用，多个线程可同时分块写入（服务器数据库）
+
+后端：SqliteBackend（本地测试、单机使用）、MysqlBackend（需要安装 pymysql）
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+MAPPING_TABLE = 'account_mapping_temp'
+
+CHUNK_SIZE = 20000
+POOL_SIZE = 4
+
+BATCH_FIELD = 'mapping_batch_id'
+KEY_FIELDS = (BATCH_FIELD, 'source_subject_code')
+
+# 中间表字段：(字段, 类型, 约束)，顺序同设计方案；target_parent_name 供映射对比 Excel 使用
+TABLE_COLUMNS = [
+    ('mapping_batch_id', 'VARCHAR(50)', 'NOT NULL'),
+    ('source_system_code', 'VARCHAR(50)', ''),
+    ('source_system_name', 'VARCHAR(100)', ''),
+    ('source_subject_code', 'VARCHAR(50)', 'NOT NULL'),
+    ('source_subject_name', 'VARCHAR(200)', ''),
+    ('source_subject_code_original', 'VARCHAR(50)', ''),
+    ('source_subject_name_original', 'VARCHAR(200)', ''),
+    ('source_parent_code', 'VARCHAR(50)', ''),
+    ('source_parent_name', 'VARCHAR(200)', ''),
+    ('source_subject_level', 'INT', ''),
+    ('source_subject_type', 'VARCHAR(20)', ''),
+    ('source_debit_credit', 'VARCHAR(10)', ''),
+    ('source_auxiliary_info', 'TEXT', ''),
+    ('source_is_enabled', 'TINYINT', ''),
+    ('source_remark', 'VARCHAR(500)', ''),
+    ('target_subject_code', 'VARCHAR(50)', ''),
+    ('target_subject_name', 'VARCHAR(200)', ''),
+    ('target_parent_code', 'VARCHAR(50)', ''),
+    ('target_parent_name', 'VARCHAR(200)', ''),
+    ('target_subject_level', 'INT', ''),
+    ('target_subject_type', 'VARCHAR(20)', ''),
+    ('target_debit_credit', 'VARCHAR(10)', ''),
+    ('target_auxiliary_info', 'TEXT', ''),
+    ('match_type', 'VARCHAR(50)', ''),
+    ('match_method', 'VARCHAR(50)', ''),
+    ('match_score', 'DECIMAL(5,2)', ''),
+    ('match_confidence', 'VARCHAR(20)', ''),
+    ('match_reason', 'TEXT', ''),
+    ('candidate_subjects', 'TEXT', ''),
+    ('llm_response', 'TEXT', ''),
+    ('mapping_status', 'VARCHAR(20)', "NOT NULL DEFAULT 'pending'"),
+    ('review_status', 'VARCHAR(20)', ''),
+    ('is_confirmed', 'TINYINT', 'NOT NULL DEFAULT 0'),
+    ('is_modified', 'TINYINT', 'NOT NULL DEFAULT 0'),
+    ('validation_result', 'VARCHAR(20)', ''),
+    ('validation_message', 'TEXT', ''),
+    ('conflict_flag', 'TINYINT', 'NOT NULL DEFAULT 0'),
+    ('conflict_detail', 'TEXT', ''),
+    ('created_at', 'DATETIME', 'DEFAULT CURRENT_TIMESTAMP'),
+    ('created_by', 'VARCHAR(50)', ''),
+    ('matched_at', 'DATETIME', ''),
+    ('matched_by', 'VARCHAR(50)', ''),
+    ('modified_at', 'DATETIME', ''),
+    ('modified_by', 'VARCHAR(50)', ''),
+    ('confirmed_at', 'DATETIME', ''),
+    ('confirmed_by', 'VARCHAR(50)', ''),
+    ('reviewed_at', 'DATETIME', ''),
+    ('reviewed_by', 'VARCHAR(50)', ''),
+    ('version', 'INT', 'NOT NULL DEFAULT 1'),
+    ('remark', 'TEXT', ''),
+    ('tag', 'VARCHAR(100)', ''),
+    ('priority', 'INT', ''),
+    ('export_flag', 'TINYINT', 'NOT NULL DEFAULT 1'),
+    ('template_id', 'VARCHAR(50)', ''),
+]
+TABLE_FIELDS = [field for field, _, _ in TABLE_COLUMNS]
+
+# 索引设计（批次查询走唯一键的前缀）
+TABLE_INDEXES = {
+    'idx_source_system': ('source_system_code', 'source_subject_code'),
+    'idx_target_subject': ('target_subject_code',),
+    'idx_status': ('mapping_status', 'is_confirmed'),
+    'idx_match_type': ('match_type', 'match_method'),
+    'idx_batch_status': ('mapping_batch_id', 'mapping_status', 'is_confirmed'),
+}
+
+# upsert 覆盖已有行时不改的字段
+_KEEP_ON_UPDATE = set(KEY_FIELDS) | {'created_at', 'created_by', 'version'}
+
+_STAGING_TABLE = 'mapping_staging'
+
+
+# ---------------------------------------------------------------------------
+# 后端
+# ---------------------------------------------------------------------------
+
+class SqliteBackend:
+    """
+    SQLite 后端（sqlite3 标准库），需要 SQLite 3.33 以上（UPDATE ... FROM）
+
+    本地测试、单机使用时只按批次查询，默认只建 idx_batch_status；每个索引都会拖慢批量写入，
+    需要其他索引时通过 indexes 传入（如 TABLE_INDEXES 的全部键）
+    """
+
+    placeholder = '?'
+
+    def __init__(self, path, indexes=('idx_batch_status',)):
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.indexes = list(indexes)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        conn.execute('PRAGMA cache_size=-131072')
+        return conn
+
+    def schema(self, table):
+        columns = ',\n    '.join(f'{field} {kind} {constraint}'.rstrip() for field, kind, constraint in TABLE_COLUMNS)
+        statements = [f"CREATE TABLE IF NOT EXISTS {table} (\n    id INTEGER PRIMARY KEY,\n    {columns},\n"
+                      f"    UNIQUE ({', '.join(KEY_FIELDS)})\n)"]
+        statements += [f"CREATE INDEX IF NOT EXISTS {name}_{table} ON {table} ({', '.join(fields)})"
+                       for name, fields in TABLE_INDEXES.items() if name in self.indexes]
+        return statements
+
+    def upsert_sql(self, table, fields, updates):
+        values = ', '.join([self.placeholder] * len(fields))
+        sets = [f'{field} = excluded.{field}' for field in updates] + [f'version = {table}.version + 1']
+        return (f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({values}) "
+                f"ON CONFLICT ({', '.join(KEY_FIELDS)}) DO UPDATE SET {', '.join(sets)}")
+
+    def staging_sql(self, staging, fields):
+        return f"CREATE TEMP TABLE {staging} ({', '.join(fields)}, PRIMARY KEY ({fields[0]})) WITHOUT ROWID"
+
+    def drop_staging_sql(self, staging):
+        return f"DROP TABLE {staging}"
+
+    def update_sql(self, table, staging, key, fields):
+        sets = ', '.join(f'{field} = s.{field}' for field in fields)
+        return (f"UPDATE {table} SET {sets} FROM {staging} s "
+                f"WHERE {table}.{BATCH_FIELD} = {self.placeholder} AND {table}.{key} = s.{key}")
+
+
+class MysqlBackend:
+    """MySQL 后端（pymysql），connect_kwargs 传给 pymysql.connect"""
+
+    placeholder = '%s'
+
+    def __init__(self, **connect_kwargs):
+        self.connect_kwargs = {'charset': 'utf8mb4', 'autocommit': False, **connect_kwargs}
+
+    def connect(self):
+        import pymysql
+        return pymysql.connect(**self.connect_kwargs)
+
+    def schema(self, table):
+        columns = ',\n    '.join(f'`{field}` {kind} {constraint}'.rstrip() for field, kind, constraint in TABLE_COLUMNS)
+        indexes = ''.join(f",\n    INDEX `{name}` ({', '.join(f'`{f}`' for f in fields)})"
+                          for name, fields in TABLE_INDEXES.items())
+        return [f"CREATE TABLE IF NOT EXISTS `{table}` (\n    `id` BIGINT AUTO_INCREMENT PRIMARY KEY,\n    {columns},\n"
+                f"    UNIQUE KEY `uk_batch_source` ({', '.join(f'`{f}`' for f in KEY_FIELDS)}){indexes}\n"
+                f") DEFAULT CHARSET=utf8mb4"]
+
+    def upsert_sql(self, table, fields, updates):
+        # pymysql 的 executemany 会把 INSERT ... VALUES 合并为多行 INSERT
+        values = ', '.join([self.placeholder] * len(fields))
+        sets = [f'`{field}` = VALUES(`{field}`)' for field in updates] + ['`version` = `version` + 1']
+        return (f"INSERT INTO `{table}` ({', '.join(f'`{f}`' for f in fields)}) VALUES ({values}) "
+                f"ON DUPLICATE KEY UPDATE {', '.join(sets)}")
+
+    def staging_sql(self, staging, fields):
+        return (f"CREATE TEMPORARY TABLE `{staging}` ({', '.join(f'`{f}` TEXT' for f in fields[1:])}, "
+                f"`{fields[0]}` VARCHAR(50) PRIMARY KEY) DEFAULT CHARSET=utf8mb4")
+
+    def drop_staging_sql(self, staging):
+        # DROP TABLE 会隐式提交当前事务，临时表必须用 DROP TEMPORARY TABLE（不提交）
+        return f"DROP TEMPORARY TABLE IF EXISTS `{staging}`"
+
+    def update_sql(self, table, staging, key, fields):
+        sets = ', '.join(f't.`{field}` = s.`{field}`' for field in fields)
+        return (f"UPDATE `{table}` t JOIN `{staging}` s ON t.`{key}` = s.`{key}` "
+                f"SET {sets} WHERE t.`{BATCH_FIELD}` = {self.placeholder}")
+
+
+# ---------------------------------------------------------------------------
+# 连接池
+# ---------------------------------------------------------------------------
+
+class ConnectionPool:
+    """
+    固定上限的连接池：connection() 取出一个连接（没有空闲连接且未到上限时新建，否则等待），用完放回
+
+    出错时回滚后放回；close() 关闭全部空闲连接
+    """
+
+    def __init__(self, backend, size=POOL_SIZE):
+        if size < 1:
+            raise ValueError(f"连接池大小必须大于0: {size}")
+        self.backend = backend
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if not create:
+            return self._idle.get()
+        try:
+            return self.backend.connect()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+def server_side_cursor(conn):
+    """
+    不在客户端缓存整个结果集的游标：pymysql 使用 SSCursor（fetchmany 时才从服务器读取下一批行），
+    sqlite3 等驱动的普通游标本身即逐步执行
+    """
+    if type(conn).__module__.split('.')[0] == 'pymysql':
+        import pymysql.cursors
+        return conn.cursor(pymysql.cursors.SSCursor)
+    return conn.cursor()
+
+
+# ---------------------------------------------------------------------------
+# 批量读写
+# ---------------------------------------------------------------------------
+
+def _records(frame):
+    """DataFrame -> 参数元组（缺失值为 None，numpy 标量转为 Python 值）"""
+    columns = []
+    for name in frame.columns:
+        values = frame[name].to_numpy(dtype=object)
+        missing = frame[name].isna().to_numpy()
+        if missing.any():
+            values = values.copy()
+            values[missing] = None
+        columns.append(values)
+    return list(zip(*columns))
+
+
+class MappingStore:
+    """
+    中间表批量读写
+
+    参数:
+    - pool: ConnectionPool
+    - table: 表名
+    - chunk_size: 每次 executemany 的行数（一块一个事务）
+    """
+
+    def __init__(self, pool, table=MAPPING_TABLE, chunk_size=CHUNK_SIZE):
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size 必须大于0: {chunk_size}")
+        self.pool = pool
+        self.backend = pool.backend
+        self.table = table
+        self.chunk_size = chunk_size
+
+    def create_table(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            for statement in self.backend.schema(self.table):
+                cursor.execute(statement)
+            cursor.close()
+            conn.commit()
+
+    def _fields(self, frame, batch_id):
+        """写入的字段：frame 中属于中间表的列，批次号可由参数给出"""
+        if batch_id is not None:
+            frame = frame.assign(**{BATCH_FIELD: batch_id})
+        missing = [field for field in KEY_FIELDS if field not in frame.columns]
+        if missing:
+            raise ValueError(f"缺少键字段: {', '.join(missing)}")
+        unknown = [c for c in frame.columns if c not in TABLE_FIELDS and c != 'id']
+        if unknown:
+            raise ValueError(f"中间表没有这些字段: {', '.join(map(str, unknown))}")
+        return frame[[field for field in TABLE_FIELDS if field in frame.columns]]
+
+    def upsert(self, frame, batch_id=None, workers=1):
+        """
+        批量写入映射结果，(mapping_batch_id, source_subject_code) 已存在时覆盖其余字段并递增 version
+
+        参数:
+        - frame: 中间表格式的 DataFrame（列为中间表字段的子集）
+        - batch_id: 批次号，给出时覆盖 frame 的 mapping_batch_id 列
+        - workers: 并行写入的线程数（不超过连接池大小；SQLite 写入串行，保持 1）
+
+        返回: 写入行数
+        """
+        frame = self._fields(frame, batch_id)
+        if frame.duplicated(list(KEY_FIELDS)).any():
+            raise ValueError("同一批次的源科目编码重复")
+        # 按唯一键顺序写入，索引页顺序追加
+        frame = frame.sort_values(list(KEY_FIELDS), kind='stable')
+        fields = list(frame.columns)
+        sql = self.backend.upsert_sql(self.table, fields, [f for f in fields if f not in _KEEP_ON_UPDATE])
+        chunks = [frame.iloc[start:start + self.chunk_size] for start in range(0, len(frame), self.chunk_size)]
+
+        def write(chunk):
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(sql, _records(chunk))
+                cursor.close()
+                conn.commit()
+            return len(chunk)
+
+        if workers <= 1 or len(chunks) <= 1:
+            return sum(write(chunk) for chunk in chunks)
+        with ThreadPoolExecutor(max_workers=min(workers, self.pool.size)) as executor:
+            return sum(executor.map(write, chunks))
+
+    def update(self, batch_id, frame, fields=None):
+        """
+        集合更新：按 source_subject_code 把 frame 中的字段写回批次中的已有行（不存在的源科目忽略）
+
+        参数:
+        - batch_id: 批次号
+        - frame: 包含 source_subject_code 和要更新的字段
+        - fields: 要更新的字段，默认为 frame 中除键以外的全部中间表字段
+
+        返回: 更新的行数
+        """
+        key = KEY_FIELDS[1]
+        if fields is None:
+            fields = [c for c in frame.columns if c in TABLE_FIELDS and c not in KEY_FIELDS]
+        fields = list(fields)
+        unknown = [f for f in fields if f not in TABLE_FIELDS or f in KEY_FIELDS]
+        if unknown or not fields:
+            raise ValueError(f"不能更新的字段: {', '.join(unknown) or '（无）'}")
+        frame = frame[[key, *fields]].drop_duplicates(key, keep='last')
+        columns = [key, *fields]
+        insert = (f"INSERT INTO {_STAGING_TABLE} ({', '.join(columns)}) "
+                  f"VALUES ({', '.join([self.backend.placeholder] * len(columns))})")
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.backend.staging_sql(_STAGING_TABLE, columns))
+            try:
+                for start in range(0, len(frame), self.chunk_size):
+                    cursor.executemany(insert, _records(frame.iloc[start:start + self.chunk_size]))
+                cursor.execute(self.backend.update_sql(self.table, _STAGING_TABLE, key, fields), (batch_id,))
+                updated = cursor.rowcount
+                conn.commit()
+            finally:
+                cursor.execute(self.backend.drop_staging_sql(_STAGING_TABLE))
+                cursor.close()
+        return updated
+
+    def set_fields(self, batch_id, codes, **values):
+        """把批次中一组源科目的若干字段设为同一值，如 set_fields(batch, codes, is_confirmed=1, mapping_status='confirmed')"""
+        codes = pd.unique(np.asarray(list(codes), dtype=object))
+        return self.update(batch_id, pd.DataFrame({KEY_FIELDS[1]: codes, **values}), list(values))
+
+    def delete_batch(self, batch_id):
+        """删除一个批次，返回删除行数"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {self.table} WHERE {BATCH_FIELD} = {self.backend.placeholder}", (batch_id,))
+            deleted = cursor.rowcount
+            cursor.close()
+            conn.commit()
+        return deleted
+
+    def count(self, batch_id, where=''):
+        """批次行数，可附加条件（如 'is_confirmed = 1'）"""
+        sql = f"SELECT COUNT(*) FROM {self.table} WHERE {BATCH_FIELD} = {self.backend.placeholder}"
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql + (f" AND {where}" if where else ''), (batch_id,))
+            count = cursor.fetchone()[0]
+            cursor.close()
+        return count
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from 导账科目转换 import read_confirmed_mapping
+    from 科目精确匹配 import load_target_index
+
+    records = list(load_target_index())
+    rng = np.random.default_rng(0)
+    count = 500_000
+    pick = rng.integers(0, len(records), count)
+    codes = np.array([r.code for r in records], dtype=object)
+    names = np.array([r.name for r in records], dtype=object)
+    batch = pd.DataFrame({
+        'source_system_code': 'U8',
+        'source_system_name': '用友U8',
+        'source_subject_code': [f'{c}{i:07d}' for c, i in zip(codes[pick], range(count))],
+        'source_subject_name': names[pick],
+        'source_subject_level': 2,
+        'target_subject_code': codes[pick],
+        'target_subject_name': names[pick],
+        'match_type': 'hierarchy_match',
+        'match_method': 'traditional_rule',
+        'match_score': np.round(rng.uniform(60, 100, count), 2),
+        'match_confidence': '中',
+        'mapping_status': 'matched',
+    })
+
+    with tempfile.TemporaryDirectory() as directory:
+        with ConnectionPool(SqliteBackend(os.path.join(directory, 'mapping.sqlite3'))) as pool:
+            store = MappingStore(pool)
+            store.create_table()
+
+            start = time.perf_counter()
+            written = store.upsert(batch, batch_id='B001')
+            print(f"✅ 写入 {written} 行，耗时 {time.perf_counter() - start:.2f} 秒")
+
+            # 重新匹配后覆盖一部分行
+            start = time.perf_counter()
+            rematched = batch.iloc[:100_000].assign(match_type='template', match_method='template', match_score=100)
+            store.upsert(rematched, batch_id='B001')
+            print(f"✅ 覆盖 {len(rematched)} 行，耗时 {time.perf_counter() - start:.2f} 秒")
+
+            # 用户确认高分映射：一次集合更新
+            start = time.perf_counter()
+            confirmed = batch['source_subject_code'][batch['match_score'] >= 80]
+            updated = store.set_fields('B001', confirmed, is_confirmed=1, mapping_status='confirmed',
+                                       review_status='manual_approved')
+            print(f"✅ 确认 {updated} 行，耗时 {time.perf_counter() - start:.2f} 秒")
+
+            with pool.connection() as conn:
+                mapping = read_confirmed_mapping(conn, 'B001')
+            print(f"📊 批次 {store.count('B001')} 行，已确认 {store.count('B001', 'is_confirmed = 1')} 行，"
+                  f"进入导账 {len(mapping)} 行，"
+                  f"版本2 {store.count('B001', 'version = 2')} 行")
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+一对多/多对一映射与完整性校验（见 映射结果校验规则分析.md 4.6、4.7 规则 R12–R16、R21）
+整个批次只扫描一次：按块读取中间表 account_mapping_temp（服务端游标 fetchmany），
+边读边更新哈希聚合，不把批次加载为 DataFrame，内存只与源科目数和目标科目表大小有关：
+- 每个源科目（源系统编码 + 规范化编码）：行数、各目标科目的行数、是否标记为一对多（match_type=multi_target）
+- 每个目标科目（按目标科目表位置的数组）：不同源科目数、源科目类别/借贷的位图、是否被使用
+
+R12 多对一合并了类别或借贷不同的源科目；R13 标记为一对多的源科目（需确认拆分规则已配置）；
+R14 源科目没有有效的目标科目（或有余额/发生额的科目不在批次中）；R15 未标记的一对多及重复记录；
+R16 目标科目被过多或性质差异很大的源科目映射；R21 必需的目标科目（默认一级科目）及其下级都未被使用
+"""
+
+import numpy as np
+import pandas as pd
+
+from 映射中间表存储 import MAPPING_TABLE, server_side_cursor
+from 映射结果校验 import PROFIT_DETAIL_ALIASES, RULES
+from 科目候选生成 import CATEGORY_ALIASES, DIRECTION_ALIASES
+from 科目索引 import clean_value, normalize_code
+from 科目精确匹配 import load_target_index
+
+# 从中间表读取的字段（按此顺序组成每行的元组）
+CHECK_FIELDS = ['source_system_code', 'source_subject_code', 'source_subject_name', 'source_subject_type',
+                'source_debit_credit', 'target_subject_code', 'match_type']
+
+CHUNK_SIZE = 50000
+
+# 刻意设计的一对多映射（见 科目映射中间表设计方案.md match_type 枚举）
+MULTI_TARGET = 'multi_target'
+
+# R16：一个目标科目的不同源科目数达到此数，或源科目类别达到此数时提示
+OVERLOAD_SOURCES = 20
+OVERLOAD_CATEGORIES = 3
+
+# 说明中列出的源科目/目标科目个数上限
+SAMPLE_LIMIT = 5
+
+FINDING_COLUMNS = ['rule', 'severity', 'title', 'source_system_code', 'source_subject_code',
+                   'source_subject_name', 'target_subject_code', 'message']
+
+DIRECTION_BITS = {'借': 1, '贷': 2}
+
+
+def read_mapping_chunks(conn, batch_id, chunk_size=CHUNK_SIZE, placeholder='?'):
+    """
+    按块读取一个映射批次（服务端游标 + fetchmany，不一次取回全部结果；见 映射中间表存储.server_side_cursor）
+
+    参数:
+    - conn: DB-API 连接（sqlite3、pymysql 等）
+    - batch_id: mapping_batch_id
+    - placeholder: 参数占位符，sqlite3 为 '?'，pymysql 为 '%s'
+
+    返回: 生成器，每次一个行元组列表（字段顺序见 CHECK_FIELDS）
+    """
+    cursor = server_side_cursor(conn)
+    try:
+        cursor.execute(f"SELECT {', '.join(CHECK_FIELDS)} FROM {MAPPING_TABLE} "
+                       f"WHERE mapping_batch_id = {placeholder}", (batch_id,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+class CardinalityChecker:
+    """
+    映射基数与完整性的流式校验器：feed() 逐块累积聚合，findings() 生成问题表
+
+    参数:
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    - required_targets: 必须被使用的目标科目编码，默认为全部一级科目；使用其下级科目也算使用
+    - overload_sources / overload_categories: R16 的阈值
+    """
+
+    def __init__(self, target=None, required_targets=None, overload_sources=OVERLOAD_SOURCES,
+                 overload_categories=OVERLOAD_CATEGORIES):
+        if target is None:
+            target = load_target_index()
+        records = list(target)
+        self.target_codes = [r.code for r in records]
+        self.target_names = [r.name for r in records]
+        self.positions = {code: i for i, code in enumerate(self.target_codes)}
+        self.target_parent = np.array([self.positions.get(r.parent_code, -1) for r in records])
+        if required_targets is None:
+            required_targets = [r.code for r in target.top_level()]
+        self.required = [self.positions[c] for c in map(normalize_code, required_targets) if c in self.positions]
+        self.overload_sources = overload_sources
+        self.overload_categories = overload_categories
+
+        size = len(records)
+        self.target_sources = np.zeros(size, dtype=np.int64)
+        self.target_category_bits = np.zeros(size, dtype=np.int64)
+        self.target_direction_bits = np.zeros(size, dtype=np.int8)
+        self.target_samples = [[] for _ in range(size)]
+        # 源科目键 -> [名称, 行数, {目标位置: 行数}, 是否标记一对多, 类别位, 借贷位, 无效目标编码]
+        self.sources = {}
+        self.categories = {}
+        # 取值有限的列按原值缓存：目标编码 -> 目标科目位置（-1 不在目标科目表中，-2 为空）、
+        # 无效目标编码 -> 规范化编码、源系统编码和匹配类型 -> 清洗结果
+        self._targets = {}
+        self._invalid = {}
+        self._values = {}
+        self.stats = {'rows': 0, 'chunks': 0}
+
+    def _clean(self, value):
+        cleaned = self._values.get(value)
+        if cleaned is None:
+            cleaned = self._values[value] = clean_value(value)
+        return cleaned
+
+    def _target(self, value):
+        position = self._targets.get(value)
+        if position is None:
+            code = normalize_code(value)
+            position = self._targets[value] = self.positions.get(code, -1 if code else -2)
+            if position == -1:
+                self._invalid[value] = code
+        return position
+
+    def _category_bit(self, value):
+        value = clean_value(value)
+        label = PROFIT_DETAIL_ALIASES.get(value) or CATEGORY_ALIASES.get(value, value)
+        if not label:
+            return 0
+        bit = self.categories.get(label)
+        if bit is None:
+            bit = self.categories[label] = 1 << len(self.categories)
+        return bit
+
+    def feed(self, rows):
+        """累积一块行元组（字段顺序见 CHECK_FIELDS）"""
+        sources = self.sources
+        for system, code, name, category, direction, target_code, match_type in rows:
+            key = (self._clean(system), normalize_code(code))
+            record = sources.get(key)
+            if record is None:
+                direction = clean_value(direction)
+                record = sources[key] = [clean_value(name), 0, {}, False, self._category_bit(category),
+                                         DIRECTION_BITS.get(DIRECTION_ALIASES.get(direction, direction), 0), '']
+            record[1] += 1
+            if self._clean(match_type) == MULTI_TARGET:
+                record[3] = True
+            position = self._target(target_code)
+            if position < 0:
+                if position == -1:
+                    record[6] = self._invalid[target_code]
+                continue
+            targets = record[2]
+            if position in targets:
+                targets[position] += 1
+                continue
+            targets[position] = 1
+            self.target_sources[position] += 1
+            self.target_category_bits[position] |= record[4]
+            self.target_direction_bits[position] |= record[5]
+            samples = self.target_samples[position]
+            if len(samples) < SAMPLE_LIMIT:
+                samples.append(key[1])
+        self.stats['rows'] += len(rows)
+        self.stats['chunks'] += 1
+
+    def used_targets(self):
+        """被使用的目标科目（位图）：直接被映射的科目及其全部上级"""
+        used = self.target_sources > 0
+        frontier = np.flatnonzero(used)
+        while len(frontier):
+            parents = self.target_parent[frontier]
+            parents = parents[parents >= 0]
+            frontier = parents[~used[parents]]
+            used[frontier] = True
+        return used
+
+    def findings(self, active_sources=None):
+        """
+        生成问题表
+
+        参数:
+        - active_sources: 可选，源系统中有余额或有发生额的科目 [(源系统编码, 科目编码)] 或科目编码列表，
+          不在批次中的记为 R14
+
+        返回: DataFrame（rule、severity、title、源科目、目标科目、message），按规则排序
+        """
+        labels = {bit: label for label, bit in self.categories.items()}
+        found = []
+
+        def add(rule, message, key=('', ''), name='', target=''):
+            found.append((rule, RULES[rule]['severity'], RULES[rule]['title'], key[0], key[1], name, target, message))
+
+        def target_label(position):
+            return f"{self.target_codes[position]} {self.target_names[position]}"
+
+        for key, (name, rows, targets, multi, _, _, invalid) in self.sources.items():
+            if not targets:
+                add('R14', f"目标科目编码 {invalid} 不在目标科目表中" if invalid else '没有有效的目标科目', key, name)
+                continue
+            if len(targets) > 1:
+                codes = '、'.join(target_label(p) for p in list(targets)[:SAMPLE_LIMIT])
+                if multi:
+                    add('R13', f"拆分到 {len(targets)} 个目标科目（{codes}），需确认拆分比例或规则已配置", key, name)
+                else:
+                    add('R15', f"未标记为一对多，却映射到 {len(targets)} 个目标科目（{codes}）", key, name)
+            duplicated = [p for p, count in targets.items() if count > 1]
+            for position in duplicated:
+                add('R15', f"同一映射重复 {targets[position]} 条", key, name, self.target_codes[position])
+
+        if active_sources is not None:
+            codes = {key[1] for key in self.sources}
+            for entry in active_sources:
+                key = (clean_value(entry[0]), normalize_code(entry[1])) if isinstance(entry, tuple) \
+                    else ('', normalize_code(entry))
+                if key not in self.sources and (key[0] or key[1] not in codes):
+                    add('R14', '有余额或发生额，但不在映射批次中', key)
+
+        merged = np.flatnonzero(self.target_sources > 1)
+        for position in merged:
+            bits = int(self.target_category_bits[position])
+            kinds = [labels[1 << i] for i in range(bits.bit_length()) if bits >> i & 1]
+            count = int(self.target_sources[position])
+            samples = '、'.join(self.target_samples[position]) + ('…' if count > SAMPLE_LIMIT else '')
+            if len(kinds) > 1 or self.target_direction_bits[position] == 3:
+                detail = f"类别 {'/'.join(kinds)}" if len(kinds) > 1 else '借贷方向不同'
+                add('R12', f"{count} 个源科目（{samples}）合并到此科目，{detail}", target=self.target_codes[position])
+            if count >= self.overload_sources or len(kinds) >= self.overload_categories:
+                add('R16', f"被 {count} 个源科目映射，涉及类别 {'/'.join(kinds) or '未知'}",
+                    target=self.target_codes[position])
+
+        used = self.used_targets()
+        for position in self.required:
+            if not used[position]:
+                add('R21', f"{self.target_names[position]}及其下级科目均未被映射", target=self.target_codes[position])
+
+        order = {rule: i for i, rule in enumerate(RULES)}
+        found.sort(key=lambda f: order[f[0]])
+        return pd.DataFrame(found, columns=FINDING_COLUMNS)
+
+    def summary(self):
+        """聚合规模：行数、源科目数、被映射的目标科目数"""
+        return dict(self.stats, sources=len(self.sources), targets=int((self.target_sources > 0).sum()))
+
+
+def check_cardinality(chunks, target=None, required_targets=None, active_sources=None):
+    """
+    流式校验一个映射批次（R12–R16、R21）
+
+    参数:
+    - chunks: 行元组的块（见 read_mapping_chunks）
+    - target / required_targets: 见 CardinalityChecker
+    - active_sources: 见 CardinalityChecker.findings
+
+    返回: (findings, summary)
+    """
+    checker = CardinalityChecker(target, required_targets)
+    for rows in chunks:
+        checker.feed(rows)
+    return checker.findings(active_sources), checker.summary()
+
+
+if __name__ == "__main__":
+    import sqlite3
+    import time
+
+    index = load_target_index()
+    conn = sqlite3.connect(':memory:')
+    conn.execute(f"CREATE TABLE {MAPPING_TABLE} (id INTEGER PRIMARY KEY, mapping_batch_id TEXT, "
+                 f"{', '.join(f'{field} TEXT' for field in CHECK_FIELDS)})")
+
+    # 映射结果校验规则分析.md 中的示例
+    sample = [
+        ('U8', '660201', '差旅费', '费用', '借', '5602', 'semantic_match'),
+        ('U8', '660202', '交通费', '费用', '借', '5602', 'semantic_match'),
+        ('U8', '6001', '主营业务收入', '收入', '贷', '5001', 'exact_match'),
+        ('U8', '6301', '营业外收入', '收入', '贷', '5001', 'semantic_match'),
+        ('U8', '1221', '其他应收款', '资产', '借', '1221', MULTI_TARGET),
+        ('U8', '1221', '其他应收款', '资产', '借', '1122', MULTI_TARGET),
+        ('U8', '2241', '其他应付款', '负债', '贷', '2241', 'exact_match'),
+        ('U8', '2241', '其他应付款', '负债', '贷', '2202', 'semantic_match'),
+        ('U8', '1001', '库存现金', '资产', '借', '1001', 'exact_match'),
+        ('U8', '1001', '库存现金', '资产', '借', '1001', 'exact_match'),
+        ('U8', '1405', '库存商品', '资产', '借', '1405', 'exact_match'),
+        ('U8', '4101', '制造费用', '成本', '借', '1405', 'semantic_match'),
+        ('U8', '1901', '待处理财产损溢', '资产', '借', '', 'unmatched'),
+        ('U8', '1531', '长期应收款', '资产', '借', '1531', 'semantic_match'),
+    ]
+    conn.executemany(f"INSERT INTO {MAPPING_TABLE} (mapping_batch_id, {', '.join(CHECK_FIELDS)}) "
+                     f"VALUES ('DEMO', {', '.join('?' * len(CHECK_FIELDS))})", sample)
+    findings, summary = check_cardinality(read_mapping_chunks(conn, 'DEMO', chunk_size=4), index,
+                                          required_targets=['1001', '1002', '5001', '5602'],
+                                          active_sources=['1001', '1002'])
+    print(findings[['rule', 'severity', 'source_subject_code', 'target_subject_code', 'message']].to_string())
+    print(f"📊 {summary}")
+
+    # 性能：50万行批次，分块读取
+    records = list(index)
+    rng = np.random.default_rng(0)
+    count = 500_000
+    source_rows = rng.integers(0, len(records), count)
+    target_rows = np.where(rng.random(count) < 0.95, source_rows, rng.integers(0, len(records), count))
+    conn.executemany(
+        f"INSERT INTO {MAPPING_TABLE} (mapping_batch_id, {', '.join(CHECK_FIELDS)}) "
+        f"VALUES ('BIG', {', '.join('?' * len(CHECK_FIELDS))})",
+        ((f'SYS{i % 3}', f"{records[s].code}{i % 2000:04d}", records[s].name, records[s].category,
+          records[s].debit_credit, records[t].code if i % 997 else '', 'semantic_match')
+         for i, (s, t) in enumerate(zip(source_rows.tolist(), target_rows.tolist()))))
+    start = time.perf_counter()
+    findings, summary = check_cardinality(read_mapping_chunks(conn, 'BIG'), index)
+    print(f"\n✅ 校验 {summary['rows']} 行（{summary['chunks']} 块），耗时 {time.perf_counter() - start:.2f} 秒，"
+          f"问题 {len(findings)} 条")
+    print(f"📊 {summary}，{findings['rule'].value_counts().to_dict()}")
+    conn.close()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+映射结果校验（见 映射结果校验规则分析.md 规则 R1–R11）
+映射批次与源科目属性、目标科目属性（默认科目表中的类别、借贷、资产负债表/利润表、是否直接影响*、辅助核算）
+各做一次连接，之后每条规则都是整列计算的布尔掩码：
+- 逐行结果：validation_result（pass/fail/warning）、validation_message、conflict_flag、conflict_detail
+- 问题表：每条违反的规则一行（行号、源科目、目标科目、规则、严重性、说明）
+
+规则之间的分工（避免同一问题重复报告）：
+- R1 同组内类别不一致（资产/负债/权益之间，成本/损益之间，损益-收入与损益-费用之间），R2 跨组（成本/损益 ↔ 资产/负债/权益）
+- R3 借贷相反且类别不同（或类别未知），R4 借贷相反但类别相同
+- R7 只在 R5/R6 未命中时检查"直接影响"，R9 只在 R8 未命中时检查辅助核算信息丢失
+- R10 子科目的目标科目应为最近的已映射上级科目的目标科目或其下级（科目层级校验，O(n)），R11 检查同一父科目下子科目的目标上级是否一致
+
+白名单按 (规则, 源科目编码, 目标科目编码) 放行，编码为空表示任意；默认白名单放行资产类备抵科目（累计折旧等，贷方余额）的 R3/R4
+"""
+
+import numpy as np
+import pandas as pd
+
+from 科目候选生成 import CATEGORY_ALIASES, DIRECTION_ALIASES
+from 科目精确匹配 import SOURCE_CODE_FIELD, SOURCE_NAME_FIELD, load_target_index, normalize_code_column
+from 科目层级校验 import HierarchyChecker, infer_parent_codes
+from 科目索引 import clean_value
+
+# 规则：严重性（error 阻止导账 / warning 需确认 / info 提示）和说明，顺序即报告顺序
+RULES = {
+    'R1': {'severity': 'error', 'title': '会计类别不一致'},
+    'R2': {'severity': 'warning', 'title': '成本/损益与资产/负债/权益跨类映射'},
+    'R3': {'severity': 'error', 'title': '借贷方向不一致'},
+    'R4': {'severity': 'warning', 'title': '类别相同但借贷方向相反'},
+    'R5': {'severity': 'error', 'title': '资产负债表归属不一致'},
+    'R6': {'severity': 'error', 'title': '利润表归属不一致'},
+    'R7': {'severity': 'warning', 'title': '直接影响报表的科目映射到间接影响的科目'},
+    'R8': {'severity': 'warning', 'title': '关键辅助核算维度丢失'},
+    'R9': {'severity': 'warning', 'title': '辅助核算信息丢失'},
+    'R10': {'severity': 'warning', 'title': '父子科目结构不一致'},
+    'R11': {'severity': 'warning', 'title': '同一父科目的子科目映射到不同的目标上级'},
+    # 一对多/多对一与完整性（映射完整性校验，按整批聚合，不产生逐行结果）
+    'R12': {'severity': 'warning', 'title': '多对一映射合并了性质不同的源科目'},
+    'R13': {'severity': 'warning', 'title': '一对多映射需有拆分规则'},
+    'R14': {'severity': 'info', 'title': '未映射科目'},
+    'R15': {'severity': 'info', 'title': '重复映射'},
+    'R16': {'severity': 'info', 'title': '目标科目超载'},
+    # 父科目到子科目拆分（科目拆分，见 父科目到子科目拆分处理方案.md）
+    'R17': {'severity': 'error', 'title': '父科目拆分金额不完整'},
+    'R18': {'severity': 'warning', 'title': '拆分规则不合理'},
+    # 必需目标科目的使用情况（映射完整性校验）
+    'R21': {'severity': 'info', 'title': '必需的目标科目未被使用'},
+}
+
+# validation_result 的取值：有 error 为 fail，只有 warning 为 warning
+VALIDATION_RESULTS = {'error': 'fail', 'warning': 'warning', 'info': 'pass'}
+
+# 源科目的可选属性列（没有时按类别推断或不检查），取值为 是/否
+SOURCE_TYPE_FIELD = 'source_subject_type'
+SOURCE_DIRECTION_FIELD = 'source_debit_credit'
+SOURCE_AUXILIARY_FIELD = 'source_auxiliary_info'
+SOURCE_PARENT_FIELD = 'source_parent_code'
+SOURCE_BALANCE_SHEET_FIELD = 'source_balance_sheet'
+SOURCE_PROFIT_SHEET_FIELD = 'source_profit_sheet'
+SOURCE_DIRECT_BALANCE_FIELD = 'source_direct_balance_sheet'
+SOURCE_DIRECT_PROFIT_FIELD = 'source_direct_profit_sheet'
+
+# 会计要素分组（R1 组内、R2 跨组）
+BALANCE_GROUP = ('资产', '负债', '权益')
+PROFIT_GROUP = ('成本', '损益')
+
+# 源系统的收入/费用类型对应默认科目表的 损益细分
+PROFIT_DETAIL_ALIASES = {'收入': '损益-收入', '费用': '损益-费用'}
+
+# 关键辅助核算维度（默认科目表中 辅助核算是否必要=是 的科目：1122/1405/2202）
+KEY_AUXILIARY_DIMENSIONS = ('客户', '供应商', '存货')
+
+
+def default_whitelist(target):
+    """默认白名单：资产类备抵科目（类别为资产、借贷为贷，如累计折旧、坏账准备）放行 R3/R4"""
+    return [{'rule': rule, 'source_code': '', 'target_code': record.code,
+             'reason': f"{record.name}为资产类备抵科目（贷方余额）"}
+            for record in target if record.category == '资产' and record.debit_credit == '贷'
+            for rule in ('R3', 'R4')]
+
+
+# ---------------------------------------------------------------------------
+# 属性连接
+# ---------------------------------------------------------------------------
+
+def _map_unique(values, func):
+    """对列的唯一值调用 func，再按编码展开（重复值多时比逐行调用快得多）"""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    return np.array([func(v) for v in uniques], dtype=object)[codes] if len(codes) else \
+        np.array([], dtype=object)
+
+
+def _word_flags(values, words):
+    """文本列是否包含各个词 {词: 布尔数组}，只对唯一值判断"""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    return {word: np.array([word in clean_value(v) for v in uniques], dtype=bool)[codes] for word in words}
+
+
+def _flag(values):
+    """是/否 列：以'是'开头为 True"""
+    return _map_unique(values, lambda v: clean_value(v).startswith('是')).astype(bool)
+
+
+def _text(values):
+    return _map_unique(values, clean_value)
+
+
+def target_attributes(target):
+    """目标科目表（含报表归属、辅助核算等全部属性），行顺序与 SubjectIndex 一致"""
+    records = list(target)
+    return pd.DataFrame({
+        'code': [r.code for r in records],
+        'name': [r.name for r in records],
+        'parent_code': [r.parent_code for r in records],
+        'category': [r.category for r in records],
+        'debit_credit': [r.debit_credit for r in records],
+        'auxiliary': [r.auxiliary for r in records],
+        'balance_sheet': [r.balance_sheet for r in records],
+        'profit_sheet': [r.profit_sheet for r in records],
+        'direct_balance_sheet': [r.direct_balance_sheet for r in records],
+        'direct_profit_sheet': [r.direct_profit_sheet for r in records],
+        'profit_loss_detail': [r.profit_loss_detail for r in records],
+    })
+
+
+class ValidationFrame:
+    """
+    校验所需的全部列（numpy 数组）：映射批次与源科目属性、目标科目属性各连接一次
+
+    参数:
+    - mapping: 映射批次（中间表格式）
+    - target: 目标科目的 SubjectIndex
+    - source: 可选，源科目表（source_subject_code + 源属性列），映射批次中缺少的源属性从这里连接
+    """
+
+    def __init__(self, mapping, target, source=None):
+        self.size = len(mapping)
+        self.source_code = normalize_code_column(mapping[SOURCE_CODE_FIELD])
+        self.source_name = _text(mapping[SOURCE_NAME_FIELD]) if SOURCE_NAME_FIELD in mapping.columns else \
+            np.full(self.size, '', dtype=object)
+
+        source_position = None
+        if source is not None:
+            source_codes = pd.Index(normalize_code_column(source[SOURCE_CODE_FIELD]))
+            unique = ~source_codes.duplicated()
+            hit = source_codes[unique].get_indexer(self.source_code)
+            source_position = np.where(hit >= 0, np.flatnonzero(unique)[np.maximum(hit, 0)], -1)
+
+        def source_column(field):
+            if field in mapping.columns:
+                return mapping[field].to_numpy(dtype=object)
+            if source_position is not None and field in source.columns:
+                values = source[field].to_numpy(dtype=object)
+                return np.where(source_position >= 0, values[np.maximum(source_position, 0)], None)
+            return None
+
+        raw_type = source_column(SOURCE_TYPE_FIELD)
+        raw_type = _text(raw_type) if raw_type is not None else np.full(self.size, '', dtype=object)
+        self.source_category = _map_unique(raw_type, lambda v: CATEGORY_ALIASES.get(v, v))
+        self.source_detail = _map_unique(raw_type, lambda v: PROFIT_DETAIL_ALIASES.get(v, ''))
+        raw_direction = source_column(SOURCE_DIRECTION_FIELD)
+        self.source_direction = _map_unique(raw_direction, lambda v: DIRECTION_ALIASES.get(clean_value(v),
+                                                                                           clean_value(v))) \
+            if raw_direction is not None else np.full(self.size, '', dtype=object)
+        auxiliary = source_column(SOURCE_AUXILIARY_FIELD)
+        self.source_auxiliary = _map_unique(auxiliary, lambda v: '' if clean_value(v) in ('{}', '[]', 'null')
+                                            else clean_value(v)) \
+            if auxiliary is not None else np.full(self.size, '', dtype=object)
+
+        # 报表归属：有标记列时使用标记，否则按类别推断（R7 的"直接影响资产负债表"只在有标记时检查）
+        def source_flag(field, inferred):
+            values = source_column(field)
+            return _flag(values) if values is not None else inferred
+
+        self.source_balance_sheet = source_flag(SOURCE_BALANCE_SHEET_FIELD,
+                                                np.isin(self.source_category, BALANCE_GROUP + ('成本',)))
+        self.source_profit_sheet = source_flag(SOURCE_PROFIT_SHEET_FIELD, np.isin(self.source_category, PROFIT_GROUP))
+        self.source_direct_profit = source_flag(SOURCE_DIRECT_PROFIT_FIELD, self.source_category == '损益')
+        self.source_direct_balance = source_flag(SOURCE_DIRECT_BALANCE_FIELD, np.zeros(self.size, dtype=bool))
+
+        parents = source_column(SOURCE_PARENT_FIELD)
+        self.source_parent = normalize_code_column(parents) if parents is not None else \
+            infer_parent_codes(self.source_code)
+
+        # 目标科目属性：按编码连接默认科目表
+        self.target_code = normalize_code_column(mapping['target_subject_code']) \
+            if 'target_subject_code' in mapping.columns else np.full(self.size, '', dtype=object)
+        chart = target_attributes(target)
+        position = pd.Index(chart['code']).get_indexer(self.target_code)
+        position[self.target_code == ''] = -1
+        self.mapped = position >= 0
+        take = np.maximum(position, 0)
+
+        def target_column(values, empty=''):
+            values = np.asarray(values)[take]
+            values[~self.mapped] = empty
+            return values
+
+        def chart_column(field):
+            return chart[field].to_numpy(dtype=object)
+
+        self.target_name = target_column(chart_column('name'))
+        self.target_parent = target_column(chart_column('parent_code'))
+        self.target_category = target_column(chart_column('category'))
+        self.target_direction = target_column(chart_column('debit_credit'))
+        self.target_detail = target_column(chart_column('profit_loss_detail'))
+        self.target_auxiliary = target_column(chart_column('auxiliary'))
+        # 是/否 标记先在目标科目表上计算，再按位置展开
+        self.target_balance_sheet = target_column(_flag(chart_column('balance_sheet')), False)
+        self.target_profit_sheet = target_column(_flag(chart_column('profit_sheet')), False)
+        self.target_direct_balance = target_column(chart_column('direct_balance_sheet') == '是', False)
+        self.target_direct_profit = target_column(chart_column('direct_profit_sheet') == '是', False)
+
+        # 关键辅助核算维度
+        self.source_dimensions = _word_flags(self.source_auxiliary, KEY_AUXILIARY_DIMENSIONS)
+        self.target_dimensions = {word: target_column(flags, False) for word, flags in
+                                  _word_flags(chart_column('auxiliary'), KEY_AUXILIARY_DIMENSIONS).items()}
+        # 最近的已映射上级科目的行号（R10 校验时填充）
+        self.anchor = np.full(self.size, -1, dtype=np.int64)
+
+
+# ---------------------------------------------------------------------------
+# 规则
+# ---------------------------------------------------------------------------
+
+def _rule_masks(frame, checker):
+    """各规则的违反掩码 {规则: 布尔数组}"""
+    f = frame
+    mapped = f.mapped
+    categories = mapped & (f.source_category != '') & (f.target_category != '')
+    same_group = np.isin(f.source_category, BALANCE_GROUP) == np.isin(f.target_category, BALANCE_GROUP)
+    detail_differs = (f.source_detail != '') & (f.target_detail != '') & (f.source_detail != f.target_detail)
+    category_differs = categories & ((f.source_category != f.target_category) | detail_differs)
+    directions = mapped & (f.source_direction != '') & (f.target_direction != '')
+    direction_differs = directions & (f.source_direction != f.target_direction)
+    same_category = categories & ~category_differs
+
+    masks = {
+        'R1': category_differs & same_group,
+        'R2': category_differs & ~same_group,
+        'R3': direction_differs & ~same_category,
+        'R4': direction_differs & same_category,
+        'R5': mapped & f.source_balance_sheet & ~f.target_balance_sheet,
+        'R6': mapped & f.source_profit_sheet & ~f.target_profit_sheet,
+    }
+    masks['R7'] = mapped & (
+        (f.source_direct_profit & f.target_profit_sheet & ~f.target_direct_profit & ~masks['R6'])
+        | (f.source_direct_balance & f.target_balance_sheet & ~f.target_direct_balance & ~masks['R5']))
+
+    lost = np.zeros(f.size, dtype=bool)
+    for dimension in KEY_AUXILIARY_DIMENSIONS:
+        lost |= f.source_dimensions[dimension] & ~f.target_dimensions[dimension]
+    masks['R8'] = mapped & lost
+    masks['R9'] = mapped & ~lost & (f.source_auxiliary != '') & (f.target_auxiliary == '')
+
+    masks['R10'], masks['R11'] = _structure_masks(f, checker)
+    return masks
+
+
+def _structure_masks(f, checker):
+    """R10：子科目的目标不在最近的已映射上级科目的目标之下；R11：同一父科目的子科目映射到不同的目标上级"""
+    fractured, f.anchor = checker.check(f.source_code, f.source_parent, f.target_code)
+
+    # 目标上级：目标科目的父科目，一级科目为自身（子科目合并到目标父科目时与映射到其下级的兄弟一致）
+    children = f.mapped & (f.source_parent != '')
+    group = np.where(f.target_parent != '', f.target_parent, f.target_code)
+    frame = pd.DataFrame({'parent': f.source_parent[children], 'group': group[children]})
+    split = np.zeros(f.size, dtype=bool)
+    if len(frame):
+        split[children] = frame.groupby('parent')['group'].transform('nunique').to_numpy() > 1
+    return fractured, split
+
+
+def _rule_details(rule, f, rows):
+    """问题表中的说明（只对命中行生成）"""
+    def pairs(source, target):
+        return [f"{s or '未知'} → {t or '未知'}" for s, t in zip(source[rows], target[rows])]
+
+    if rule in ('R1', 'R2'):
+        source = np.where(f.source_detail[rows] != '', f.source_detail[rows], f.source_category[rows])
+        target = np.where(f.target_detail[rows] != '', f.target_detail[rows], f.target_category[rows])
+        return [f"类别：{s} → {t}" for s, t in zip(source, target)]
+    if rule in ('R3', 'R4'):
+        return [f"借贷：{d}" for d in pairs(f.source_direction, f.target_direction)]
+    if rule == 'R5':
+        return ['源科目属于资产负债表，目标科目不属于资产负债表'] * len(rows)
+    if rule == 'R6':
+        return ['源科目属于利润表，目标科目不属于利润表'] * len(rows)
+    if rule == 'R7':
+        return ['目标科目不直接影响报表（通过父科目汇总或间接影响）'] * len(rows)
+    if rule in ('R8', 'R9'):
+        return [f"辅助核算：{d}" for d in pairs(f.source_auxiliary, f.target_auxiliary)]
+    if rule == 'R10':
+        anchor = f.anchor[rows]
+        return [f"上级科目 {p}（→ {a}）的子科目映射到 {t}，不在上级科目的目标科目之下"
+                for p, a, t in zip(f.source_code[anchor], f.target_code[anchor], f.target_code[rows])]
+    group = np.where(f.target_parent[rows] != '', f.target_parent[rows], f.target_code[rows])
+    return [f"父科目 {p} 的子科目映射到不同的目标上级（本科目的目标上级为 {g}）"
+            for p, g in zip(f.source_parent[rows], group)]
+
+
+def _apply_whitelist(masks, frame, whitelist):
+    """白名单放行：返回每条规则被放行的行数"""
+    allowed = {}
+    for rule in masks:
+        entries = [e for e in whitelist if e.get('rule') == rule]
+        if not entries:
+            continue
+        exempt = np.zeros(frame.size, dtype=bool)
+        for entry in entries:
+            match = np.ones(frame.size, dtype=bool)
+            if clean_value(entry.get('source_code')):
+                match &= frame.source_code == normalize_code_column([entry['source_code']])[0]
+            if clean_value(entry.get('target_code')):
+                match &= frame.target_code == normalize_code_column([entry['target_code']])[0]
+            exempt |= match
+        allowed[rule] = int((masks[rule] & exempt).sum())
+        masks[rule] &= ~exempt
+    return allowed
+
+
+# ---------------------------------------------------------------------------
+# 校验
+# ---------------------------------------------------------------------------
+
+def validate_mapping(mapping, target=None, source=None, whitelist=None):
+    """
+    对映射批次执行规则 R1–R11 校验
+
+    参数:
+    - mapping: 映射批次（中间表格式）：source_subject_code、target_subject_code，可选源科目属性列
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    - source: 可选，源科目表，用于补充映射批次中没有的源科目属性
+    - whitelist: 白名单 [{'rule', 'source_code', 'target_code', 'reason'}]，默认为 default_whitelist(target)
+
+    返回: (result, issues, stats)
+    - result: mapping 的副本，加上 validation_result、validation_message、conflict_flag、conflict_detail
+    - issues: 问题表（row、源科目、目标科目、rule、severity、message），按规则、行号排序
+    - stats: 各规则的问题数和白名单放行数；R10 另含断裂的子树数（subtrees）
+    """
+    if target is None:
+        target = load_target_index()
+    if whitelist is None:
+        whitelist = default_whitelist(target)
+    frame = ValidationFrame(mapping, target, source)
+    masks = _rule_masks(frame, HierarchyChecker(target))
+    allowed = _apply_whitelist(masks, frame, whitelist)
+
+    # 每行命中的规则编码为位掩码，相同组合的结果和说明只生成一次
+    rules = list(masks)
+    bits = np.zeros(frame.size, dtype=np.int64)
+    for i, rule in enumerate(rules):
+        bits |= masks[rule].astype(np.int64) << i
+    combos, inverse = np.unique(bits, return_inverse=True)
+    results, messages, details = [], [], []
+    for combo in combos.tolist():
+        hit = [rule for i, rule in enumerate(rules) if combo >> i & 1]
+        severities = {RULES[rule]['severity'] for rule in hit}
+        results.append(next((VALIDATION_RESULTS[s] for s in ('error', 'warning', 'info') if s in severities), 'pass'))
+        messages.append('；'.join(f"{rule} {RULES[rule]['title']}" for rule in hit) or None)
+        details.append(','.join(hit) or None)
+
+    result = mapping.copy()
+    result['validation_result'] = np.array(results, dtype=object)[inverse]
+    result['validation_message'] = np.array(messages, dtype=object)[inverse]
+    result['conflict_flag'] = (bits != 0).astype(np.int8)
+    result['conflict_detail'] = np.array(details, dtype=object)[inverse]
+
+    parts = []
+    for rule in rules:
+        rows = np.flatnonzero(masks[rule])
+        if not len(rows):
+            continue
+        parts.append(pd.DataFrame({
+            'row': rows,
+            'source_subject_code': frame.source_code[rows],
+            'source_subject_name': frame.source_name[rows],
+            'target_subject_code': frame.target_code[rows],
+            'target_subject_name': frame.target_name[rows],
+            'rule': rule,
+            'severity': RULES[rule]['severity'],
+            'title': RULES[rule]['title'],
+            'message': _rule_details(rule, frame, rows),
+        }))
+    issues = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+        columns=['row', 'source_subject_code', 'source_subject_name', 'target_subject_code',
+                 'target_subject_name', 'rule', 'severity', 'title', 'message'])
+
+    stats = {rule: {'issues': int(masks[rule].sum()), 'whitelisted': allowed.get(rule, 0)} for rule in rules}
+    stats['R10']['subtrees'] = len(np.unique(frame.anchor[masks['R10']]))
+    return result, issues, stats
+
+
+def summarize(result, stats):
+    """校验结果汇总：各结果的行数和各规则的问题数"""
+    return {
+        'results': result['validation_result'].value_counts().to_dict(),
+        'rules': {rule: s['issues'] for rule, s in stats.items() if s['issues']},
+        'whitelisted': {rule: s['whitelisted'] for rule, s in stats.items() if s['whitelisted']},
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    index = load_target_index()
+
+    # 映射结果校验规则分析.md 中的示例
+    mapping = pd.DataFrame([
+        ('1122', '应收账款', '资产', '借', '{"客户": true}', '', '2202'),
+        ('6001', '主营业务收入', '收入', '贷', '', '', '5602'),
+        ('6602', '管理费用', '费用', '借', '', '', '1221'),
+        ('1602', '累计折旧', '资产', '借', '', '', '1602'),
+        ('1501', '长期债券投资', '资产', '借', '', '', '1501'),
+        ('150101', '债券投资', '资产', '借', '', '1501', '1601'),
+        ('150102', '其他债权投资', '资产', '借', '', '1501', '1122'),
+        ('1001', '库存现金', '资产', '借', '', '', '1001'),
+        ('2211', '应付职工薪酬', '负债', '贷', '', '', '2211'),
+    ], columns=['source_subject_code', 'source_subject_name', 'source_subject_type', 'source_debit_credit',
+                'source_auxiliary_info', 'source_parent_code', 'target_subject_code'])
+    result, issues, stats = validate_mapping(mapping, index)
+    print(result[['source_subject_code', 'source_subject_name', 'target_subject_code', 'validation_result',
+                  'validation_message']].to_string())
+    print(issues[['source_subject_code', 'target_subject_code', 'rule', 'severity', 'message']].to_string())
+    print(f"📊 {summarize(result, stats)}")
+
+    # 性能：100万行映射批次
+    chart = target_attributes(index)
+    rng = np.random.default_rng(0)
+    count = 1_000_000
+    source_rows = rng.integers(0, len(chart), count)
+    target_rows = np.where(rng.random(count) < 0.9, source_rows, rng.integers(0, len(chart), count))
+    big = pd.DataFrame({
+        'source_subject_code': [f"{c}{i:07d}" for c, i in zip(chart['code'].to_numpy()[source_rows], range(count))],
+        'source_subject_name': chart['name'].to_numpy()[source_rows],
+        'source_subject_type': chart['category'].to_numpy()[source_rows],
+        'source_debit_credit': chart['debit_credit'].to_numpy()[source_rows],
+        'source_auxiliary_info': chart['auxiliary'].to_numpy()[source_rows],
+        'source_parent_code': '',
+        'target_subject_code': chart['code'].to_numpy()[target_rows],
+    })
+    start = time.perf_counter()
+    result, issues, stats = validate_mapping(big, index)
+    print(f"\n✅ 校验 {count} 行，耗时 {time.perf_counter() - start:.2f} 秒，问题 {len(issues)} 条")
+    print(f"📊 {summarize(result, stats)}")
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+候选科目生成：字符 n-gram 倒排索引 + TF-IDF 余弦相似度
+目标科目名称按字符二元组/三元组建立倒排索引，源科目名称只与含有相同 n-gram 的目标科目计算相似度，
+不做源科目 × 目标科目的逐对比较；按 类别、借贷 过滤后，每个源科目取相似度最高的 k 个候选，
+写入中间表的 candidate_subjects 字段（JSON），供语义匹配和人工选择
+
+相似度按块计算（每块 CHUNK_SIZE 个源科目名称）且始终为稀疏的 (源, 目标, 相似度) 三元组：
+倒排表展开的乘积按 (源, 目标) 排序累加，类别/借贷过滤和取前 k 个都在三元组上完成，
+内存不随 源科目数 × 目标科目数 增长
+"""
+
+import json
+import math
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from 科目索引 import clean_value
+from 科目精确匹配 import SOURCE_NAME_FIELD, load_target_index, normalize_name_column, target_table
+
+NGRAM_SIZES = (2, 3)
+DEFAULT_TOP_K = 5
+CHUNK_SIZE = 4096
+# 每段最多展开的 (源, n-gram, 目标) 乘积数（每个乘积的临时数组约 50 字节）
+PRODUCT_BUDGET = 1 << 21
+
+SOURCE_TYPE_FIELD = 'source_subject_type'
+SOURCE_DIRECTION_FIELD = 'source_debit_credit'
+
+# 源系统科目类型 -> 本系统类别（中间表设计中源系统类型为 资产/负债/权益/收入/费用）
+CATEGORY_ALIASES = {
+    '所有者权益': '权益',
+    '净资产': '权益',
+    '收入': '损益',
+    '费用': '损益',
+    '共同': '',
+}
+
+# 源系统余额方向 -> 本系统借贷
+DIRECTION_ALIASES = {
+    '借方': '借',
+    '贷方': '贷',
+    'D': '借',
+    'C': '贷',
+}
+
+
+def name_ngrams(name, sizes=NGRAM_SIZES):
+    """规范化名称的字符 n-gram；名称比最小 n 还短时以整个名称作为唯一的 n-gram"""
+    grams = [name[i:i + n] for n in sizes for i in range(len(name) - n + 1)]
+    if not grams and name:
+        grams = [name]
+    return grams
+
+
+class NgramIndex:
+    """
+    目标科目名称的 n-gram 倒排索引
+
+    - vocabulary: n-gram -> 编号
+    - idf: 各 n-gram 的逆文档频率（平滑：log((1 + N) / (1 + df)) + 1）
+    - postings: 按 n-gram 编号排序的 (目标行号, TF-IDF 权重)，posting_starts 为各 n-gram 的起始位置
+    """
+
+    def __init__(self, names, sizes=NGRAM_SIZES):
+        self.sizes = sizes
+        self.size = len(names)
+        self.vocabulary = {}
+        rows, grams = [], []
+        for row, name in enumerate(names):
+            for gram in name_ngrams(name, sizes):
+                grams.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+                rows.append(row)
+        rows = np.asarray(rows, dtype=np.intp)
+        grams = np.asarray(grams, dtype=np.intp)
+
+        # 每个目标科目的 (n-gram, 词频)
+        keys, counts = np.unique(grams * self.size + rows, return_counts=True)
+        grams, rows = keys // self.size, keys % self.size
+        df = np.bincount(grams, minlength=len(self.vocabulary))
+        self.idf = np.log((1 + self.size) / (1 + df)) + 1
+        self.unseen_idf = math.log(1 + self.size) + 1
+
+        weights = counts * self.idf[grams]
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=self.size))
+        weights = weights / np.where(norms > 0, norms, 1)[rows]
+
+        # keys 已按 (n-gram, 目标行号) 排序，即按 n-gram 分组的倒排表
+        self.posting_rows = rows
+        self.posting_weights = weights
+        self.posting_starts = np.searchsorted(grams, np.arange(len(self.vocabulary) + 1))
+
+    def query_vectors(self, names):
+        """
+        源科目名称的 TF-IDF 向量（已归一化），只保留索引中出现过的 n-gram
+        返回: (行号, n-gram编号, 权重)
+        """
+        lists = [name_ngrams(name, self.sizes) for name in names]
+        lengths = np.fromiter(map(len, lists), dtype=np.intp, count=len(lists))
+        owners = np.repeat(np.arange(len(lists)), lengths)
+        local, uniques = pd.factorize(np.fromiter(chain.from_iterable(lists), dtype=object, count=lengths.sum()))
+
+        # 本批 n-gram 与词表做一次哈希连接；词表外的 n-gram 只计入源向量的模
+        gram_ids = pd.Index(list(self.vocabulary)).get_indexer(uniques) if len(uniques) else np.array([], np.intp)
+        idf = np.where(gram_ids >= 0, self.idf[np.maximum(gram_ids, 0)] if len(self.idf) else 0, self.unseen_idf)
+
+        keys, counts = np.unique(owners * max(len(uniques), 1) + local, return_counts=True)
+        rows, local = keys // max(len(uniques), 1), keys % max(len(uniques), 1)
+        weights = counts * idf[local]
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(lists)))
+        known = gram_ids[local] >= 0
+        rows, weights = rows[known], weights[known] / norms[rows[known]]
+        return rows, gram_ids[local[known]], weights
+
+    def iter_similarity(self, names):
+        """
+        names × 目标科目的余弦相似度（稀疏）
+
+        倒排表按源科目行分段展开，每段展开的 (源, n-gram, 目标) 乘积不超过 PRODUCT_BUDGET 个
+        （一个名称单独超过时独占一段），同一 (源, 目标) 的乘积排序后用 np.add.reduceat 累加；
+        峰值内存与 PRODUCT_BUDGET 有关，与 len(names) × 目标科目数 无关
+
+        返回: 生成器，每段一个 (行号, 目标行号, 相似度)，按 (行号, 目标行号) 排序，只含相似度 > 0 的对；
+        同一行号只出现在一段中，没有相似目标科目的行不出现
+        """
+        rows, grams, weights = self.query_vectors(names)
+        starts = self.posting_starts[grams]
+        lengths = self.posting_starts[grams + 1] - starts
+        ends = np.cumsum(lengths)
+        first = 0
+        while first < len(rows):
+            # 在源行的边界处切分
+            last = int(np.searchsorted(ends, (ends[first - 1] if first else 0) + PRODUCT_BUDGET, side='right'))
+            if last < len(rows):
+                last = int(np.searchsorted(rows, rows[last], side='left'))
+                if last <= first:
+                    last = int(np.searchsorted(rows, rows[first], side='right'))
+            else:
+                last = len(rows)
+            part = self._accumulate(rows[first:last], starts[first:last], lengths[first:last], weights[first:last])
+            if len(part[0]):
+                yield part
+            first = last
+
+    def _accumulate(self, rows, starts, lengths, weights):
+        """展开 (源, n-gram) 对应的倒排表，按 (源行号, 目标行号) 累加权重乘积"""
+        expand = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        postings = starts[expand] + offsets
+        keys = rows[expand].astype(np.int64) * self.size + self.posting_rows[postings]
+        products = weights[expand] * self.posting_weights[postings]
+        order = np.argsort(keys, kind='stable')
+        keys, products = keys[order], products[order]
+        if not len(keys):
+            return keys, keys, products
+        bounds = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        keys = keys[bounds]
+        return keys // self.size, keys % self.size, np.add.reduceat(products, bounds)
+
+    def similarity_rows(self, names):
+        """逐个名称输出与目标科目的相似度 (目标行号, 相似度)，只含相似度 > 0 的目标科目，顺序与 names 一致"""
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0))
+        position = 0
+        for rows, cols, scores in self.iter_similarity(names):
+            row_ids, starts = np.unique(rows, return_index=True)
+            ends = np.append(starts[1:], len(rows))
+            for row, start, end in zip(row_ids.tolist(), starts.tolist(), ends.tolist()):
+                for _ in range(position, row):
+                    yield empty
+                yield cols[start:end], scores[start:end]
+                position = row + 1
+        for _ in range(position, len(names)):
+            yield empty
+
+
+def _normalize_labels(values, aliases):
+    """类别/借贷统一为本系统的取值，空值为''（不过滤）"""
+    labels = np.array([clean_value(v) for v in values], dtype=object)
+    return np.array([aliases.get(v, v) for v in labels], dtype=object)
+
+
+def top_candidates(index, names, k=DEFAULT_TOP_K, allowed=None):
+    """
+    每个名称相似度最高的 k 个目标科目（相似度相同时目标行号小的在前）
+
+    参数:
+    - index: NgramIndex
+    - names: 规范化后的源科目名称
+    - allowed: 可选，按类别、借贷过滤的函数 (行号数组, 目标行号数组) -> 布尔数组，
+      只对有相似度的 (源, 目标) 对调用，不构造 len(names) × 目标科目数 的矩阵
+
+    返回: (目标行号矩阵, 相似度矩阵)，形状均为 len(names) × k，不足 k 个的位置行号为-1、相似度为0
+    """
+    count = len(names)
+    k = min(k, index.size)
+    positions = np.full((count, k), -1, dtype=np.intp)
+    scores = np.zeros((count, k))
+    if not k:
+        return positions, scores
+    for start in range(0, count, CHUNK_SIZE):
+        for rows, cols, values in index.iter_similarity(names[start:start + CHUNK_SIZE]):
+            rows = rows + start
+            if allowed is not None:
+                keep = allowed(rows, cols)
+                rows, cols, values = rows[keep], cols[keep], values[keep]
+            order = np.lexsort((cols, -values, rows))
+            rows, cols, values = rows[order], cols[order], values[order]
+            # 每行内的名次：位置 - 该行第一个元素的位置
+            rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+            top = rank < k
+            positions[rows[top], rank[top]] = cols[top]
+            scores[rows[top], rank[top]] = values[top]
+    return positions, scores
+
+
+def generate_candidates(source, target=None, k=DEFAULT_TOP_K):
+    """
+    为源科目生成候选目标科目
+
+    参数:
+    - source: DataFrame，包含 source_subject_name，可选 source_subject_type、source_debit_credit（用于过滤）
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    - k: 每个源科目的候选数
+
+    返回: list，每个源科目一个候选列表 [{'code', 'name', 'score'}]，按相似度从高到低
+    """
+    if target is None:
+        target = load_target_index()
+    targets = target_table(target)
+    index = NgramIndex(targets['normalized_name'].tolist())
+
+    # 相同名称（及相同过滤条件）只计算一次
+    names = normalize_name_column(source[SOURCE_NAME_FIELD])
+    keys = {'name': names}
+    if SOURCE_TYPE_FIELD in source.columns:
+        keys['category'] = _normalize_labels(source[SOURCE_TYPE_FIELD], CATEGORY_ALIASES)
+    if SOURCE_DIRECTION_FIELD in source.columns:
+        keys['direction'] = _normalize_labels(source[SOURCE_DIRECTION_FIELD], DIRECTION_ALIASES)
+    frame = pd.DataFrame(keys)
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(frame)) if len(keys) > 1 else \
+        pd.factorize(frame['name'])
+    unique_keys = pd.DataFrame(list(uniques), columns=list(keys)) if len(keys) > 1 else \
+        pd.DataFrame({'name': np.asarray(uniques, dtype=object)})
+
+    # 类别、借贷统一编码为整数，源科目为空（-1）时不过滤
+    allowed = None
+    filters = []
+    for col, field in (('category', 'target_subject_type'), ('direction', 'target_debit_credit')):
+        if col in unique_keys.columns:
+            labels, _ = pd.factorize(np.concatenate([targets[field].to_numpy(dtype=object),
+                                                     unique_keys[col].to_numpy(dtype=object)]))
+            source_labels = labels[index.size:]
+            source_labels[unique_keys[col].to_numpy(dtype=object) == ''] = -1
+            filters.append((source_labels, labels[:index.size]))
+    if filters:
+        def allowed(rows, cols):
+            mask = np.ones(len(rows), dtype=bool)
+            for source_labels, target_labels in filters:
+                values = source_labels[rows]
+                mask &= (values < 0) | (values == target_labels[cols])
+            return mask
+
+    positions, scores = top_candidates(index, unique_keys['name'].to_numpy(dtype=object), k, allowed)
+
+    target_codes = targets['target_subject_code'].tolist()
+    target_names = targets['target_subject_name'].tolist()
+    lists = [[{'code': target_codes[p], 'name': target_names[p], 'score': s}
+              for p, s in zip(row, row_scores) if p >= 0]
+             for row, row_scores in zip(positions.tolist(), np.round(scores, 4).tolist())]
+    return [lists[c] for c in codes]
+
+
+def fill_candidates(result, target=None, k=DEFAULT_TOP_K, match_types=('unmatched',)):
+    """
+    为匹配结果中指定匹配类型的行填写 candidate_subjects（JSON）
+
+    参数:
+    - result: 科目精确匹配.match_exact / 科目层级匹配.match_hierarchy 的结果
+    - match_types: 需要生成候选的匹配类型，None 为全部行
+
+    返回: 新的 DataFrame
+    """
+    result = result.copy()
+    rows = np.arange(len(result)) if match_types is None else \
+        np.flatnonzero(result['match_type'].isin(match_types).to_numpy())
+    column = result['candidate_subjects'].to_numpy(dtype=object).copy() \
+        if 'candidate_subjects' in result.columns else np.full(len(result), None, dtype=object)
+    if len(rows):
+        candidates = generate_candidates(result.iloc[rows], target, k)
+        column[rows] = [json.dumps(c, ensure_ascii=False) if c else None for c in candidates]
+    result['candidate_subjects'] = column
+    return result
+
+
+if __name__ == "__main__":
+    import time
+
+    index = load_target_index()
+    source = pd.DataFrame({
+        'source_subject_code': ['1002', '1012', '2211', '6602', '5401'],
+        'source_subject_name': ['银行账户', '其他货币资金-外埠存款', '应付工资', '管理费用-办公用品', '主营业务成本'],
+        'source_subject_type': ['资产', '资产', '负债', '费用', '费用'],
+        'source_debit_credit': ['借', '借', '贷', '借', '借'],
+    })
+    for (_, row), candidates in zip(source.iterrows(), generate_candidates(source, index, k=3)):
+        print(f"{row['source_subject_name']}: " + '，'.join(f"{c['code']}-{c['name']}({c['score']})" for c in candidates))
+
+    # 性能：10万个源科目
+    chart = target_table(index)
+    rng = np.random.default_rng(0)
+    picks = rng.integers(0, len(chart), 100000)
+    suffixes = np.array(['', '费', '-明细', '（旧）', '及其他', '款项'], dtype=object)
+    big = pd.DataFrame({
+        'source_subject_name': chart['target_subject_name'].to_numpy(dtype=object)[picks]
+        + suffixes[rng.integers(0, len(suffixes), len(picks))]
+        + np.char.mod('%d', rng.integers(0, 500, len(picks))).astype(object),
+        'source_debit_credit': chart['target_debit_credit'].to_numpy(dtype=object)[picks],
+    })
+    start = time.perf_counter()
+    candidates = generate_candidates(big, index)
+    print(f"\n✅ 10万个源科目候选生成完成，耗时 {time.perf_counter() - start:.2f} 秒")
+    print(f"📊 首选候选即原科目的比例: "
+          f"{np.mean([bool(c) and c[0]['code'] == code for c, code in zip(candidates, chart['target_subject_code'].to_numpy()[picks])]):.1%}")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大模型Prompt的候选科目裁剪（见 基于大模型的二级科目匹配方案.md 上下文信息提取、成本优化）
+候选科目按目标科目的属性和层级裁剪为有上限的有序列表，不可能的候选不再占用Prompt的 token：
+1. 类别：只保留与源科目类别相同的候选；没有同类别候选时退而保留同一报表（资产负债表/利润表）的候选
+2. 层级：源科目的父科目能对应到目标科目时，该目标科目及其下级科目优先
+3. 借贷：余额方向一致的候选优先（只排序不裁剪，部分明细科目的方向与上级相反）
+4. 名称相似度（字符 n-gram TF-IDF 余弦）决定其余顺序，每个科目最多保留 limit 个候选
+
+科目没有候选列表时，以整个目标科目表为候选范围（即原始Prompt模板的做法），此时只保留名称相似或属于父科目的候选
+"""
+
+import numpy as np
+
+from 科目候选生成 import CATEGORY_ALIASES, CHUNK_SIZE, DIRECTION_ALIASES, NgramIndex
+from 科目索引 import clean_value, normalize_code, normalize_name
+from 科目精确匹配 import load_target_index, target_table
+
+DEFAULT_CANDIDATE_LIMIT = 5
+
+# 本系统科目类别 -> 所属报表
+STATEMENTS = {
+    '资产': '资产负债表',
+    '负债': '资产负债表',
+    '权益': '资产负债表',
+    '成本': '资产负债表',
+    '损益': '利润表',
+}
+
+# 排序加分：父科目下的候选 > 借贷一致 > 名称相似度（0~1）
+HIERARCHY_BONUS = 2.0
+DIRECTION_BONUS = 0.1
+
+
+def _label(value, aliases):
+    value = clean_value(value)
+    return aliases.get(value, value)
+
+
+class CandidatePruner:
+    """
+    候选科目裁剪器（目标科目表的 n-gram 索引和属性只构建一次）
+
+    参数:
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    - limit: 每个科目最多保留的候选数
+    """
+
+    def __init__(self, target=None, limit=DEFAULT_CANDIDATE_LIMIT):
+        if target is None:
+            target = load_target_index()
+        self.target = target
+        self.limit = limit
+        targets = target_table(target)
+        self.codes = targets['target_subject_code'].tolist()
+        self.names = targets['target_subject_name'].tolist()
+        self.positions = {code: i for i, code in enumerate(self.codes)}
+        self.categories = targets['target_subject_type'].to_numpy(dtype=object)
+        self.directions = targets['target_debit_credit'].to_numpy(dtype=object)
+        self.statements = np.array([STATEMENTS.get(c, '') for c in self.categories], dtype=object)
+        self.index = NgramIndex(targets['normalized_name'].tolist())
+        self._subtrees = {}
+
+    def resolve_parent(self, item):
+        """
+        源科目的父科目对应的目标科目编码，对应不上时为''
+        优先使用已匹配的父科目（item['parent_target']），其次父科目名称唯一对应的目标科目，最后同编码的目标科目
+        """
+        code = normalize_code(item.get('parent_target'))
+        if code in self.positions:
+            return code
+        record = self.target.get_by_name(normalize_name(item.get('parent_name')))
+        if record is None:
+            record = self.target.get(normalize_code(item.get('parent_code')))
+        if record is None:
+            return ''
+        category = _label(item.get('type'), CATEGORY_ALIASES)
+        return record.code if not category or record.category == category else ''
+
+    def _subtree(self, code):
+        """目标科目及其全部下级科目的掩码"""
+        mask = self._subtrees.get(code)
+        if mask is None:
+            mask = np.array([c.startswith(code) for c in self.codes]) if code else np.zeros(len(self.codes), bool)
+            self._subtrees[code] = mask
+        return mask
+
+    def prune(self, items):
+        """
+        裁剪每个科目的候选列表
+
+        返回: 新的科目列表，candidates 为裁剪排序后的 [{'code', 'name', 'score'}]，
+        另含 parent_target（父科目对应的目标科目编码，没有时为''）
+        """
+        pruned = []
+        for start in range(0, len(items), CHUNK_SIZE):
+            chunk = items[start:start + CHUNK_SIZE]
+            names = np.array([normalize_name(item.get('source_name')) for item in chunk], dtype=object)
+            # 相似度按名称逐行展开为稠密向量，不构造 块大小 × 目标科目数 的矩阵
+            for item, (cols, scores) in zip(chunk, self.index.similarity_rows(names)):
+                similarity = np.zeros(len(self.codes))
+                similarity[cols] = scores
+                pruned.append(self._prune_one(item, similarity))
+        return pruned
+
+    def _prune_one(self, item, similarity):
+        size = len(self.codes)
+        pool = np.zeros(size, dtype=bool)
+        explicit = [self.positions.get(normalize_code(c.get('code'))) for c in item.get('candidates') or []]
+        explicit = [p for p in explicit if p is not None]
+        parent = self.resolve_parent(item)
+        in_tree = self._subtree(parent)
+        if explicit:
+            pool[explicit] = True
+        else:
+            # 整个目标科目表：只考虑名称相似或属于父科目的科目
+            pool = (similarity > 0) | in_tree
+
+        # 类别相同 > 同一报表 > 其他，只保留最好的一档
+        category = _label(item.get('type'), CATEGORY_ALIASES)
+        if category:
+            tier = np.where(self.categories == category, 2,
+                            np.where(self.statements == STATEMENTS.get(category, ''), 1, 0))
+            if pool.any():
+                pool &= tier == tier[pool].max()
+
+        direction = _label(item.get('direction'), DIRECTION_ALIASES)
+        score = similarity + HIERARCHY_BONUS * in_tree
+        if direction:
+            score = score + DIRECTION_BONUS * (self.directions == direction)
+        score = np.where(pool, score, -np.inf)
+
+        count = min(self.limit, int(pool.sum()))
+        top = np.argsort(-score, kind='stable')[:count]
+        candidates = [{'code': self.codes[p], 'name': self.names[p], 'score': round(float(similarity[p]), 4)}
+                      for p in top]
+        return dict(item, candidates=candidates, parent_target=parent)
+
+
+def prune_candidates(items, target=None, limit=DEFAULT_CANDIDATE_LIMIT):
+    """裁剪科目的候选列表（见 CandidatePruner.prune）"""
+    return CandidatePruner(target, limit).prune(items)
@@ -5,83 +5,21 @@
 确定哪些用传统方法、哪些用模型分析、哪些需要其他处理
 """
 
-import pandas as pd
 import json
 import os
 
+from 列式缓存 import read_excel_cached
+from 科目规则引擎 import classify_legacy_subjects
+
 # 读取数据
 csv_file = "04-参考资料/业务文档/小企业会计准则-默认科目.csv"
-df = pd.read_excel("小企业会计准则 (1).xlsx", sheet_name=0, header=0)
+df = read_excel_cached("小企业会计准则 (1).xlsx", sheet_name=0, header=0)
 
 # 清理数据：去除表头行
 df = df[df['当前版本SAAS的默认科目'] != '编码'].copy()
 
-# 初始化分类结果
-categories = {
-    '传统方法-完全匹配': [],  # 编码和名称都完全一致，标准科目
-    '传统方法-编码匹配': [],  # 编码相同但名称可能不同，标准编码体系
-    '传统方法-层级匹配': [],  # 有明确层级关系的科目
-    '模型分析-语义匹配': [],  # 名称相似但编码不同，需要语义理解
-    '模型分析-同义词匹配': [],  # 可能存在同义词的科目
-    '其他处理-删除科目': [],  # 已删除的科目，需要特殊处理
-    '其他处理-新增科目': [],  # 新增的科目，需要确认
-    '其他处理-待讨论': [],  # 需要讨论的科目
-    '其他处理-辅助核算': []  # 有辅助核算的科目，需要特殊处理
-}
-
-# 分析每个科目
-for idx, row in df.iterrows():
-    old_code = row['当前版本SAAS的默认科目']
-    old_name = row['Unnamed: 1'] if pd.notna(row['Unnamed: 1']) else ''
-    new_code = row['修改后SAAS的默认科目'] if pd.notna(row['修改后SAAS的默认科目']) else None
-    new_name = row['Unnamed: 3'] if pd.notna(row['Unnamed: 3']) else ''
-    operation = row['操作'] if pd.notna(row['操作']) else ''
-    remark = row['备注'] if pd.notna(row['备注']) else ''
-    has_issue = row['是否有问题'] if pd.notna(row['是否有问题']) else ''
-    category = row['类别'] if pd.notna(row['类别']) else ''
-    auxiliary = row['辅助'] if pd.notna(row['辅助']) else ''
-    
-    # 构建科目信息
-    subject_info = {
-        'old_code': old_code,
-        'old_name': old_name,
-        'new_code': new_code,
-        'new_name': new_name,
-        'operation': operation,
-        'category': category,
-        'auxiliary': auxiliary,
-        'remark': remark
-    }
-    
-    # 分类逻辑
-    if operation == '删除':
-        categories['其他处理-删除科目'].append(subject_info)
-    elif operation == '新增' or (pd.isna(old_code) and pd.notna(new_code)):
-        categories['其他处理-新增科目'].append(subject_info)
-    elif has_issue == '需要讨论' or '待讨论' in str(remark):
-        categories['其他处理-待讨论'].append(subject_info)
-    elif pd.notna(auxiliary) and str(auxiliary).strip() != '':
-        categories['其他处理-辅助核算'].append(subject_info)
-    elif operation == '保持不变':
-        # 保持不变且编码和名称都一致
-        if pd.notna(old_code) and pd.notna(new_code) and old_code == new_code:
-            if old_name == new_name:
-                # 完全匹配：标准科目，使用传统方法
-                categories['传统方法-完全匹配'].append(subject_info)
-            else:
-                # 编码相同但名称不同，使用传统方法但需要名称映射
-                categories['传统方法-编码匹配'].append(subject_info)
-        else:
-            # 其他保持不变的情况
-            categories['传统方法-完全匹配'].append(subject_info)
-    else:
-        # 检查是否有层级关系（编码包含小数点或层级结构）
-        code_str = str(old_code) if pd.notna(old_code) else ''
-        if '.' in code_str or len(code_str) > 4:
-            categories['传统方法-层级匹配'].append(subject_info)
-        else:
-            # 默认使用语义匹配
-            categories['模型分析-语义匹配'].append(subject_info)
+# 按分类规则一次性对所有科目分类（规则见 科目规则引擎.LEGACY_CLASSIFY_RULES）
+categories = classify_legacy_subjects(df)
 
 # 统计结果
 print("=" * 60)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同义词匹配（见 导账科目映射设计方案.md 2.3）
+同义词库编译为 Aho–Corasick 自动机，每个名称扫描一遍即可把其中的同义词全部改写为标准术语
+（最左最长匹配，标准术语本身也在词库中，避免 "其他应收款" 中的 "应收款" 被改写）；
+改写后的源科目名称与目标科目名称做一次整列连接，结果作为名称匹配写入中间表
+
+编译后的自动机按同义词库内容的哈希缓存到磁盘，词库不变时直接加载
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from 科目精确匹配 import (
+    SOURCE_NAME_FIELD,
+    TARGET_FIELDS,
+    load_target_index,
+    normalize_name_column,
+    target_table,
+)
+from 科目索引 import normalize_name
+
+SYNONYM_FILE = "04-参考资料/业务文档/科目同义词库.json"
+CACHE_DIR = "04-参考资料/业务文档/.synonym_cache"
+AUTOMATON_VERSION = 1
+
+# 内置同义词库：标准术语（本系统科目名称用语） -> 其他系统的常见表述
+SYNONYMS = {
+    '银行存款': ['银行账户'],
+    '应收账款': ['应收款'],
+    '库存商品': ['存货'],
+    '库存现金': ['现金'],
+    '应付账款': ['应付款'],
+    '其他应收款': ['其他应收'],
+    '其他应付款': ['其他应付'],
+    '应付职工薪酬': ['应付工资'],
+    '应交税费': ['应交税金'],
+    '销售费用': ['营业费用'],
+    '长期待摊费用': ['递延资产'],
+    '差旅费': ['差旅费用'],
+    '办公费': ['办公费用'],
+}
+
+# 同义词匹配的评分、置信度和映射状态
+SYNONYM_MATCH = {'score': 65, 'confidence': '中', 'status': 'matched'}
+
+
+class SynonymAutomaton:
+    """
+    同义词改写自动机
+
+    - goto: 各状态的转移 {字符: 状态}
+    - fail: 失配指针
+    - terminal: 在该状态结束的词条 (长度, 标准术语)，不是词条结尾时为None
+    - dict_link: 沿失配链最近的词条结束状态（不含自身），没有时为0
+    """
+
+    def __init__(self, synonyms):
+        self.goto = [{}]
+        self.terminal = [None]
+        for canonical, variants in synonyms.items():
+            canonical = normalize_name(canonical)
+            for term in [canonical] + [normalize_name(v) for v in variants]:
+                if term:
+                    self._insert(term, canonical)
+        self._build()
+
+    @classmethod
+    def from_tables(cls, tables):
+        """由 tables() 的结果恢复（不重新编译）"""
+        automaton = cls.__new__(cls)
+        automaton.goto, automaton.fail, automaton.terminal, automaton.dict_link = (
+            tables['goto'], tables['fail'], tables['terminal'], tables['dict_link'])
+        return automaton
+
+    def tables(self):
+        """自动机的状态表（只含内置类型，用于缓存）"""
+        return {'goto': self.goto, 'fail': self.fail, 'terminal': self.terminal, 'dict_link': self.dict_link}
+
+    def _insert(self, term, canonical):
+        state = 0
+        for char in term:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.terminal.append(None)
+            state = next_state
+        self.terminal[state] = (len(term), canonical)
+
+    def _build(self):
+        """广度优先计算失配指针和词条链接"""
+        self.fail = [0] * len(self.goto)
+        self.dict_link = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                link = self.goto[fallback].get(char, 0) if state else 0
+                self.fail[child] = link
+                self.dict_link[child] = link if self.terminal[link] else self.dict_link[link]
+                queue.append(child)
+
+    def _matches(self, text):
+        """扫描一遍，得到每个起始位置上最长的词条 {起始位置: (长度, 标准术语)}"""
+        goto, fail, terminal, dict_link = self.goto, self.fail, self.terminal, self.dict_link
+        longest = {}
+        state = 0
+        for end, char in enumerate(text, start=1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            # 以当前位置结尾的所有词条：自身及沿词条链接可达的状态
+            hit = state if terminal[state] else dict_link[state]
+            while hit:
+                length, canonical = terminal[hit]
+                start = end - length
+                if start not in longest or longest[start][0] < length:
+                    longest[start] = (length, canonical)
+                hit = dict_link[hit]
+        return longest
+
+    def rewrite(self, text):
+        """把 text 中的同义词改写为标准术语（最左最长、不重叠）"""
+        if not text:
+            return text
+        longest = self._matches(text)
+        if not longest:
+            return text
+        parts = []
+        position = 0
+        while position < len(text):
+            match = longest.get(position)
+            if match:
+                parts.append(match[1])
+                position += match[0]
+            else:
+                parts.append(text[position])
+                position += 1
+        return ''.join(parts)
+
+    def rewrite_column(self, names):
+        """整列改写，相同名称只扫描一次"""
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object), use_na_sentinel=False)
+        return np.array([self.rewrite(v) for v in uniques], dtype=object)[codes]
+
+
+# ---------------------------------------------------------------------------
+# 同义词库与自动机缓存
+# ---------------------------------------------------------------------------
+
+def load_synonyms(path=SYNONYM_FILE):
+    """读取同义词库（JSON：{标准术语: [同义词, ...]}），文件不存在时使用内置词库"""
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return dict(SYNONYMS)
+
+
+def load_automaton(synonyms=None, cache_dir=CACHE_DIR):
+    """编译同义词自动机；同义词库内容不变时从缓存加载"""
+    if synonyms is None:
+        synonyms = load_synonyms()
+    key = json.dumps([AUTOMATON_VERSION, synonyms], ensure_ascii=False, sort_keys=True)
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    cache_file = os.path.join(cache_dir, f'automaton-{digest[:16]}.pkl') if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            return SynonymAutomaton.from_tables(pickle.load(f))
+
+    automaton = SynonymAutomaton(synonyms)
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_file = f'{cache_file}.tmp'
+        with open(temp_file, 'wb') as f:
+            pickle.dump(automaton.tables(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+    return automaton
+
+
+# ---------------------------------------------------------------------------
+# 同义词匹配
+# ---------------------------------------------------------------------------
+
+def match_synonyms(result, target=None, automaton=None, match_types=('unmatched',)):
+    """
+    对匹配结果中仍未匹配的科目执行同义词匹配
+
+    参数:
+    - result: 科目精确匹配 / 科目层级匹配 的结果
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    - automaton: SynonymAutomaton，默认由同义词库编译（有缓存）
+
+    源科目名称和目标科目名称都改写为标准术语后，改写后的名称唯一对应一个目标科目时命中，
+    match_type 为 name_match，match_reason 记录同义词改写关系
+    """
+    if target is None:
+        target = load_target_index()
+    if automaton is None:
+        automaton = load_automaton()
+    targets = target_table(target)
+    result = result.copy()
+
+    rows = np.flatnonzero(result['match_type'].isin(match_types).to_numpy())
+    if not len(rows):
+        return result
+    source_names = normalize_name_column(result[SOURCE_NAME_FIELD].to_numpy(dtype=object)[rows])
+    rewritten = automaton.rewrite_column(source_names)
+    target_rewritten = automaton.rewrite_column(targets['normalized_name'])
+
+    groups = pd.Series(np.arange(len(targets))).groupby(target_rewritten, sort=False).indices
+    unique = pd.Series({name: pos[0] for name, pos in groups.items() if len(pos) == 1 and name}, dtype=np.intp)
+    hit = unique.index.get_indexer(rewritten)
+    found = hit >= 0
+    rows, position = rows[found], unique.to_numpy()[hit[found]]
+    if not len(rows):
+        return result
+
+    for field in TARGET_FIELDS:
+        values = result[field].to_numpy(dtype=object).copy()
+        values[rows] = targets[field].to_numpy(dtype=object)[position]
+        result[field] = values
+    target_names = targets['target_subject_name'].to_numpy(dtype=object)[position]
+    original = result[SOURCE_NAME_FIELD].to_numpy(dtype=object)[rows]
+    updates = {
+        'match_type': 'name_match',
+        'match_method': 'traditional_rule',
+        'match_score': SYNONYM_MATCH['score'],
+        'match_confidence': SYNONYM_MATCH['confidence'],
+        'mapping_status': SYNONYM_MATCH['status'],
+        'candidate_subjects': None,
+        'match_reason': np.array([f"同义词匹配（{s} → {t}，标准术语：{c}）"
+                                  for s, t, c in zip(original, target_names, rewritten[found])], dtype=object),
+    }
+    for field, value in updates.items():
+        values = result[field].to_numpy(dtype=object).copy()
+        values[rows] = value
+        result[field] = values
+    result['match_score'] = result['match_score'].astype(np.int64)
+    return result
+
+
+if __name__ == "__main__":
+    import time
+
+    from 科目层级匹配 import match_traditional, summarize
+
+    automaton = load_automaton()
+    for name in ['银行账户', '应收款', '其他应收款', '其他应收', '应付工资-奖金', '差旅费用']:
+        print(f"{name} -> {automaton.rewrite(normalize_name(name))}")
+
+    index = load_target_index()
+    source = pd.DataFrame({
+        'source_subject_code': ['B01', 'B02', 'B03', 'B04', 'B05'],
+        'source_subject_name': ['银行账户', '应收款', '存货', '应交税金', '未知科目'],
+    })
+    result = match_synonyms(match_traditional(source, index), index, automaton)
+    print(result[['source_subject_name', 'target_subject_code', 'match_type', 'match_reason']].to_string())
+
+    # 性能：10万个名称、1000组同义词
+    synonyms = dict(SYNONYMS)
+    synonyms.update({f'标准术语{i}': [f'同义词{i}甲', f'同义词{i}乙'] for i in range(1000)})
+    big_automaton = load_automaton(synonyms, cache_dir=None)
+    rng = np.random.default_rng(0)
+    pool = np.array(list(synonyms) + [v for vs in synonyms.values() for v in vs], dtype=object)
+    names = (pool[rng.integers(0, len(pool), 100000)] + np.char.mod('%d', rng.integers(0, 1000, 100000)).astype(object)
+             + pool[rng.integers(0, len(pool), 100000)])
+    start = time.perf_counter()
+    big_automaton.rewrite_column(names)
+    print(f"\n✅ 10万个名称同义词改写完成，耗时 {time.perf_counter() - start:.2f} 秒")
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+默认科目JSON/MD的增量更新
+在产物旁保存行哈希清单（manifest），再次生成时只对新增、修改的科目执行规则链，
+JSON/Markdown 中未变化的行直接沿用原文件内容，只改写从第一处变化开始的部分；
+清单同时记录每行匹配方法由哪条规则给出
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from 数据导出 import export, json_records, markdown_header, markdown_rows
+from 科目规则引擎 import (
+    MATCH_METHOD_COLUMNS, REPORT_ATTRIBUTION_RULES, REPORT_COLUMNS, SECONDARY_MATCH_METHOD_RULES,
+)
+
+SUBJECT_DIR = "04-参考资料/业务文档"
+SUBJECT_CSV = os.path.join(SUBJECT_DIR, "小企业会计准则-默认科目.csv")
+SUBJECT_JSON = os.path.join(SUBJECT_DIR, "小企业会计准则-默认科目.json")
+SUBJECT_MD = os.path.join(SUBJECT_DIR, "小企业会计准则-默认科目.md")
+SUBJECT_MANIFEST = os.path.join(SUBJECT_DIR, "小企业会计准则-默认科目.manifest.json")
+
+KEY_COLUMN = '科目代码'
+DERIVED_COLUMNS = MATCH_METHOD_COLUMNS + REPORT_COLUMNS
+MANIFEST_VERSION = 1
+
+# json.dump(records, indent=2) 的外层结构：每条记录前缩进2格，记录之间以 ",\n  " 分隔
+_JSON_OPEN = b'[\n  '
+_JSON_SEP = b',\n  '
+_JSON_CLOSE = b'\n]'
+_JSON_EMPTY = b'[]'
+
+
+def as_csv_roundtrip(df):
+    """
+    统一为CSV重新读取后的形式：文本列为object，空字符串为空值，全空的列为float；
+    流水线内存中的数据和从CSV读取的数据由此得到相同的行哈希和相同的JSON/Markdown输出
+    """
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        values = df[col].astype(object)
+        values = values.mask(values.eq(''), np.nan)
+        df[col] = values.astype(float) if values.isna().all() else values
+    return df
+
+
+def derive_subject_columns(df):
+    """
+    对科目执行规则链，写入匹配方法/匹配方法说明和报表归属列，返回每行匹配方法的命中规则
+    匹配方法两列最终完全由二级科目匹配方法规则决定，分类和匹配方法备注不影响结果，这里不再计算
+    """
+    for col in DERIVED_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(object)
+    match_rules = SECONDARY_MATCH_METHOD_RULES.apply(df)
+    REPORT_ATTRIBUTION_RULES.apply(df)
+    return match_rules
+
+
+def _row_keys(df):
+    """行键：科目代码；重复出现的科目代码按出现次序加后缀（如 '1001#2'），保证每行唯一"""
+    codes = df[KEY_COLUMN].astype(str)
+    keys = codes.to_numpy(dtype=object)
+    if not codes.duplicated().any():
+        return keys
+    occurrence = codes.groupby(codes).cumcount().to_numpy()
+    repeated = occurrence > 0
+    keys[repeated] = [f"{code}#{n + 1}" for code, n in zip(keys[repeated], occurrence[repeated])]
+    return keys
+
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _dtype_signature(df):
+    return [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+
+
+def _json_fragments(df):
+    """每条记录在JSON文件中的文本（与 json.dump(df.to_dict('records'), indent=2) 一致）"""
+    return [record.encode('utf-8') for record in json_records(df, indent=2, level=1)]
+
+
+def _md_lines(df):
+    return [line.encode('utf-8') for line in markdown_rows(df)]
+
+
+def _md_preface(df, source):
+    return (
+        "# 小企业会计准则 - 默认科目数据\n\n"
+        f"数据来源: {source}\n\n"
+        f"数据行数: {len(df)}\n\n"
+        "## 数据表\n\n"
+    )
+
+
+def _md_header(df, source):
+    return (_md_preface(df, source) + markdown_header(df.columns)).encode('utf-8')
+
+
+def load_manifest(manifest_file=SUBJECT_MANIFEST):
+    """读取行哈希清单，不存在或版本不符时返回None"""
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _file_state(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _patch_file(path, old, prefix, old_prefix_len, reuse, new_items, old_lengths, separator, suffix):
+    """
+    按 prefix + separator.join(各行内容) + suffix 更新文件
+
+    - old: 原文件内容（与清单一致时），None 表示整体重写
+    - reuse: 每行沿用的原文件行号，-1 表示使用 new_items 中的新内容
+    - old_lengths: 原文件各行内容的字节数
+
+    只从第一处与原文件不同的位置开始改写，返回写入的字节数
+    """
+    count = len(reuse)
+    old_offsets = np.concatenate([[0], np.cumsum(old_lengths, dtype=np.int64)])
+    if old is None or old[:old_prefix_len] != prefix:
+        start_item, offset = 0, 0
+    else:
+        # 第一处与原文件不同的行：新内容，或沿用的行不在原来的位置
+        differs = np.flatnonzero(reuse != np.arange(count))
+        start_item = int(differs[0]) if len(differs) else count
+        if start_item == count == len(old_lengths):
+            return 0
+        # 从第 start_item 行之前的分隔符开始改写
+        offset = old_prefix_len + int(old_offsets[start_item]) + len(separator) * max(start_item - 1, 0)
+
+    parts = [] if offset else [prefix]
+    # 原文件中位置相邻的沿用行连同其间的分隔符整段复制；新内容的行各自成段
+    items = np.arange(start_item, count)
+    if len(items):
+        new = reuse[items] < 0
+        follows = reuse[items] == np.concatenate([[-2], reuse[items[:-1]] + 1])
+        run_starts = items[new | np.concatenate([[True], new[:-1]]) | ~follows].tolist()
+    else:
+        run_starts = []
+    for first, end in zip(run_starts, run_starts[1:] + [count]):
+        if first:
+            parts.append(separator)
+        old_i = int(reuse[first])
+        if old_i < 0:
+            parts.append(new_items[first])
+        else:
+            last = int(reuse[end - 1])
+            start = old_prefix_len + int(old_offsets[old_i]) + len(separator) * old_i
+            stop = old_prefix_len + int(old_offsets[last + 1]) + len(separator) * last
+            parts.append(old[start:stop])
+    parts.append(suffix)
+
+    with open(path, 'r+b' if offset else 'wb') as f:
+        f.seek(offset)
+        f.writelines(parts)
+        f.truncate()
+    return sum(len(part) for part in parts)
+
+
+def _read_unchanged(path, state):
+    """文件与清单记录的大小、修改时间一致时返回其内容，否则返回None"""
+    if state is None or not os.path.exists(path) or _file_state(path) != state:
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _locate_rows(keys, hashes, manifest):
+    """
+    与清单比对，返回 (positions, same)
+    - positions: 每行在清单中的行号，新增行为 -1
+    - same: 行内容（哈希）与清单一致
+    """
+    if manifest is None:
+        return np.full(len(keys), -1, dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    rows = manifest['rows']
+    old_keys = np.asarray(rows['key'], dtype=object)
+    if len(old_keys) == len(keys) and (old_keys == keys).all():
+        positions = np.arange(len(keys), dtype=np.int64)  # 只修改了内容，行的增删和次序不变
+    else:
+        positions = pd.Index(old_keys, dtype=object).get_indexer(keys).astype(np.int64)
+    found = positions >= 0
+    same = np.zeros(len(keys), dtype=bool)
+    same[found] = np.asarray(rows['hash'], dtype=np.uint64)[positions[found]] == hashes[found]
+    return positions, same
+
+
+def _write_incremental(df, source, match_rules, json_file, md_file, manifest_file, manifest, keys, hashes):
+    signature = _dtype_signature(df)
+    if manifest is not None and manifest['dtypes'] != signature:
+        manifest = None  # 列或类型变化时所有行的序列化结果都可能变化
+    old_json = old_md = None
+    if manifest is not None:
+        old_json = _read_unchanged(json_file, manifest['files'].get('json'))
+        old_md = _read_unchanged(md_file, manifest['files'].get('md'))
+
+    positions, same = _locate_rows(keys, hashes, manifest)
+    found = positions >= 0
+    if old_json is None or old_md is None:
+        # 文件在清单之外被修改过，所有行重新序列化
+        old_json = old_md = None
+        same[:] = False
+
+    if manifest is not None:
+        old_rows = manifest['rows']
+        old_json_lengths = np.asarray(old_rows['json_len'], dtype=np.int64)
+        old_md_lengths = np.asarray(old_rows['md_len'], dtype=np.int64)
+    else:
+        old_rows = {'key': [], 'match_rule': []}
+        old_json_lengths = old_md_lengths = np.zeros(0, dtype=np.int64)
+
+    changed = np.flatnonzero(~same)
+    new_json = dict(zip(changed.tolist(), _json_fragments(df.iloc[changed])))
+    new_md = dict(zip(changed.tolist(), _md_lines(df.iloc[changed])))
+
+    reuse = np.where(same, positions, -1)
+    json_lengths = np.zeros(len(df), dtype=np.int64)
+    md_lengths = np.zeros(len(df), dtype=np.int64)
+    json_lengths[same] = old_json_lengths[positions[same]]
+    md_lengths[same] = old_md_lengths[positions[same]]
+    json_lengths[changed] = [len(new_json[i]) for i in changed.tolist()]
+    md_lengths[changed] = [len(new_md[i]) for i in changed.tolist()]
+
+    os.makedirs(os.path.dirname(json_file), exist_ok=True)
+    if len(df):
+        json_prefix, json_suffix = _JSON_OPEN, _JSON_CLOSE
+    else:
+        json_prefix, json_suffix = _JSON_EMPTY, b''
+    old_json_prefix_len = len(_JSON_OPEN if old_rows['key'] else _JSON_EMPTY)
+    bytes_written = _patch_file(json_file, old_json, json_prefix, old_json_prefix_len,
+                                reuse, new_json, old_json_lengths, _JSON_SEP, json_suffix)
+
+    md_header = _md_header(df, source)
+    old_md_header_len = manifest['md_header_len'] if manifest else 0
+    bytes_written += _patch_file(md_file, old_md, md_header, old_md_header_len,
+                                 reuse, new_md, old_md_lengths, b'', b'')
+
+    # 命中规则：新给出的优先，否则沿用清单中的记录
+    if match_rules is not None:
+        rules = pd.Series(match_rules, dtype=object)
+    else:
+        old_rules = np.asarray(old_rows['match_rule'] + [None], dtype=object)
+        rules = pd.Series(old_rules[positions], dtype=object)
+    rules = rules.where(rules.notna(), None).tolist()
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'source': source,
+        'dtypes': signature,
+        'md_header_len': len(md_header),
+        'files': {'json': _file_state(json_file), 'md': _file_state(md_file)},
+        'rows': {
+            'key': list(keys),
+            'hash': hashes.tolist(),
+            'json_len': json_lengths.tolist(),
+            'md_len': md_lengths.tolist(),
+            'match_rule': rules,
+        },
+    }
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(manifest, ensure_ascii=False))
+
+    added = int((~found).sum())
+    return {
+        'rows': len(df),
+        'added': added,
+        'changed': len(changed) - added,
+        'deleted': len(old_rows['key']) - int(found.sum()),
+        'unchanged': int(same.sum()),
+        'bytes_written': bytes_written,
+    }
+
+
+def write_subject_files_incremental(df, source, match_rules=None, csv_file=None, json_file=SUBJECT_JSON,
+                                    md_file=SUBJECT_MD, manifest_file=SUBJECT_MANIFEST):
+    """
+    保存默认科目JSON和Markdown，按行哈希清单只序列化新增、修改的行
+
+    参数:
+    - df: 科目数据（as_csv_roundtrip 之后的形式）
+    - source: 写入Markdown的数据来源说明
+    - match_rules: 每行匹配方法的命中规则（与 df 行对应），None 时沿用清单中的记录
+    - csv_file: 指定时同时整体保存CSV
+
+    返回: 统计 {'rows', 'added', 'changed', 'deleted', 'unchanged', 'bytes_written'}
+    """
+    if csv_file:
+        df.to_csv(csv_file, index=False, encoding='utf-8-sig')
+    return _write_incremental(df, source, match_rules, json_file, md_file, manifest_file,
+                              load_manifest(manifest_file), _row_keys(df), _row_hashes(df))
+
+
+def regenerate_subject_files(df, csv_file=SUBJECT_CSV, json_file=SUBJECT_JSON, md_file=SUBJECT_MD,
+                             manifest_file=SUBJECT_MANIFEST):
+    """
+    根据修改后的CSV增量更新JSON/MD，JSON/MD与CSV内容保持一致，CSV本身不改写
+
+    CSV由用户维护，其中的匹配方法/报表归属可能是人工修改过的（如把匹配方法改为 '人工指定'），
+    这里不用规则结果覆盖；只对新增、修改的行执行规则链，用于记录匹配方法的命中规则，
+    并找出派生列与规则结果不一致的行供核对
+
+    参数:
+    - df: 从 csv_file 读取的科目数据
+
+    返回: 统计（同 write_subject_files_incremental），另含
+    - derived: 执行规则链的行数
+    - manual: 其中派生列与规则结果不一致（人工修改过）的科目代码
+    - incremental: 是否按清单增量更新；CSV缺少科目代码或匹配方法/报表归属列时（如 添加匹配方法备注.py
+      刚导出的原始工作簿结构）无法定位行、执行规则，退回整体重写JSON/MD，不执行规则并删除清单
+    """
+    df = as_csv_roundtrip(df)
+    if KEY_COLUMN not in df.columns or any(col not in df.columns for col in DERIVED_COLUMNS):
+        return _rewrite_subject_files(df, csv_file, json_file, md_file, manifest_file)
+    manifest = load_manifest(manifest_file)
+    if manifest is not None and manifest['dtypes'] != _dtype_signature(df):
+        manifest = None
+    keys = _row_keys(df)
+    hashes = _row_hashes(df)
+
+    positions, same = _locate_rows(keys, hashes, manifest)
+    match_rules = np.full(len(df), None, dtype=object)
+    if manifest is not None:
+        old_rules = np.asarray(manifest['rows']['match_rule'], dtype=object)
+        match_rules[same] = old_rules[positions[same]]
+
+    rows_to_derive = np.flatnonzero(~same)
+    manual = np.zeros(len(rows_to_derive), dtype=bool)
+    if len(rows_to_derive):
+        part = df.iloc[rows_to_derive].copy()
+        rules = derive_subject_columns(part).to_numpy(dtype=object)
+        part = as_csv_roundtrip(part)
+        for col in DERIVED_COLUMNS:
+            before = df[col].iloc[rows_to_derive].to_numpy(dtype=object)
+            after = part[col].to_numpy(dtype=object)
+            differs = ~((before == after) | (pd.isna(before) & pd.isna(after)))
+            if col in MATCH_METHOD_COLUMNS:
+                rules[differs] = None  # 匹配方法是人工填写的，不是规则给出的
+            manual |= differs
+        match_rules[rows_to_derive] = rules
+
+    stats = _write_incremental(df, csv_file, match_rules, json_file, md_file, manifest_file,
+                               manifest, keys, hashes)
+    stats['derived'] = len(rows_to_derive)
+    stats['manual'] = df[KEY_COLUMN].iloc[rows_to_derive[manual]].astype(str).tolist()
+    stats['incremental'] = True
+    return stats
+
+
+def _rewrite_subject_files(df, source, json_file, md_file, manifest_file):
+    """整体重写JSON/MD（与原 重新生成科目文件.py 的输出一致），删除已不对应的清单"""
+    os.makedirs(os.path.dirname(json_file) or '.', exist_ok=True)
+    export(df, {'json': json_file, 'md': {'path': md_file, 'preface': _md_preface(df, source)}})
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+    return {
+        'rows': len(df),
+        'added': len(df),
+        'changed': 0,
+        'deleted': 0,
+        'unchanged': 0,
+        'bytes_written': os.path.getsize(json_file) + os.path.getsize(md_file),
+        'derived': 0,
+        'manual': [],
+        'incremental': False,
+    }
+
+
+def match_rule_provenance(manifest_file=SUBJECT_MANIFEST):
+    """每个科目的匹配方法由哪条规则给出 {科目代码: 规则名称}"""
+    manifest = load_manifest(manifest_file)
+    if manifest is None:
+        return {}
+    return dict(zip(manifest['rows']['key'], manifest['rows']['match_rule']))
+
+
+if __name__ == "__main__":
+    stats = regenerate_subject_files(pd.read_csv(SUBJECT_CSV, encoding='utf-8-sig'))
+    print(f"✅ 默认科目文件已增量更新: {SUBJECT_JSON}, {SUBJECT_MD}")
+    print(f"   - 总行数: {stats['rows']}")
+    print(f"   - 新增: {stats['added']}，修改: {stats['changed']}，删除: {stats['deleted']}，未变化: {stats['unchanged']}")
+    if not stats['incremental']:
+        print(f"   - CSV缺少{KEY_COLUMN}或匹配方法/报表归属列，已整体重写（未重新执行规则）")
+    print(f"   - 重新执行规则: {stats['derived']} 行")
+    if stats['manual']:
+        print(f"   - 匹配方法/报表归属与规则结果不一致（保留CSV中的人工修改）: {', '.join(stats['manual'])}")
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+默认科目处理流水线
+把 重新分类分析 → 更新匹配方法备注 → 更新二级科目匹配方法 → 分析科目报表归属 → 重新生成科目文件
+声明为有输入/输出依赖的阶段：科目数据只解析一次，阶段之间在内存中传递，最后统一写出一次。
+每个阶段记录输入内容的哈希，输入未变化的阶段直接跳过（需要时从缓存读取其输出）
+
+读取默认科目.py 不作为阶段：它把原始工作簿（小企业会计准则 (1).xlsx，当前版本/修改后的编码和名称、操作、备注等
+12列）原样导出为CSV，而流水线的输入是此后人工整理的默认科目CSV（科目代码、科目名称、借贷……损益细分），
+其中辅助核算是否必要、损益细分等列只在CSV中维护，工作簿里没有，也没有规则能从工作簿生成。
+把它接在流水线前面会用原始工作簿覆盖整理过的CSV；工作簿只在重新整理默认科目时单独运行该脚本导出
+
+用法：python 科目处理流水线.py [--force]
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+
+import pandas as pd
+
+from 科目增量更新 import (
+    SUBJECT_JSON, SUBJECT_MANIFEST, SUBJECT_MD, as_csv_roundtrip, write_subject_files_incremental,
+)
+from 科目规则引擎 import (
+    MATCH_METHOD_REMARK_RULES, REPORT_ATTRIBUTION_RULES, SECONDARY_MATCH_METHOD_RULES,
+    category_lookup, classify_subjects, subject_keys,
+)
+
+SUBJECT_DIR = "04-参考资料/业务文档"
+SUBJECT_CSV = os.path.join(SUBJECT_DIR, "小企业会计准则-默认科目.csv")
+CLASSIFICATION_DIR = "02-需求分析/功能分析"
+CLASSIFICATION_JSON = os.path.join(CLASSIFICATION_DIR, "科目分类结果.json")
+CLASSIFICATION_MD = os.path.join(CLASSIFICATION_DIR, "科目分类分析报告.md")
+CACHE_DIR = os.path.join(SUBJECT_DIR, ".pipeline_cache")
+
+
+# ---------------------------------------------------------------------------
+# 文件写出（重新分类分析.py 共用）
+# ---------------------------------------------------------------------------
+
+def write_classification_files(categories, json_file=CLASSIFICATION_JSON, md_file=CLASSIFICATION_MD):
+    """保存科目分类结果（JSON）和分类分析报告（Markdown）"""
+    os.makedirs(os.path.dirname(json_file), exist_ok=True)
+
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(categories, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ JSON文件已保存: {json_file}")
+
+    with open(md_file, 'w', encoding='utf-8') as f:
+        f.write("# 科目分类分析报告（更新版）\n\n")
+        f.write("## 分类依据\n\n")
+        f.write("根据科目特征进行分类：\n\n")
+        f.write("1. **传统方法-完全匹配**：标准科目，编码和名称都完全一致\n")
+        f.write("2. **传统方法-编码匹配**：编码相同但名称可能不同\n")
+        f.write("3. **传统方法-层级匹配**：有明确层级关系的科目\n")
+        f.write("4. **模型分析-语义匹配**：名称相似但编码不同，需要语义理解\n")
+        f.write("5. **模型分析-同义词匹配**：可能存在同义词的科目\n")
+        f.write("6. **其他处理-删除科目**：已删除的科目，需要特殊处理\n")
+        f.write("7. **其他处理-新增科目**：新增的科目，需要确认\n")
+        f.write("8. **其他处理-待讨论**：需要讨论的科目\n")
+        f.write("9. **其他处理-辅助核算**：有辅助核算的科目，需要特殊处理\n\n")
+
+        f.write("## 分类统计\n\n")
+        f.write("| 分类 | 数量 | 占比 |\n")
+        f.write("|------|------|------|\n")
+        total = sum(len(subjects) for subjects in categories.values())
+        for category, subjects in categories.items():
+            count = len(subjects)
+            percentage = (count / total * 100) if total > 0 else 0
+            f.write(f"| {category} | {count} | {percentage:.1f}% |\n")
+
+        f.write(f"\n**总计**: {total} 个科目\n\n")
+
+        # 详细列表
+        for category, subjects in categories.items():
+            if len(subjects) > 0:
+                f.write(f"## {category}\n\n")
+                f.write(f"共 {len(subjects)} 个科目\n\n")
+                f.write("| 科目代码 | 科目名称 | 类别 | 辅助核算 |\n")
+                f.write("|----------|----------|------|----------|\n")
+                for subj in subjects[:50]:  # 只显示前50个
+                    f.write(f"| {subj['code']} | {subj['name']} | {subj['category']} | {subj['auxiliary']} |\n")
+                if len(subjects) > 50:
+                    f.write(f"\n*（仅显示前50个，共{len(subjects)}个）*\n")
+                f.write("\n")
+
+    print(f"✅ Markdown报告已保存: {md_file}")
+
+
+# ---------------------------------------------------------------------------
+# 内容哈希
+# ---------------------------------------------------------------------------
+
+class SourceFile:
+    """作为流水线输入的源文件，按文件内容计算哈希"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return f"SourceFile({self.path})"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(value):
+    """计算产物的内容哈希（DataFrame按列名、类型和逐行哈希；其他对象按JSON序列化）"""
+    if isinstance(value, SourceFile):
+        return file_hash(value.path)
+    digest = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        digest.update(json.dumps([[str(c), str(t)] for c, t in value.dtypes.items()],
+                                 ensure_ascii=False).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    else:
+        digest.update(json.dumps(value, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# 流水线
+# ---------------------------------------------------------------------------
+
+class Stage:
+    """
+    流水线阶段
+
+    参数:
+    - name: 阶段名称
+    - func: 阶段函数，以输入产物为关键字参数，返回输出产物（单个输出时直接返回值，多个输出返回 {名称: 值}）
+    - inputs: 输入产物名称列表
+    - outputs: 输出产物名称列表
+    - files: 阶段写出的文件；文件缺失或被外部修改时阶段会重新执行
+    """
+
+    def __init__(self, name, func, inputs, outputs=(), files=()):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.files = list(files)
+
+
+class _Cached:
+    """已跳过阶段的输出：只有下游阶段真正需要时才从缓存读取"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        with open(self.path, 'rb') as f:
+            return pickle.load(f)
+
+
+class Pipeline:
+    """按依赖顺序执行阶段，输入哈希未变化的阶段跳过"""
+
+    def __init__(self, stages, cache_dir=CACHE_DIR):
+        self.stages = self._sort(stages)
+        self.cache_dir = cache_dir
+        self.state_file = os.path.join(cache_dir, 'state.json')
+
+    @staticmethod
+    def _sort(stages):
+        """按输入输出依赖做拓扑排序（同一层保持声明顺序）"""
+        producer = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in producer:
+                    raise ValueError(f"产物 {output} 同时由 {producer[output].name} 和 {stage.name} 输出")
+                producer[output] = stage
+
+        ordered, done, visiting = [], set(), set()
+
+        def visit(stage):
+            if stage.name in done:
+                return
+            if stage.name in visiting:
+                raise ValueError(f"阶段依赖存在循环: {stage.name}")
+            visiting.add(stage.name)
+            for name in stage.inputs:
+                if name in producer:
+                    visit(producer[name])
+            visiting.discard(stage.name)
+            done.add(stage.name)
+            ordered.append(stage)
+
+        for stage in stages:
+            visit(stage)
+        return ordered
+
+    def _load_state(self):
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def _save_state(self, state):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+
+    def _cache_path(self, stage, output):
+        key = hashlib.sha256(f"{stage.name}/{output}".encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _can_skip(self, stage, input_hash, previous):
+        if not previous or previous.get('input_hash') != input_hash:
+            return False
+        for output in stage.outputs:
+            if not os.path.exists(self._cache_path(stage, output)):
+                return False
+        for path, recorded in previous.get('file_hashes', {}).items():
+            if not os.path.exists(path) or file_hash(path) != recorded:
+                return False
+        return True
+
+    def run(self, sources, force=False):
+        """
+        执行流水线
+
+        参数:
+        - sources: 初始产物 {名称: 值}（源文件用 SourceFile 包装）
+        - force: 忽略缓存，所有阶段重新执行
+
+        返回: 各阶段的执行情况 [(阶段名称, '执行'/'跳过')]
+        """
+        state = {} if force else self._load_state()
+        artifacts = dict(sources)
+        hashes = {name: content_hash(value) for name, value in sources.items()}
+        report = []
+
+        for stage in self.stages:
+            missing = [name for name in stage.inputs if name not in artifacts]
+            if missing:
+                raise KeyError(f"阶段 {stage.name} 缺少输入: {', '.join(missing)}")
+
+            input_hash = hashlib.sha256(
+                json.dumps([[name, hashes[name]] for name in stage.inputs]).encode('utf-8')).hexdigest()
+            previous = state.get(stage.name)
+
+            if not force and self._can_skip(stage, input_hash, previous):
+                for output in stage.outputs:
+                    artifacts[output] = _Cached(self._cache_path(stage, output))
+                    hashes[output] = previous['output_hashes'][output]
+                report.append((stage.name, '跳过'))
+                continue
+
+            kwargs = {}
+            for name in stage.inputs:
+                if isinstance(artifacts[name], _Cached):
+                    artifacts[name] = artifacts[name].load()
+                kwargs[name] = artifacts[name]
+            result = stage.func(**kwargs)
+            if len(stage.outputs) == 1:
+                result = {stage.outputs[0]: result}
+            result = result or {}
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            output_hashes = {}
+            for output in stage.outputs:
+                artifacts[output] = result[output]
+                hashes[output] = output_hashes[output] = content_hash(result[output])
+                with open(self._cache_path(stage, output), 'wb') as f:
+                    pickle.dump(result[output], f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            state[stage.name] = {
+                'input_hash': input_hash,
+                'output_hashes': output_hashes,
+                'file_hashes': {path: file_hash(path) for path in stage.files if os.path.exists(path)},
+            }
+            self._save_state(state)
+            report.append((stage.name, '执行'))
+
+        return report
+
+
+# ---------------------------------------------------------------------------
+# 默认科目处理阶段
+# ---------------------------------------------------------------------------
+
+def load_subjects(subject_csv):
+    """读取科目数据（整条流水线唯一一次解析）"""
+    return pd.read_csv(subject_csv.path, encoding='utf-8-sig')
+
+
+def classify(subjects):
+    """科目分类（重新分类分析.py）"""
+    return classify_subjects(subjects)
+
+
+def remark_match_method(subjects, classifications):
+    """根据分类结果标注匹配方法（更新匹配方法备注.py）"""
+    df = subjects.copy()
+    category = subject_keys(df['科目代码'], df['科目名称']).map(category_lookup(classifications)).fillna('')
+    match_methods = MATCH_METHOD_REMARK_RULES.evaluate(df.assign(分类结果=category.to_numpy()))
+    df['匹配方法'] = match_methods['匹配方法']
+    df['匹配方法说明'] = match_methods['匹配方法说明']
+    return df
+
+
+def secondary_match_method(subjects_remarked):
+    """二级及多级科目改为大模型匹配（更新二级科目匹配方法.py），同时输出每行匹配方法的命中规则"""
+    df = subjects_remarked.copy()
+    match_rules = SECONDARY_MATCH_METHOD_RULES.apply(df)
+    return {'subjects_matched': df, 'match_rules': match_rules.tolist()}
+
+
+def report_attribution(subjects_matched):
+    """判断报表归属（分析科目报表归属.py）"""
+    df = subjects_matched.copy()
+    REPORT_ATTRIBUTION_RULES.apply(df)
+    return df
+
+
+def save_classifications(classifications):
+    write_classification_files(classifications)
+
+
+def save_subjects(subjects_final, match_rules):
+    """写出科目文件：CSV整体保存，JSON/Markdown按行哈希清单增量更新"""
+    write_subject_files_incremental(as_csv_roundtrip(subjects_final), SUBJECT_CSV, match_rules=match_rules,
+                                    csv_file=SUBJECT_CSV)
+
+
+def default_pipeline(cache_dir=CACHE_DIR):
+    """默认科目处理流水线"""
+    return Pipeline([
+        Stage('读取科目数据', load_subjects, inputs=['subject_csv'], outputs=['subjects']),
+        Stage('科目分类', classify, inputs=['subjects'], outputs=['classifications']),
+        Stage('匹配方法备注', remark_match_method,
+              inputs=['subjects', 'classifications'], outputs=['subjects_remarked']),
+        Stage('二级科目匹配方法', secondary_match_method,
+              inputs=['subjects_remarked'], outputs=['subjects_matched', 'match_rules']),
+        Stage('报表归属', report_attribution, inputs=['subjects_matched'], outputs=['subjects_final']),
+        Stage('写出分类结果', save_classifications, inputs=['classifications'],
+              files=[CLASSIFICATION_JSON, CLASSIFICATION_MD]),
+        Stage('写出科目文件', save_subjects, inputs=['subjects_final', 'match_rules'],
+              files=[SUBJECT_CSV, SUBJECT_JSON, SUBJECT_MD, SUBJECT_MANIFEST]),
+    ], cache_dir=cache_dir)
+
+
+if __name__ == "__main__":
+    force = '--force' in sys.argv[1:]
+    report = default_pipeline().run({'subject_csv': SourceFile(SUBJECT_CSV)}, force=force)
+
+    print("\n📊 流水线执行情况:")
+    for name, status in report:
+        print(f"   - {name}: {status}")
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+层级匹配（hierarchy_match）：在第一层精确匹配之后、调用大模型之前批量执行
+对方系统的编码格式各不相同（如 150101 / 1501.01 / 1501-01 / 1501.1 / 1501001），
+先按层级拆成编码段并统一为本系统的段宽，得到规范编码段元组，再：
+1. 规范编码命中目标科目 -> 编码格式不同的同一科目
+2. 父科目已匹配（或父科目的规范编码命中目标科目）-> 在目标父科目的下级科目中按名称查找
+
+处理第一层未匹配（unmatched）的源科目；另外，名称匹配的结果得到规范编码印证、或规范编码和名称共同指向
+编码匹配结果以外的另一科目时，也改为层级匹配的结果；结果字段与 科目精确匹配.match_exact 一致
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from 科目索引 import clean_value
+from 科目精确匹配 import (
+    MATCH_TYPES,
+    SOURCE_CODE_FIELD,
+    TARGET_FIELDS,
+    load_target_index,
+    match_exact,
+    normalize_code_column,
+    normalize_name_column,
+    target_table,
+)
+
+# 本系统（小企业会计准则）的编码段宽：一级科目4位，以下每级2位
+TARGET_CODE_SCHEME = (4, 2, 2, 2)
+
+SOURCE_PARENT_FIELD = 'source_parent_code'
+
+# 推断段宽时，某一编码长度的科目数占比低于该值视为个别异常编码，不作为层级
+SCHEME_MIN_SHARE = 0.05
+
+# 层级匹配的评分、置信度和映射状态（同一科目编码格式不同时名称一致为高置信度）
+HIERARCHY_MATCHES = {
+    'format_name': {'score': 95, 'confidence': '高', 'status': 'matched'},
+    'format_code': {'score': 75, 'confidence': '中', 'status': 'matched'},
+    'parent_name': {'score': 85, 'confidence': '中', 'status': 'matched'},
+}
+
+_SEGMENT_SEPARATORS = re.compile(r'[.\-_/\s]+')
+
+
+# ---------------------------------------------------------------------------
+# 编码段
+# ---------------------------------------------------------------------------
+
+def _split_by_scheme(text, scheme):
+    """按段宽拆分无分隔符的编码，超出段宽定义的部分按最后一个段宽继续拆分"""
+    segments = []
+    position = 0
+    level = 0
+    while position < len(text):
+        width = scheme[min(level, len(scheme) - 1)]
+        segments.append(text[position:position + width])
+        position += width
+        level += 1
+    return segments
+
+
+def code_segments(code, scheme=TARGET_CODE_SCHEME, target_scheme=TARGET_CODE_SCHEME):
+    """
+    把编码拆为规范编码段元组（各段按 target_scheme 的段宽补零）
+
+    参数:
+    - code: 源科目编码，如 '150101'、'1501.01'、'1501-1'、'1501001'
+    - scheme: 源系统无分隔符编码的段宽，如金蝶常见的 (4, 3, 3)
+    - target_scheme: 本系统的段宽
+
+    如：'1501.1' -> ('1501', '01')，'1501001'（scheme=(4, 3, 3)）-> ('1501', '01')
+    数字段的值超出目标段宽、或含非数字字符时原样保留（不会与目标科目对上）
+    """
+    text = unicodedata.normalize('NFKC', clean_value(code)).upper()
+    if not text:
+        return ()
+    parts = [p for p in _SEGMENT_SEPARATORS.split(text) if p]
+    if len(parts) == 1:
+        raw = _split_by_scheme(parts[0], scheme)
+    else:
+        # 一级部分本身可能含下级（如 '150101.01'），按源系统段宽先拆开
+        raw = _split_by_scheme(parts[0], scheme) + parts[1:]
+
+    segments = []
+    for level, segment in enumerate(raw):
+        width = target_scheme[min(level, len(target_scheme) - 1)]
+        if segment.isdigit() and len(str(int(segment))) <= width:
+            segment = str(int(segment)).zfill(width)
+        segments.append(segment)
+    return tuple(segments)
+
+
+def detect_code_scheme(codes, default=TARGET_CODE_SCHEME, min_share=SCHEME_MIN_SHARE):
+    """
+    由源系统的无分隔符纯数字编码推断段宽
+    如编码长度为 4/7/10 -> (4, 3, 3)；无法推断时返回 default
+    占比低于 min_share 的编码长度（个别录入错误的编码）不参与推断；推断不可靠时由调用方直接传入 scheme
+    """
+    counts = pd.Series([len(c) for c in (clean_value(v) for v in codes) if c.isdigit()], dtype=np.int64).value_counts()
+    lengths = sorted(counts.index[counts >= min_share * counts.sum()])
+    if not lengths:
+        return default
+    widths = [lengths[0]] + [b - a for a, b in zip(lengths, lengths[1:])]
+    if len(set(widths[1:])) > 1:
+        return default
+    return tuple(widths) if len(widths) > 1 else (widths[0],) + default[1:]
+
+
+def canonical_code_column(values, scheme=TARGET_CODE_SCHEME):
+    """整列编码的规范编码段元组，相同取值只计算一次"""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    segments = np.empty(len(uniques), dtype=object)
+    segments[:] = [code_segments(v, scheme) for v in uniques]
+    return segments[codes]
+
+
+# ---------------------------------------------------------------------------
+# 层级匹配
+# ---------------------------------------------------------------------------
+
+def _lookup(keys, table):
+    """keys 在 table（键 -> 目标行号）中的行号，没有时为-1"""
+    if not len(table):
+        return np.full(len(keys), -1, dtype=np.intp)
+    series = pd.Series(table, dtype=np.intp)
+    hit = series.index.get_indexer(keys)
+    return np.where(hit >= 0, series.to_numpy()[np.maximum(hit, 0)], -1)
+
+
+def match_hierarchy(result, target=None, scheme=None):
+    """
+    对第一层匹配结果执行层级匹配
+
+    参数:
+    - result: 科目精确匹配.match_exact 的结果
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    - scheme: 源系统无分隔符编码的段宽，默认由源科目编码推断（见 detect_code_scheme）
+
+    返回: 新的 DataFrame，层级匹配命中的行 match_type 改为 hierarchy_match
+    """
+    if target is None:
+        target = load_target_index()
+    targets = target_table(target)
+    result = result.copy()
+    if scheme is None:
+        scheme = detect_code_scheme(result[SOURCE_CODE_FIELD])
+
+    canonical = canonical_code_column(result[SOURCE_CODE_FIELD], scheme)
+    canonical_codes = np.array([''.join(s) for s in canonical], dtype=object)
+    names = normalize_name_column(result['source_subject_name'])
+    match_type = result['match_type'].to_numpy(dtype=object).copy()
+    position = pd.Index(targets['target_subject_code']).get_indexer(result['target_subject_code'])
+    kinds = np.full(len(result), None, dtype=object)
+    reasons = np.full(len(result), None, dtype=object)
+    target_codes = targets['target_subject_code'].to_numpy(dtype=object)
+    target_names = targets['normalized_name'].to_numpy(dtype=object)
+
+    # 1. 规范编码命中目标科目：编码格式不同的同一科目
+    #    名称匹配的结果与规范编码指向同一目标科目时，编码和名称相互印证，一并提升；
+    #    编码匹配只是去掉分隔符后碰巧对上（如 2221.1.1 -> 222111），而规范编码和名称都指向另一科目时，以后者为准
+    code_pos = pd.Index(targets['target_subject_code']).get_indexer(canonical_codes)
+    name_agrees = (code_pos >= 0) & (target_names[np.maximum(code_pos, 0)] == names)
+    hit = (code_pos >= 0) & ((match_type == 'unmatched')
+                             | ((match_type == 'name_match') & (position == code_pos))
+                             | ((match_type == 'code_match') & (position != code_pos) & name_agrees))
+    same_name = hit & name_agrees
+    for rows, kind, template in ((same_name, 'format_name', '编码格式不同（{source} → {target}），名称一致'),
+                                 (hit & ~same_name, 'format_code', '编码格式不同（{source} → {target}），名称不同')):
+        rows = np.flatnonzero(rows)
+        position[rows] = code_pos[rows]
+        kinds[rows] = kind
+        reasons[rows] = [template.format(source=s, target=target_codes[p])
+                         for s, p in zip(result[SOURCE_CODE_FIELD].to_numpy(dtype=object)[rows], code_pos[rows])]
+    match_type[hit] = 'hierarchy_match'
+
+    # 2. 父科目已匹配：在目标父科目的下级科目中按名称查找（同名下级科目唯一时命中）
+    if SOURCE_PARENT_FIELD in result.columns and result[SOURCE_PARENT_FIELD].notna().any():
+        parents = canonical_code_column(result[SOURCE_PARENT_FIELD], scheme)
+        parent_codes = np.array([''.join(s) for s in parents], dtype=object)
+        derived = np.array([''.join(s[:-1]) for s in canonical], dtype=object)
+        parent_codes = np.where(parent_codes == '', derived, parent_codes)
+    else:
+        parent_codes = np.array([''.join(s[:-1]) for s in canonical], dtype=object)
+
+    groups = targets.groupby(['target_parent_code', 'normalized_name'], sort=False).indices
+    child_table = {f"{parent}\x00{name}": pos[0] for (parent, name), pos in groups.items()
+                   if len(pos) == 1 and parent and name}
+    prefix_table = dict(zip(targets['target_subject_code'], range(len(targets))))
+    levels = np.array([len(s) for s in canonical])
+    source_codes = normalize_code_column(result[SOURCE_CODE_FIELD])
+
+    # 按层级从上到下处理，上级科目在本轮命中后，下级科目可以通过它继续匹配
+    for level in sorted(set(levels[(match_type == 'unmatched') & (levels > 1)])):
+        matched = position >= 0
+        # 源父科目 -> 目标科目：优先用源科目表中父科目的匹配结果，否则用父科目的规范编码
+        parent_map = {}
+        for key in (canonical_codes[matched], source_codes[matched]):
+            parent_map.update(zip(key, target_codes[position[matched]]))
+        rows = np.flatnonzero((match_type == 'unmatched') & (levels == level))
+        keys = parent_codes[rows]
+        mapped = pd.Series(keys).map(parent_map).to_numpy(dtype=object)
+        fallback = _lookup(keys, prefix_table)
+        target_parent = np.where(pd.isna(mapped), np.where(fallback >= 0, target_codes[np.maximum(fallback, 0)], ''),
+                                 mapped)
+        child_pos = _lookup([f"{p}\x00{n}" for p, n in zip(target_parent, names[rows])], child_table)
+        found = child_pos >= 0
+        rows, child_pos = rows[found], child_pos[found]
+        position[rows] = child_pos
+        match_type[rows] = 'hierarchy_match'
+        kinds[rows] = 'parent_name'
+        reasons[rows] = [f"父科目已匹配（{s} → {p}），下级科目名称一致"
+                         for s, p in zip(keys[found], target_parent[found])]
+
+    # 写回命中行的目标科目信息和匹配过程字段
+    rows = np.flatnonzero(kinds != None)  # noqa: E711
+    for field in TARGET_FIELDS:
+        values = result[field].to_numpy(dtype=object).copy()
+        values[rows] = targets[field].to_numpy(dtype=object)[position[rows]]
+        result[field] = values
+    for field, key in (('match_score', 'score'), ('match_confidence', 'confidence'), ('mapping_status', 'status')):
+        values = result[field].to_numpy(dtype=object).copy()
+        values[rows] = [HIERARCHY_MATCHES[k][key] for k in kinds[rows]]
+        result[field] = values
+    result['match_score'] = result['match_score'].astype(np.int64)
+    for field, values in (('match_type', match_type), ('match_method', 'traditional_rule'),
+                          ('match_reason', reasons), ('candidate_subjects', None)):
+        column = result[field].to_numpy(dtype=object).copy()
+        column[rows] = values[rows] if isinstance(values, np.ndarray) else values
+        result[field] = column
+    return result
+
+
+def match_traditional(source, target=None, scheme=None):
+    """传统匹配：第一层精确匹配 + 层级匹配，剩余 unmatched 的科目再交给大模型"""
+    if target is None:
+        target = load_target_index()
+    return match_hierarchy(match_exact(source, target), target, scheme)
+
+
+def summarize(result):
+    """各匹配类型的科目数"""
+    types = list(MATCH_TYPES)
+    types.insert(-1, 'hierarchy_match')
+    return result['match_type'].value_counts().reindex(types, fill_value=0).to_dict()
+
+
+if __name__ == "__main__":
+    # 示例：基于大模型的二级科目匹配方案.md 中的编码格式差异，以及一级科目编码不同时通过父科目匹配下级科目
+    source = pd.DataFrame({
+        'source_subject_code': ['1501', '1501.01', '1501-02', '1501.1', '1501.001', '6602', '6602.05', '6602.99', 'A1'],
+        'source_subject_name': ['长期债券投资', '债券投资', '其他债权投资', '债券投资', '债券', '管理费用',
+                                '水电费', '其他', '银行存款'],
+    })
+    result = match_traditional(source)
+    print(result[['source_subject_code', 'source_subject_name', 'target_subject_code',
+                  'match_type', 'match_score', 'match_reason']].to_string())
+    print(f"\n📊 {summarize(result)}")
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+父子科目结构一致性校验（见 映射结果校验规则分析.md 规则 R10）
+1501、150101、150102 都已映射时，子科目的目标科目应为父科目的目标科目或其下级。
+逐个子树两两比较是 O(n²)，这里源、目标两侧的层级各构建一次，整批校验为 O(n)：
+1. 目标侧：默认科目表按层级做一次先序遍历（Euler tour），每个科目得到区间 [tin, tout)，
+   x 属于 a 的子树 ⇔ tin[a] <= tin[x] < tout[a]
+2. 源侧：父科目编码转为批次内的行号（parent_row），按层从根向下推出每行最近的已映射上级（anchor），
+   父科目未映射（如只导入了明细）时向上越过它，与更上一级比较
+3. 每行只做一次区间比较；按 anchor 分组即为断裂的子树（源父科目、其目标科目、越界的子科目）
+"""
+
+import numpy as np
+import pandas as pd
+
+from 科目精确匹配 import SOURCE_CODE_FIELD, SOURCE_NAME_FIELD, load_target_index, normalize_code_column
+
+SOURCE_PARENT_FIELD = 'source_parent_code'
+
+SUBTREE_COLUMNS = ['source_parent_code', 'source_parent_name', 'parent_target_code',
+                   'children', 'fractured', 'fractured_children']
+
+
+# ---------------------------------------------------------------------------
+# 层级数组
+# ---------------------------------------------------------------------------
+
+def infer_parent_codes(codes):
+    """没有父科目列时，以批次中存在的最长真前缀编码作为父科目（与 SubjectIndex 的层级规则一致）"""
+    codes = pd.Series(codes, dtype=object)
+    lengths = codes.str.len().to_numpy()
+    known = set(codes)
+    parents = np.full(len(codes), '', dtype=object)
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        for size in range(1, length):
+            prefixes = codes.iloc[rows].str[:size].to_numpy(dtype=object)
+            found = np.fromiter((p in known for p in prefixes), dtype=bool, count=len(rows))
+            parents[rows[found]] = prefixes[found]
+    return parents
+
+
+def parent_rows(codes, parents):
+    """父科目所在的行号（同一编码出现多次时取第一行），父科目不在批次中时为 -1"""
+    codes = pd.Index(codes)
+    unique = ~codes.duplicated()
+    hit = codes[unique].get_indexer(parents)
+    rows = np.where((hit >= 0) & (np.asarray(parents) != ''), np.flatnonzero(unique)[np.maximum(hit, 0)], -1)
+    rows[rows == np.arange(len(rows))] = -1
+    return rows
+
+
+def levels(parent_row):
+    """
+    按层从根向下遍历（每行只访问一次）
+
+    返回: 生成器，依次为第 0、1、2… 层的行号数组；成环的行不可达，不会出现
+    """
+    size = len(parent_row)
+    has_parent = parent_row >= 0
+    # 子科目按父行号排序后连续存放（CSR），第 p 行的子科目为 children[start[p]:start[p] + count[p]]
+    children = np.argsort(np.where(has_parent, parent_row, -1), kind='stable')
+    count = np.bincount(parent_row[has_parent], minlength=size)
+    start = np.concatenate(([0], np.cumsum(count)[:-1])) + int((~has_parent).sum())
+    frontier = np.flatnonzero(~has_parent)
+    while len(frontier):
+        yield frontier
+        sizes = count[frontier]
+        total = int(sizes.sum())
+        if not total:
+            break
+        offsets = np.repeat(start[frontier] - np.cumsum(sizes) + sizes, sizes) + np.arange(total)
+        frontier = children[offsets]
+
+
+def nearest_mapped_ancestor(parent_row, mapped):
+    """每行最近的已映射上级科目的行号，没有时为 -1"""
+    anchor = np.full(len(parent_row), -1, dtype=np.int64)
+    for rows in levels(parent_row):
+        parent = parent_row[rows]
+        has_parent = parent >= 0
+        rows, parent = rows[has_parent], parent[has_parent]
+        anchor[rows] = np.where(mapped[parent], parent, anchor[parent])
+    return anchor
+
+
+def euler_intervals(target):
+    """
+    目标科目表的先序遍历区间
+
+    返回: (codes, tin, tout)，codes 为科目编码的 pd.Index，第 i 个科目的子树为先序位置 [tin[i], tout[i])
+    """
+    records = list(target)
+    codes = pd.Index([r.code for r in records])
+    parent = codes.get_indexer([r.parent_code for r in records])
+    children = [[] for _ in records]
+    roots = []
+    for i, p in enumerate(parent):
+        (children[p] if p >= 0 and p != i else roots).append(i)
+
+    tin = np.zeros(len(records), dtype=np.int64)
+    tout = np.zeros(len(records), dtype=np.int64)
+    clock = 0
+    stack = [(i, False) for i in reversed(roots)]
+    while stack:
+        node, done = stack.pop()
+        if done:
+            tout[node] = clock
+            continue
+        tin[node] = clock
+        clock += 1
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(children[node]))
+    return codes, tin, tout
+
+
+# ---------------------------------------------------------------------------
+# 校验
+# ---------------------------------------------------------------------------
+
+class HierarchyChecker:
+    """
+    父子科目结构校验器（目标科目表的先序区间只构建一次）
+
+    参数:
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    """
+
+    def __init__(self, target=None):
+        if target is None:
+            target = load_target_index()
+        self.codes, self.tin, self.tout = euler_intervals(target)
+
+    def check(self, source_code, source_parent, target_code):
+        """
+        校验一批映射（三列均为已规范化的编码数组，未映射的目标编码为''）
+
+        返回: (fractured, anchor)
+        - fractured: 布尔数组，子科目的目标不在最近的已映射上级科目的目标之下
+        - anchor: 最近的已映射上级科目的行号，没有时为 -1
+        """
+        position = self.codes.get_indexer(target_code)
+        mapped = position >= 0
+        anchor = nearest_mapped_ancestor(parent_rows(source_code, source_parent), mapped)
+        rows = np.flatnonzero(mapped & (anchor >= 0))
+        child = self.tin[position[rows]]
+        parent = position[anchor[rows]]
+        fractured = np.zeros(len(position), dtype=bool)
+        fractured[rows] = (child < self.tin[parent]) | (child >= self.tout[parent])
+        return fractured, anchor
+
+    def subtrees(self, source_code, target_code, fractured, anchor, source_name=None):
+        """
+        断裂的子树：每个有越界子科目的源父科目一行
+
+        返回: DataFrame（source_parent_code、source_parent_name、parent_target_code、
+        children 已校验的子科目数、fractured 越界数、fractured_children 越界的 "子科目 → 目标科目"）
+        """
+        rows = np.flatnonzero(fractured)
+        if not len(rows):
+            return pd.DataFrame(columns=SUBTREE_COLUMNS)
+        if source_name is None:
+            source_name = np.full(len(source_code), '', dtype=object)
+        checked = (anchor >= 0) & (self.codes.get_indexer(target_code) >= 0)
+        children = np.bincount(anchor[checked], minlength=len(anchor))
+        # 越界行按上级排序后连续存放，每个子树的说明只拼接一次
+        rows = rows[np.argsort(anchor[rows], kind='stable')]
+        keys = anchor[rows]
+        starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+        ends = np.append(starts[1:], len(rows))
+        labels = [f"{c} → {t}" for c, t in zip(source_code[rows], target_code[rows])]
+        parents = keys[starts]
+        return pd.DataFrame({
+            'source_parent_code': source_code[parents],
+            'source_parent_name': source_name[parents],
+            'parent_target_code': target_code[parents],
+            'children': children[parents],
+            'fractured': ends - starts,
+            'fractured_children': ['、'.join(labels[s:e]) for s, e in zip(starts, ends)],
+        })
+
+
+def check_hierarchy(mapping, target=None):
+    """
+    校验映射批次的父子科目结构（R10）
+
+    参数:
+    - mapping: 映射批次（中间表格式）：source_subject_code、target_subject_code，可选 source_parent_code
+      （没有时按编码前缀推断）、source_subject_name
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+
+    返回: (fractured, subtrees)，fractured 为逐行布尔数组，subtrees 见 HierarchyChecker.subtrees
+    """
+    checker = HierarchyChecker(target)
+    source_code = normalize_code_column(mapping[SOURCE_CODE_FIELD])
+    source_parent = normalize_code_column(mapping[SOURCE_PARENT_FIELD]) \
+        if SOURCE_PARENT_FIELD in mapping.columns else infer_parent_codes(source_code)
+    target_code = normalize_code_column(mapping['target_subject_code'])
+    source_name = mapping[SOURCE_NAME_FIELD].to_numpy(dtype=object) if SOURCE_NAME_FIELD in mapping.columns else None
+    fractured, anchor = checker.check(source_code, source_parent, target_code)
+    return fractured, checker.subtrees(source_code, target_code, fractured, anchor, source_name)
+
+
+if __name__ == "__main__":
+    import time
+
+    index = load_target_index()
+
+    # 映射结果校验规则分析.md 中的示例，另加一个父科目未映射、需越级比较的三级科目
+    mapping = pd.DataFrame([
+        ('1501', '长期债券投资', '1501'),
+        ('150101', '债券投资', '1601'),
+        ('150102', '其他债权投资', '1122'),
+        ('1002', '银行存款', '1002'),
+        ('100201', '工商银行', ''),
+        ('10020101', '基本户', '1012'),
+        ('2221', '应交税费', '2221'),
+        ('222101', '应交增值税', '222101'),
+    ], columns=['source_subject_code', 'source_subject_name', 'target_subject_code'])
+    fractured, subtrees = check_hierarchy(mapping, index)
+    print(mapping.assign(R10=fractured).to_string())
+    print(subtrees.to_string())
+
+    # 性能：100万行、5级的源科目树
+    checker = HierarchyChecker(index)
+    rng = np.random.default_rng(0)
+    count = 1_000_000
+    parent = np.where(np.arange(count) < 1000, -1, rng.integers(0, np.maximum(np.arange(count) // 5, 1)))
+    source_code = np.array([f"S{i:07d}" for i in range(count)], dtype=object)
+    source_parent = np.where(parent >= 0, source_code[np.maximum(parent, 0)], '')
+    chart_codes = checker.codes.to_numpy()
+    target_code = chart_codes[rng.integers(0, len(chart_codes), count)]
+    start = time.perf_counter()
+    fractured, anchor = checker.check(source_code, source_parent, target_code)
+    subtrees = checker.subtrees(source_code, target_code, fractured, anchor)
+    print(f"\n✅ 校验 {count} 行，耗时 {time.perf_counter() - start:.2f} 秒，"
+          f"越界子科目 {int(fractured.sum())} 个，断裂子树 {len(subtrees)} 个")
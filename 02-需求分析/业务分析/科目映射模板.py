@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+映射关系模板（见 导账科目映射设计方案.md 映射关系模板、科目映射中间表设计方案.md template_id）
+同一来源系统（用友、金蝶等）的科目体系在多家客户、多次导账中反复出现，用户确认过的映射保存为模板，
+再次导入时先整批套用模板，已知科目直接得到映射，只有新科目才进入精确匹配、层级匹配和大模型匹配
+
+- 模板库：本地 SQLite，主键 (source_system_code, 规范化源科目编码, 规范化源科目名称)
+- 套用：一次读出相关来源系统的模板，与本批源科目做一次哈希连接，每个科目 O(1) 命中
+- 命中的科目 match_type、match_method 均为 template，目标科目信息按当前目标科目表补全
+"""
+
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from 科目层级匹配 import match_traditional
+from 科目精确匹配 import (
+    SOURCE_CODE_FIELD,
+    SOURCE_NAME_FIELD,
+    TARGET_FIELDS,
+    load_target_index,
+    normalize_code_column,
+    normalize_name_column,
+    target_table,
+)
+from 科目索引 import clean_value, normalize_code, normalize_name
+
+DEFAULT_TEMPLATE_DB = "04-参考资料/业务文档/映射模板.sqlite3"
+SOURCE_SYSTEM_FIELD = 'source_system_code'
+TEMPLATE_ID_FIELD = 'template_id'
+
+# 保存为模板的映射状态：只有用户确认过的映射才能复用
+TEMPLATE_STATUSES = ('confirmed',)
+
+# 模板匹配的评分、置信度和映射状态
+TEMPLATE_MATCH = {'score': 100, 'confidence': '高', 'status': 'matched'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mapping_template (
+    source_system_code  TEXT NOT NULL,
+    source_code_key     TEXT NOT NULL,
+    source_name_key     TEXT NOT NULL,
+    source_subject_code TEXT,
+    source_subject_name TEXT,
+    target_subject_code TEXT NOT NULL,
+    target_subject_name TEXT,
+    template_id         TEXT,
+    updated_at          REAL NOT NULL,
+    PRIMARY KEY (source_system_code, source_code_key, source_name_key)
+) WITHOUT ROWID;
+"""
+
+# 连接键各部分之间的分隔符（不会出现在规范化后的编码、名称中）
+_KEY_SEPARATOR = '\x1f'
+
+
+def _join_keys(systems, codes, names):
+    return (pd.Series(systems, dtype=object) + _KEY_SEPARATOR + pd.Series(codes, dtype=object)
+            + _KEY_SEPARATOR + pd.Series(names, dtype=object)).to_numpy(dtype=object)
+
+
+def _source_systems(frame, source_system):
+    """每行的来源系统：优先使用 source_system_code 列，为空时使用参数"""
+    default = clean_value(source_system)
+    if SOURCE_SYSTEM_FIELD not in frame.columns:
+        return np.full(len(frame), default, dtype=object)
+    systems = np.array([clean_value(v) for v in frame[SOURCE_SYSTEM_FIELD].to_numpy(dtype=object)], dtype=object)
+    systems[systems == ''] = default
+    return systems
+
+
+class MappingTemplateStore:
+    """
+    映射模板库（SQLite）
+
+    - save(result): 把已确认的映射保存为模板（相同来源系统、相同科目覆盖旧模板）
+    - load(systems): 读出若干来源系统的全部模板
+    - lookup(system, code, name): 按主键查询单个科目的模板
+    """
+
+    def __init__(self, path=DEFAULT_TEMPLATE_DB):
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def save(self, result, source_system=None, statuses=TEMPLATE_STATUSES, template_id=None):
+        """
+        保存映射为模板
+
+        参数:
+        - result: 映射结果（中间表格式），mapping_status 在 statuses 中且有目标科目的行才保存
+        - source_system: 来源系统编码，result 没有 source_system_code 列（或为空）时使用
+        - template_id: 模板ID，默认为来源系统编码
+
+        返回: 保存的模板数
+        """
+        status = result['mapping_status'].to_numpy(dtype=object)
+        targets = normalize_code_column(result['target_subject_code'])
+        systems = _source_systems(result, source_system)
+        keep = np.isin(status, list(statuses)) & (targets != '') & (systems != '')
+        rows = np.flatnonzero(keep)
+        if not len(rows):
+            return 0
+
+        frame = result.iloc[rows]
+        now = time.time()
+        records = zip(
+            systems[rows],
+            normalize_code_column(frame[SOURCE_CODE_FIELD]),
+            normalize_name_column(frame[SOURCE_NAME_FIELD]),
+            (clean_value(v) for v in frame[SOURCE_CODE_FIELD].to_numpy(dtype=object)),
+            (clean_value(v) for v in frame[SOURCE_NAME_FIELD].to_numpy(dtype=object)),
+            targets[rows],
+            (clean_value(v) for v in frame['target_subject_name'].to_numpy(dtype=object)),
+            (template_id or system for system in systems[rows]),
+        )
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO mapping_template (source_system_code, source_code_key, source_name_key, "
+                "source_subject_code, source_subject_name, target_subject_code, target_subject_name, "
+                "template_id, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (source_system_code, source_code_key, source_name_key) DO UPDATE SET "
+                "source_subject_code = excluded.source_subject_code, "
+                "source_subject_name = excluded.source_subject_name, "
+                "target_subject_code = excluded.target_subject_code, "
+                "target_subject_name = excluded.target_subject_name, "
+                "template_id = excluded.template_id, updated_at = excluded.updated_at",
+                (record + (now,) for record in records))
+        return len(rows)
+
+    def load(self, systems):
+        """读出指定来源系统的全部模板（按主键前缀走索引）"""
+        systems = sorted(set(systems) - {''})
+        if not systems:
+            return pd.DataFrame(columns=['source_system_code', 'source_code_key', 'source_name_key',
+                                         'target_subject_code', 'template_id'])
+        return pd.read_sql_query(
+            "SELECT source_system_code, source_code_key, source_name_key, target_subject_code, template_id "
+            f"FROM mapping_template WHERE source_system_code IN ({','.join('?' * len(systems))})",
+            self._conn, params=systems)
+
+    def lookup(self, system, code, name):
+        """单个科目的模板目标科目编码，没有时返回 None"""
+        row = self._conn.execute(
+            "SELECT target_subject_code FROM mapping_template "
+            "WHERE source_system_code = ? AND source_code_key = ? AND source_name_key = ?",
+            (clean_value(system), normalize_code(code), normalize_name(name))).fetchone()
+        return row[0] if row else None
+
+    def delete(self, system, template_id=None):
+        """删除来源系统的模板（可只删除某个模板ID），返回删除数"""
+        sql, params = "DELETE FROM mapping_template WHERE source_system_code = ?", [system]
+        if template_id is not None:
+            sql, params = sql + " AND template_id = ?", params + [template_id]
+        with self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def count(self, system=None):
+        if system is None:
+            return self._conn.execute("SELECT COUNT(*) FROM mapping_template").fetchone()[0]
+        return self._conn.execute("SELECT COUNT(*) FROM mapping_template WHERE source_system_code = ?",
+                                  (system,)).fetchone()[0]
+
+
+# ---------------------------------------------------------------------------
+# 套用模板
+# ---------------------------------------------------------------------------
+
+def lookup_templates(source, store, source_system=None):
+    """
+    源科目与模板的哈希连接
+
+    返回: (模板 DataFrame, 每个源科目命中的模板行号数组，未命中为-1)
+    """
+    systems = _source_systems(source, source_system)
+    templates = store.load(systems)
+    if not len(templates) or not len(source):
+        return templates, np.full(len(source), -1, dtype=np.intp)
+    keys = _join_keys(systems, normalize_code_column(source[SOURCE_CODE_FIELD]),
+                      normalize_name_column(source[SOURCE_NAME_FIELD]))
+    template_keys = _join_keys(templates['source_system_code'], templates['source_code_key'],
+                               templates['source_name_key'])
+    return templates, pd.Index(template_keys).get_indexer(keys)
+
+
+def match_templates(source, store=None, target=None, source_system=None):
+    """
+    套用映射模板
+
+    参数:
+    - source: DataFrame，至少包含 source_subject_code、source_subject_name，可选 source_system_code
+    - store: MappingTemplateStore，默认打开 DEFAULT_TEMPLATE_DB
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+    - source_system: 来源系统编码，source 没有 source_system_code 列（或为空）时使用
+
+    返回: DataFrame，源科目各列 + TARGET_FIELDS + MATCH_FIELDS + template_id，行顺序与 source 一致；
+    命中模板的行 match_type 为 template，其余为 unmatched（模板中的目标科目已不在目标科目表中的也视为未命中）
+    """
+    if store is None:
+        store = MappingTemplateStore()
+    if target is None:
+        target = load_target_index()
+    targets = target_table(target)
+    templates, hit = lookup_templates(source, store, source_system)
+
+    position = np.full(len(source), -1, dtype=np.intp)
+    template_ids = np.full(len(source), None, dtype=object)
+    found = hit >= 0
+    if found.any():
+        target_codes = templates['target_subject_code'].to_numpy(dtype=object)[hit[found]]
+        position[found] = pd.Index(targets['target_subject_code']).get_indexer(target_codes)
+        template_ids[found] = templates['template_id'].to_numpy(dtype=object)[hit[found]]
+    matched = position >= 0
+    template_ids[~matched] = None
+
+    result = source.reset_index(drop=True).copy()
+    for field in TARGET_FIELDS:
+        values = np.full(len(source), None, dtype=object)
+        values[matched] = targets[field].to_numpy(dtype=object)[position[matched]]
+        result[field] = values
+    result['match_type'] = np.where(matched, 'template', 'unmatched').astype(object)
+    result['match_method'] = np.where(matched, 'template', None)
+    result['match_score'] = np.where(matched, TEMPLATE_MATCH['score'], 0).astype(np.int64)
+    result['match_confidence'] = np.where(matched, TEMPLATE_MATCH['confidence'], '低').astype(object)
+    result['mapping_status'] = np.where(matched, TEMPLATE_MATCH['status'], 'pending').astype(object)
+    result['match_reason'] = np.array([f"映射模板（{t}）" if t else None for t in template_ids], dtype=object)
+    result['candidate_subjects'] = np.full(len(source), None, dtype=object)
+    result[TEMPLATE_ID_FIELD] = template_ids
+    return result
+
+
+def match_with_templates(source, store=None, target=None, source_system=None, scheme=None):
+    """
+    先套用映射模板，未命中的科目再执行传统匹配（精确匹配 + 层级匹配）
+
+    返回: 与 科目层级匹配.match_traditional 相同格式的 DataFrame（另含 template_id），行顺序与 source 一致
+    """
+    if target is None:
+        target = load_target_index()
+    result = match_templates(source, store, target, source_system)
+    rest = np.flatnonzero(result['match_type'].to_numpy(dtype=object) != 'template')
+    if not len(rest):
+        return result
+
+    remaining = match_traditional(source.iloc[rest], target, scheme)
+    columns = list(result.columns)
+    for field in columns:
+        if field in remaining.columns:
+            values = result[field].to_numpy(dtype=object).copy()
+            values[rest] = remaining[field].to_numpy(dtype=object)
+            result[field] = values
+    result['match_score'] = result['match_score'].astype(np.int64)
+    return result[columns]
+
+
+def summarize(result):
+    """各匹配类型的科目数（含模板匹配）"""
+    return result['match_type'].value_counts().to_dict()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    index = load_target_index()
+    chart = target_table(index)
+    rng = np.random.default_rng(0)
+
+    # 某来源系统的科目表：目标科目名称加上该系统的编码格式，部分科目名称与本系统不同
+    picks = rng.permutation(len(chart))[:300]
+    source = pd.DataFrame({
+        'source_system_code': 'U8',
+        'source_subject_code': [f"{c[:4]}.{c[4:]}" if len(c) > 4 else c
+                                for c in chart['target_subject_code'].to_numpy(dtype=object)[picks]],
+        'source_subject_name': chart['target_subject_name'].to_numpy(dtype=object)[picks] + '（U8）',
+    })
+
+    with tempfile.TemporaryDirectory() as directory:
+        with MappingTemplateStore(os.path.join(directory, 'templates.sqlite3')) as store:
+            first = match_with_templates(source, store, index)
+            print(f"📊 首次导入: {summarize(first)}")
+
+            # 用户确认全部映射后保存为模板
+            confirmed = first.copy()
+            confirmed['target_subject_code'] = chart['target_subject_code'].to_numpy(dtype=object)[picks]
+            confirmed['target_subject_name'] = chart['target_subject_name'].to_numpy(dtype=object)[picks]
+            confirmed['mapping_status'] = 'confirmed'
+            print(f"✅ 保存模板 {store.save(confirmed)} 条")
+
+            # 同一来源系统的另一家客户：大部分科目相同，另有新科目
+            big = pd.concat([source] * 300 + [source.assign(source_subject_name=source['source_subject_name'] + '2')],
+                            ignore_index=True)
+            start = time.perf_counter()
+            again = match_with_templates(big, store, index)
+            elapsed = time.perf_counter() - start
+            print(f"✅ 再次导入 {len(big)} 个科目，耗时 {elapsed:.2f} 秒: {summarize(again)}")
+            print(again.loc[again['match_type'] == 'template',
+                            ['source_subject_code', 'source_subject_name', 'target_subject_code',
+                             'match_reason']].head(3).to_string())
+            print(f"🔎 单科目查询: {store.lookup('U8', source.iat[0, 1], source.iat[0, 2])}")
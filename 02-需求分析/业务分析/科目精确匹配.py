@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+第一层：传统精确匹配（完全匹配 / 编码匹配 / 名称匹配）
+源科目和目标科目的编码、名称各规范化一次，再按规范化编码、名称做整列哈希连接，
+不逐对比较源科目和目标科目；结果按中间表 account_mapping_temp 的字段输出
+
+匹配优先级（见 导账科目映射设计方案.md 方案一）：
+- exact_match：编码和名称都一致
+- code_match：编码一致，名称不同（需要人工确认名称差异）
+- name_match：名称一致且只对应一个目标科目，编码不同
+未命中或名称对应多个目标科目的源科目为 unmatched，留给后续层级/语义匹配
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from 科目索引 import DEFAULT_SUBJECT_CSV, SubjectIndex, normalize_code, normalize_name
+
+# 源科目的必填字段
+SOURCE_CODE_FIELD = 'source_subject_code'
+SOURCE_NAME_FIELD = 'source_subject_name'
+
+# 匹配结果的字段（中间表 account_mapping_temp 的目标科目信息和匹配过程字段）
+TARGET_FIELDS = [
+    'target_subject_code',
+    'target_subject_name',
+    'target_parent_code',
+    'target_parent_name',
+    'target_subject_level',
+    'target_subject_type',
+    'target_debit_credit',
+    'target_auxiliary_info',
+]
+MATCH_FIELDS = [
+    'match_type',
+    'match_method',
+    'match_score',
+    'match_confidence',
+    'match_reason',
+    'candidate_subjects',
+    'mapping_status',
+]
+
+# 各匹配类型的评分、置信度和映射状态
+MATCH_TYPES = {
+    'exact_match': {'score': 100, 'confidence': '高', 'status': 'matched'},
+    'code_match': {'score': 80, 'confidence': '中', 'status': 'matched'},
+    'name_match': {'score': 70, 'confidence': '中', 'status': 'matched'},
+    'unmatched': {'score': 0, 'confidence': '低', 'status': 'pending'},
+}
+
+
+def normalize_code_column(values):
+    """整列科目代码规范化（与 科目索引.normalize_code 一致），相同取值只计算一次"""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    uniques = np.asarray(uniques, dtype=object)
+    # 已是半角数字/大写字母的编码（绝大多数）整列判断后原样保留，其余逐个规范化
+    is_text = np.fromiter((type(v) is str for v in uniques), dtype=bool, count=len(uniques))
+    clean = np.zeros(len(uniques), dtype=bool)
+    if is_text.any():
+        text = uniques[is_text].astype(str)
+        ascii_only = (text.view(np.uint32).reshape(len(text), -1) < 128).all(axis=1) if text.itemsize else \
+            np.ones(len(text), dtype=bool)
+        clean[is_text] = ascii_only & np.strings.isalnum(text) & (np.strings.isdigit(text) | np.strings.isupper(text))
+    result = uniques.copy()
+    result[~clean] = [normalize_code(v) for v in uniques[~clean]]
+    return result[codes]
+
+
+def normalize_name_column(values):
+    """整列科目名称规范化（与 科目索引.normalize_name 一致），相同取值只计算一次"""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    return np.array([normalize_name(v) for v in uniques], dtype=object)[codes]
+
+
+def target_table(index):
+    """把目标科目索引展开为一行一个科目的表（含规范化名称、父科目、层级）"""
+    records = list(index)
+    table = pd.DataFrame({
+        'target_subject_code': [r.code for r in records],
+        'target_subject_name': [r.name for r in records],
+        'target_parent_code': [r.parent_code for r in records],
+        'target_parent_name': [index[r.parent_code].name if r.parent_code else '' for r in records],
+        'target_subject_level': [r.level for r in records],
+        'target_subject_type': [r.category for r in records],
+        'target_debit_credit': [r.debit_credit for r in records],
+        'target_auxiliary_info': [r.auxiliary for r in records],
+    })
+    table['normalized_name'] = [r.normalized_name for r in records]
+    return table
+
+
+def load_target_index(path=DEFAULT_SUBJECT_CSV):
+    """加载目标科目（默认为小企业会计准则默认科目）"""
+    return SubjectIndex.load(path)
+
+
+def match_exact(source, target=None):
+    """
+    对源科目批量执行第一层精确匹配
+
+    参数:
+    - source: DataFrame，至少包含 source_subject_code、source_subject_name 两列，其余列原样保留
+    - target: 目标科目的 SubjectIndex，默认加载小企业会计准则默认科目
+
+    返回: DataFrame，源科目各列 + TARGET_FIELDS + MATCH_FIELDS，行顺序与 source 一致
+    """
+    if target is None:
+        target = load_target_index()
+    targets = target_table(target)
+
+    src_codes = normalize_code_column(source[SOURCE_CODE_FIELD])
+    src_names = normalize_name_column(source[SOURCE_NAME_FIELD])
+    count = len(source)
+
+    # 编码连接：目标科目编码唯一（SubjectIndex 保证），命中位置即目标行号
+    code_pos = pd.Index(targets['target_subject_code']).get_indexer(src_codes)
+    code_pos[src_codes == ''] = -1
+
+    # 名称连接：同名科目可能有多个，只有唯一的名称才能直接命中
+    name_groups = targets.groupby('normalized_name', sort=False).indices
+    unique_names = pd.Series({name: pos[0] for name, pos in name_groups.items() if len(pos) == 1 and name},
+                             dtype=np.intp)
+    hit = unique_names.index.get_indexer(src_names)
+    name_pos = np.where(hit >= 0, unique_names.to_numpy()[np.maximum(hit, 0)] if len(unique_names) else -1, -1)
+
+    target_names = targets['normalized_name'].to_numpy(dtype=object)
+    has_code = code_pos >= 0
+    exact = has_code & (target_names[np.where(has_code, code_pos, 0)] == src_names)
+    by_code = has_code & ~exact
+    by_name = ~has_code & (name_pos >= 0)
+
+    match_type = np.full(count, 'unmatched', dtype=object)
+    match_type[exact] = 'exact_match'
+    match_type[by_code] = 'code_match'
+    match_type[by_name] = 'name_match'
+    position = np.where(has_code, code_pos, np.where(by_name, name_pos, -1))
+
+    # 目标科目信息：按命中位置取目标行，未命中为空
+    matched = position >= 0
+    result = source.reset_index(drop=True).copy()
+    for field in TARGET_FIELDS:
+        values = np.full(count, None, dtype=object)
+        values[matched] = targets[field].to_numpy(dtype=object)[position[matched]]
+        result[field] = values
+
+    result['match_type'] = match_type
+    result['match_method'] = np.where(matched, 'direct', None)
+    result['match_score'] = pd.Series(match_type).map({k: v['score'] for k, v in MATCH_TYPES.items()}).to_numpy()
+    result['match_confidence'] = pd.Series(match_type).map(
+        {k: v['confidence'] for k, v in MATCH_TYPES.items()}).to_numpy()
+    result['mapping_status'] = pd.Series(match_type).map({k: v['status'] for k, v in MATCH_TYPES.items()}).to_numpy()
+    result['match_reason'] = _match_reasons(match_type, result, src_names, name_groups, targets)
+    result['candidate_subjects'] = _candidates(match_type, src_names, name_groups, targets)
+    return result[list(source.columns) + [f for f in TARGET_FIELDS + MATCH_FIELDS if f not in source.columns]]
+
+
+def _match_reasons(match_type, result, src_names, name_groups, targets):
+    reasons = np.full(len(match_type), '编码和名称均未找到对应的目标科目', dtype=object)
+    reasons[match_type == 'exact_match'] = '编码和名称完全一致'
+
+    for kind, template in (('code_match', '编码一致，名称不同（源：{source}，目标：{target}）'),
+                           ('name_match', '名称一致，编码不同（源：{source}，目标：{target}）')):
+        rows = np.flatnonzero(match_type == kind)
+        if not len(rows):
+            continue
+        field = SOURCE_NAME_FIELD if kind == 'code_match' else SOURCE_CODE_FIELD
+        target_field = 'target_subject_name' if kind == 'code_match' else 'target_subject_code'
+        sources = result[field].to_numpy(dtype=object)[rows]
+        targets_values = result[target_field].to_numpy(dtype=object)[rows]
+        reasons[rows] = [template.format(source=s, target=t) for s, t in zip(sources, targets_values)]
+
+    ambiguous = _ambiguous_rows(match_type, src_names, name_groups)
+    if len(ambiguous):
+        codes = targets['target_subject_code'].to_numpy(dtype=object)
+        reasons[ambiguous] = [f"名称对应多个目标科目（{'、'.join(codes[name_groups[src_names[i]]])}），需进一步匹配"
+                              for i in ambiguous]
+    return reasons
+
+
+def _ambiguous_rows(match_type, src_names, name_groups):
+    """未命中但名称对应多个目标科目的行"""
+    multiple = {name for name, pos in name_groups.items() if len(pos) > 1 and name}
+    if not multiple:
+        return np.array([], dtype=np.intp)
+    return np.flatnonzero((match_type == 'unmatched') & pd.Series(src_names).isin(multiple).to_numpy())
+
+
+def _candidates(match_type, src_names, name_groups, targets):
+    """同名的多个目标科目作为候选（JSON），供后续匹配和人工选择"""
+    candidates = np.full(len(match_type), None, dtype=object)
+    rows = _ambiguous_rows(match_type, src_names, name_groups)
+    codes = targets['target_subject_code'].to_numpy(dtype=object)
+    names = targets['target_subject_name'].to_numpy(dtype=object)
+    for i in rows:
+        positions = name_groups[src_names[i]]
+        candidates[i] = json.dumps([{'code': codes[p], 'name': names[p]} for p in positions], ensure_ascii=False)
+    return candidates
+
+
+def summarize(result):
+    """各匹配类型的科目数"""
+    return result['match_type'].value_counts().reindex(list(MATCH_TYPES), fill_value=0).to_dict()
+
+
+if __name__ == "__main__":
+    import time
+
+    index = load_target_index()
+    chart = target_table(index)
+
+    # 示例：由默认科目构造的源科目，含格式差异、改名、改编码和无法匹配的科目
+    source = pd.DataFrame({
+        'source_subject_code': ['1001', '1002 ', '1121', '9999', '1122', 'ZZ01', '1403'],
+        'source_subject_name': ['库存现金', '银行存款', '应收票据（商业汇票）', '应收账款', '其他', '应付利润', '原 材 料'],
+    })
+    result = match_exact(source, index)
+    print(result[['source_subject_code', 'source_subject_name', 'target_subject_code',
+                  'match_type', 'match_score', 'match_reason']].to_string())
+
+    # 性能：10万个源科目
+    rng = np.random.default_rng(0)
+    picks = rng.integers(0, len(chart), 100000)
+    big = pd.DataFrame({
+        'source_subject_code': chart['target_subject_code'].to_numpy()[picks],
+        'source_subject_name': chart['target_subject_name'].to_numpy()[picks],
+    })
+    big.loc[::7, 'source_subject_code'] = [f"X{i}" for i in range(len(big.loc[::7]))]
+    big.loc[::5, 'source_subject_name'] = [f"名称{i}" for i in range(len(big.loc[::5]))]
+    start = time.perf_counter()
+    big_result = match_exact(big, index)
+    print(f"\n✅ 10万个源科目匹配完成，耗时 {time.perf_counter() - start:.3f} 秒")
+    print(f"📊 {summarize(big_result)}")
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+默认科目的内存索引
+从默认科目CSV/JSON一次性构建，提供按科目代码、按规范化科目名称、按类别/借贷的常数时间查找，
+以及基于编码前缀树的父科目/子科目/上级科目查询，避免每次查找都重新读文件并逐行扫描
+"""
+
+import csv
+import json
+import os
+import unicodedata
+
+DEFAULT_SUBJECT_CSV = "04-参考资料/业务文档/小企业会计准则-默认科目.csv"
+
+# 默认科目CSV列 -> SubjectRecord 属性
+SUBJECT_FIELDS = {
+    '科目代码': 'code',
+    '科目名称': 'name',
+    '借贷': 'debit_credit',
+    '类别': 'category',
+    '辅助核算': 'auxiliary',
+    '匹配方法': 'match_method',
+    '匹配方法说明': 'match_method_note',
+    '辅助核算是否必要': 'auxiliary_required',
+    '名称是否允许字面不一致': 'name_variation_allowed',
+    '资产负债表': 'balance_sheet',
+    '利润表': 'profit_sheet',
+    '报表归属说明': 'report_note',
+    '是否直接影响利润表': 'direct_profit_sheet',
+    '是否直接影响资产负债表': 'direct_balance_sheet',
+    '损益细分': 'profit_loss_detail',
+}
+
+# 名称中需要去掉的不可见字符（零宽空格等）
+_INVISIBLE_CHARS = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff'))
+
+# 编码中常见的层级分隔符
+_CODE_SEPARATORS = dict.fromkeys(map(ord, '.-_/ '))
+
+
+def clean_value(value):
+    """空值（None/NaN/空白）统一为''，其余转为去空格的文本；整数值的浮点数（如1001.0）还原为'1001'"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value != value:
+            return ''
+        if value.is_integer():
+            value = int(value)
+    return str(value).strip()
+
+
+def normalize_code(code):
+    """
+    科目代码规范化：全角转半角，去掉空格和层级分隔符，统一大写
+    如：'1001.01' / '1001-01' / ' 100101 ' -> '100101'
+    """
+    # 常见情况：已是半角数字/大写字母，无需规范化
+    if isinstance(code, str) and code.isascii() and code.isalnum() and (code.isdigit() or code.isupper()):
+        return code
+    text = unicodedata.normalize('NFKC', clean_value(code))
+    return text.translate(_CODE_SEPARATORS).upper()
+
+
+def normalize_name(name):
+    """
+    科目名称规范化：全角转半角，去掉零宽字符和所有空白
+    如：'​已交税金​' -> '已交税金'，'应收 账款' -> '应收账款'
+    """
+    text = unicodedata.normalize('NFKC', clean_value(name)).translate(_INVISIBLE_CHARS)
+    return ''.join(text.split())
+
+
+class SubjectRecord:
+    """单个科目（属性见 SUBJECT_FIELDS，另含规范化名称、父科目代码、层级）"""
+
+    __slots__ = tuple(SUBJECT_FIELDS.values()) + ('normalized_name', 'parent_code', 'level')
+
+    def __init__(self, **fields):
+        for attr in SUBJECT_FIELDS.values():
+            setattr(self, attr, clean_value(fields.get(attr)))
+        self.code = normalize_code(self.code)
+        self.normalized_name = normalize_name(self.name)
+        self.parent_code = ''
+        self.level = 1
+
+    @classmethod
+    def from_row(cls, row):
+        """由默认科目的一行（列名为中文）构建"""
+        return cls(**{attr: row.get(column) for column, attr in SUBJECT_FIELDS.items()})
+
+    def to_dict(self):
+        return {column: getattr(self, attr) for column, attr in SUBJECT_FIELDS.items()}
+
+    def __repr__(self):
+        return f"SubjectRecord({self.code} {self.name})"
+
+
+class _TrieNode:
+    __slots__ = ('children', 'record')
+
+    def __init__(self):
+        self.children = {}
+        self.record = None
+
+
+class SubjectIndex:
+    """
+    默认科目索引
+
+    - get(code): 按科目代码查找
+    - find_by_name(name): 按规范化名称查找（同名科目可能有多个）
+    - parent / children / descendants / ancestors: 基于编码前缀树的层级查询，
+      父科目为编码最长的、已存在的真前缀科目（如 22210101 -> 222101 -> 2221）
+    - by_category / by_debit_credit / by_category_debit_credit: 按类别、借贷分桶
+    """
+
+    def __init__(self, records=()):
+        self._records = []
+        self._by_code = {}
+        self._by_name = {}
+        self._root = _TrieNode()
+        self.by_category = {}
+        self.by_debit_credit = {}
+        self.by_category_debit_credit = {}
+        for record in records:
+            self.add(record)
+
+    # ------------------------------------------------------------------
+    # 构建
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(SubjectRecord.from_row(row) for row in rows)
+
+    @classmethod
+    def from_csv(cls, csv_file=DEFAULT_SUBJECT_CSV):
+        with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+            return cls.from_rows(csv.DictReader(f))
+
+    @classmethod
+    def from_json(cls, json_file):
+        with open(json_file, 'r', encoding='utf-8') as f:
+            return cls.from_rows(json.load(f))
+
+    @classmethod
+    def from_dataframe(cls, df):
+        return cls.from_rows(df.to_dict('records'))
+
+    @classmethod
+    def load(cls, path=DEFAULT_SUBJECT_CSV):
+        """按扩展名从CSV或JSON构建"""
+        if os.path.splitext(path)[1].lower() == '.json':
+            return cls.from_json(path)
+        return cls.from_csv(path)
+
+    def add(self, record):
+        """加入一个科目，同步维护前缀树、名称索引和分桶"""
+        if not record.code:
+            raise ValueError(f"科目代码为空: {record!r}")
+        if record.code in self._by_code:
+            raise ValueError(f"科目代码重复: {record.code}")
+
+        # 沿编码路径插入前缀树，路径上最后一个已有科目即为父科目
+        node = self._root
+        parent = None
+        for char in record.code:
+            if node.record is not None:
+                parent = node.record
+            node = node.children.setdefault(char, _TrieNode())
+        node.record = record
+        record.parent_code = parent.code if parent else ''
+        record.level = parent.level + 1 if parent else 1
+
+        self._records.append(record)
+        self._by_code[record.code] = record
+        self._by_name.setdefault(record.normalized_name, []).append(record)
+        self.by_category.setdefault(record.category, []).append(record)
+        self.by_debit_credit.setdefault(record.debit_credit, []).append(record)
+        self.by_category_debit_credit.setdefault((record.category, record.debit_credit), []).append(record)
+
+        # 先加子科目后加父科目时，新科目插在已有科目之上，修正其下级的父科目和层级
+        if node.children:
+            for child in list(self._child_records(node)):
+                child.parent_code = record.code
+            for descendant in self._iter_subtree(record):
+                if descendant is not record:
+                    descendant.level = self._by_code[descendant.parent_code].level + 1
+
+    # ------------------------------------------------------------------
+    # 查找
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __contains__(self, code):
+        return normalize_code(code) in self._by_code
+
+    def get(self, code, default=None):
+        # 已规范化的编码直接命中，避免每次查找都做规范化
+        record = self._by_code.get(code)
+        if record is None:
+            record = self._by_code.get(normalize_code(code))
+        return default if record is None else record
+
+    def __getitem__(self, code):
+        record = self.get(code)
+        if record is None:
+            raise KeyError(code)
+        return record
+
+    def _name_bucket(self, name):
+        records = self._by_name.get(name)
+        if records is None:
+            records = self._by_name.get(normalize_name(name), ())
+        return records
+
+    def find_by_name(self, name):
+        """按规范化名称查找，返回科目列表（没有时为空列表）"""
+        return list(self._name_bucket(name))
+
+    def get_by_name(self, name):
+        """按名称查找唯一科目，不存在或不唯一时返回None"""
+        records = self._name_bucket(name)
+        return records[0] if len(records) == 1 else None
+
+    def filter(self, category=None, debit_credit=None):
+        """按类别和/或借贷取科目列表"""
+        if category is not None and debit_credit is not None:
+            return list(self.by_category_debit_credit.get((category, debit_credit), ()))
+        if category is not None:
+            return list(self.by_category.get(category, ()))
+        if debit_credit is not None:
+            return list(self.by_debit_credit.get(debit_credit, ()))
+        return list(self._records)
+
+    # ------------------------------------------------------------------
+    # 层级查询
+    # ------------------------------------------------------------------
+
+    def _node(self, code):
+        node = self._root
+        for char in normalize_code(code):
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def _child_records(node):
+        """node 之下最近一层的科目（不含 node 自身）"""
+        stack = list(node.children.values())
+        while stack:
+            current = stack.pop()
+            if current.record is not None:
+                yield current.record
+            else:
+                stack.extend(current.children.values())
+
+    def _iter_subtree(self, record):
+        """record 及其全部下级（先序）"""
+        stack = [record]
+        while stack:
+            current = stack.pop()
+            yield current
+            stack.extend(self._child_records(self._node(current.code)))
+
+    def parent(self, code):
+        record = self.get(code)
+        if record is None or not record.parent_code:
+            return None
+        return self._by_code[record.parent_code]
+
+    def ancestors(self, code):
+        """上级科目，从一级科目到直接父科目；code 不必是已有科目（如对方系统的编码）"""
+        result = []
+        node = self._root
+        target = normalize_code(code)
+        for char in target[:-1]:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.record is not None:
+                result.append(node.record)
+        return result
+
+    def nearest_ancestor(self, code):
+        """编码最长的已有上级科目，没有时返回None"""
+        ancestors = self.ancestors(code)
+        return ancestors[-1] if ancestors else None
+
+    def children(self, code):
+        """直接下级科目，按编码排序"""
+        node = self._node(code)
+        if node is None:
+            return []
+        return sorted(self._child_records(node), key=lambda r: r.code)
+
+    def descendants(self, code):
+        """全部下级科目（不含自身），按编码排序"""
+        node = self._node(code)
+        if node is None:
+            return []
+        result = []
+        stack = list(node.children.values())
+        while stack:
+            current = stack.pop()
+            if current.record is not None:
+                result.append(current.record)
+            stack.extend(current.children.values())
+        return sorted(result, key=lambda r: r.code)
+
+    def is_leaf(self, code):
+        node = self._node(code)
+        return node is not None and next(self._child_records(node), None) is None
+
+    def top_level(self):
+        """一级科目"""
+        return [record for record in self._records if not record.parent_code]
+
+
+def load_subject_index(path=DEFAULT_SUBJECT_CSV):
+    """加载默认科目索引"""
+    return SubjectIndex.load(path)
+
+
+if __name__ == "__main__":
+    index = load_subject_index()
+    print(f"✅ 科目索引已构建: {DEFAULT_SUBJECT_CSV}")
+    print(f"   - 科目数量: {len(index)}")
+    print(f"   - 一级科目: {len(index.top_level())} 个")
+    for category, records in index.by_category.items():
+        print(f"   - {category}: {len(records)} 个")
+    print(f"\n1501 的下级科目: {[f'{r.code}-{r.name}' for r in index.children('1501')]}")
+    print(f"22210101 的上级科目: {[f'{r.code}-{r.name}' for r in index.ancestors('22210101')]}")
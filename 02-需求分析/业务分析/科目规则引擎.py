@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+科目分类规则引擎
+各分类脚本的判断规则在此集中声明一次，求值时编译为按列计算的布尔掩码，
+按规则顺序取第一个命中的结果（与 np.select 语义一致），替代逐行 iterrows + df.at 写回
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class RuleContext:
+    """规则求值上下文：缓存列的转换结果，同一列在多条规则中只转换一次"""
+
+    def __init__(self, df):
+        self.df = df
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def _cached(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def raw(self, col):
+        return self.df[col]
+
+    def notna(self, col):
+        return self._cached(('notna', col), lambda: self.raw(col).notna().to_numpy())
+
+    def filled(self, col):
+        """空值替换为''后的原始值，对应脚本中的 row[col] if pd.notna(row[col]) else ''"""
+        def build():
+            s = self.raw(col)
+            return s.astype(object).where(s.notna(), '')
+        return self._cached(('filled', col), build)
+
+    def text(self, col):
+        """
+        空值为''的文本列，对应脚本中的 str(row[col]) if pd.notna(row[col]) else ''
+        返回定长 unicode 数组，字符串判断走 numpy 的向量化字符串函数
+        """
+        return self._cached(('text', col), lambda: self.filled(col).to_numpy().astype(str))
+
+
+class Condition:
+    """列式条件：对整列求值得到布尔数组，支持 & | ~ 组合"""
+
+    def __init__(self, func, desc=''):
+        self.func = func
+        self.desc = desc
+
+    def evaluate(self, ctx):
+        return np.asarray(self.func(ctx), dtype=bool)
+
+    def __and__(self, other):
+        return Condition(lambda ctx: self.evaluate(ctx) & other.evaluate(ctx),
+                         f"({self.desc} 且 {other.desc})")
+
+    def __or__(self, other):
+        return Condition(lambda ctx: self.evaluate(ctx) | other.evaluate(ctx),
+                         f"({self.desc} 或 {other.desc})")
+
+    def __invert__(self):
+        return Condition(lambda ctx: ~self.evaluate(ctx), f"非({self.desc})")
+
+    def __repr__(self):
+        return f"Condition({self.desc})"
+
+
+# ---------------------------------------------------------------------------
+# 条件构造函数
+# ---------------------------------------------------------------------------
+
+def always():
+    return Condition(lambda ctx: np.ones(len(ctx), dtype=bool), '总是')
+
+
+def is_null(col):
+    return Condition(lambda ctx: ~ctx.notna(col), f"{col}为空")
+
+
+def not_null(col):
+    return Condition(lambda ctx: ctx.notna(col), f"{col}非空")
+
+
+def equals(col, value):
+    return Condition(lambda ctx: ctx.text(col) == value, f"{col}={value}")
+
+
+def isin(col, values):
+    values = list(values)
+    return Condition(lambda ctx: np.isin(ctx.text(col), values), f"{col}∈{values}")
+
+
+def contains(col, substring):
+    return Condition(lambda ctx: np.char.find(ctx.text(col), substring) >= 0,
+                     f"{col}包含'{substring}'")
+
+
+def startswith(col, prefixes):
+    prefixes = (prefixes,) if isinstance(prefixes, str) else tuple(prefixes)
+    def evaluate(ctx):
+        text = ctx.text(col)
+        mask = np.zeros(len(text), dtype=bool)
+        for prefix in prefixes:
+            mask |= np.char.startswith(text, prefix)
+        return mask
+    return Condition(evaluate, f"{col}以{'/'.join(prefixes)}开头")
+
+
+def longer_than(col, length):
+    return Condition(lambda ctx: np.char.str_len(ctx.text(col)) > length,
+                     f"{col}长度>{length}")
+
+
+def not_blank(col):
+    return Condition(lambda ctx: np.char.strip(ctx.text(col)) != '', f"{col}有值")
+
+
+def columns_equal(left, right):
+    return Condition(lambda ctx: (ctx.filled(left) == ctx.filled(right)).to_numpy(),
+                     f"{left}={right}")
+
+
+# 共用条件：各脚本对辅助核算、层级编码的判断保持同一口径
+def has_auxiliary(col='辅助核算'):
+    """有辅助核算：pd.notna(aux) and str(aux).strip() != ''"""
+    return not_blank(col)
+
+
+def is_multi_level(col='科目代码'):
+    """二级及多级科目：编码长度大于4位"""
+    return longer_than(col, 4)
+
+
+def is_hierarchical(col='科目代码'):
+    """层级科目：编码包含小数点或长度大于4位"""
+    return contains(col, '.') | longer_than(col, 4)
+
+
+# ---------------------------------------------------------------------------
+# 规则集
+# ---------------------------------------------------------------------------
+
+class Rule:
+    """单条规则：名称、条件、命中时各输出列的取值"""
+
+    __slots__ = ('name', 'condition', 'values')
+
+    def __init__(self, name, condition, values):
+        self.name = name
+        self.condition = condition
+        self.values = tuple(values) if isinstance(values, (tuple, list)) else (values,)
+
+
+class RuleSet:
+    """
+    有序规则集：按声明顺序取第一个命中的规则，都不命中时取默认值
+
+    参数:
+    - outputs: 输出列名（一个或多个）
+    - rules: Rule 列表（顺序即优先级）
+    - default: 默认取值，与 outputs 一一对应
+    - default_name: 默认分支的规则名称（用于记录命中来源）
+    """
+
+    def __init__(self, outputs, rules, default, default_name='默认'):
+        self.outputs = (outputs,) if isinstance(outputs, str) else tuple(outputs)
+        self.rules = list(rules)
+        self.default = tuple(default) if isinstance(default, (tuple, list)) else (default,)
+        self.default_name = default_name
+        for rule in self.rules:
+            if len(rule.values) != len(self.outputs):
+                raise ValueError(f"规则 {rule.name} 的取值个数与输出列不一致")
+        if len(self.default) != len(self.outputs):
+            raise ValueError("默认取值个数与输出列不一致")
+        # 取值表：第 i 行为第 i 条规则的输出，最后一行为默认值
+        self._table = np.empty((len(self.rules) + 1, len(self.outputs)), dtype=object)
+        for i, rule in enumerate(self.rules):
+            self._table[i] = rule.values
+        self._table[-1] = self.default
+        self.rule_names = np.array([r.name for r in self.rules] + [default_name], dtype=object)
+
+    def match(self, df_or_ctx):
+        """返回每行命中的规则序号（未命中为 len(rules)）"""
+        ctx = df_or_ctx if isinstance(df_or_ctx, RuleContext) else RuleContext(df_or_ctx)
+        if not self.rules:
+            return np.full(len(ctx), 0, dtype=np.intp)
+        masks = [rule.condition.evaluate(ctx) for rule in self.rules]
+        return np.select(masks, np.arange(len(self.rules)), default=len(self.rules)).astype(np.intp)
+
+    def evaluate(self, df_or_ctx):
+        """求值，返回以输出列为列的 DataFrame（索引与输入一致）"""
+        ctx = df_or_ctx if isinstance(df_or_ctx, RuleContext) else RuleContext(df_or_ctx)
+        hit = self.match(ctx)
+        values = self._table[hit]
+        return pd.DataFrame({col: values[:, i] for i, col in enumerate(self.outputs)},
+                            index=ctx.df.index)
+
+    def apply(self, df):
+        """求值并写回 df 的输出列，返回每行命中的规则名称"""
+        ctx = RuleContext(df)
+        hit = self.match(ctx)
+        values = self._table[hit]
+        for i, col in enumerate(self.outputs):
+            df[col] = values[:, i]
+        return pd.Series(self.rule_names[hit], index=df.index, name='命中规则')
+
+
+# ---------------------------------------------------------------------------
+# 科目分类（科目分类结果.json 的分类）
+# ---------------------------------------------------------------------------
+
+CATEGORY_NAMES = [
+    '传统方法-完全匹配',  # 编码和名称都完全一致，标准科目
+    '传统方法-编码匹配',  # 编码相同但名称可能不同，标准编码体系
+    '传统方法-层级匹配',  # 有明确层级关系的科目
+    '模型分析-语义匹配',  # 名称相似但编码不同，需要语义理解
+    '模型分析-同义词匹配',  # 可能存在同义词的科目
+    '其他处理-删除科目',  # 已删除的科目，需要特殊处理
+    '其他处理-新增科目',  # 新增的科目，需要确认
+    '其他处理-待讨论',  # 需要讨论的科目
+    '其他处理-辅助核算',  # 有辅助核算的科目，需要特殊处理
+]
+
+# 原始Excel（小企业会计准则 (1).xlsx）中的列
+LEGACY_CODE = '当前版本SAAS的默认科目'
+LEGACY_NAME = 'Unnamed: 1'
+LEGACY_NEW_CODE = '修改后SAAS的默认科目'
+LEGACY_NEW_NAME = 'Unnamed: 3'
+
+# 基于原始Excel的分类（科目分类分析.py）
+LEGACY_CLASSIFY_RULES = RuleSet('分类', [
+    Rule('删除', equals('操作', '删除'), '其他处理-删除科目'),
+    Rule('新增', equals('操作', '新增') | (is_null(LEGACY_CODE) & not_null(LEGACY_NEW_CODE)),
+         '其他处理-新增科目'),
+    Rule('待讨论', equals('是否有问题', '需要讨论') | contains('备注', '待讨论'), '其他处理-待讨论'),
+    Rule('辅助核算', has_auxiliary('辅助'), '其他处理-辅助核算'),
+    Rule('保持不变-编码名称一致',
+         equals('操作', '保持不变') & not_null(LEGACY_CODE) & not_null(LEGACY_NEW_CODE)
+         & columns_equal(LEGACY_CODE, LEGACY_NEW_CODE) & columns_equal(LEGACY_NAME, LEGACY_NEW_NAME),
+         '传统方法-完全匹配'),
+    Rule('保持不变-编码一致',
+         equals('操作', '保持不变') & not_null(LEGACY_CODE) & not_null(LEGACY_NEW_CODE)
+         & columns_equal(LEGACY_CODE, LEGACY_NEW_CODE),
+         '传统方法-编码匹配'),
+    Rule('保持不变', equals('操作', '保持不变'), '传统方法-完全匹配'),
+    Rule('层级编码', is_hierarchical(LEGACY_CODE), '传统方法-层级匹配'),
+], default='模型分析-语义匹配', default_name='语义匹配')
+
+# 基于科目数据CSV的分类（重新分类分析.py）
+CLASSIFY_RULES = RuleSet('分类', [
+    Rule('辅助核算', has_auxiliary(), '其他处理-辅助核算'),
+    Rule('层级编码', is_hierarchical(), '传统方法-层级匹配'),
+], default='传统方法-完全匹配', default_name='标准科目')
+
+
+def group_by_category(records, labels, category_names=CATEGORY_NAMES):
+    """按分类结果把科目信息分组，保持分类顺序和行顺序"""
+    categories = {name: [] for name in category_names}
+    for record, label in zip(records, labels):
+        categories[label].append(record)
+    return categories
+
+
+def classify_legacy_subjects(df):
+    """对原始Excel的默认科目进行分类，返回 {分类: [科目信息]}"""
+    labels = LEGACY_CLASSIFY_RULES.evaluate(df)['分类'].to_numpy()
+    ctx = RuleContext(df)
+    new_code = ctx.raw(LEGACY_NEW_CODE).astype(object)
+    info = pd.DataFrame({
+        'old_code': ctx.raw(LEGACY_CODE),
+        'old_name': ctx.filled(LEGACY_NAME),
+        'new_code': new_code.where(new_code.notna(), None),
+        'new_name': ctx.filled(LEGACY_NEW_NAME),
+        'operation': ctx.filled('操作'),
+        'category': ctx.filled('类别'),
+        'auxiliary': ctx.filled('辅助'),
+        'remark': ctx.filled('备注'),
+    })
+    return group_by_category(info.to_dict('records'), labels)
+
+
+def classify_subjects(df):
+    """对科目数据CSV进行分类，返回 {分类: [科目信息]}"""
+    labels = CLASSIFY_RULES.evaluate(df)['分类'].to_numpy()
+    ctx = RuleContext(df)
+    info = pd.DataFrame({
+        'code': ctx.filled('科目代码'),
+        'name': ctx.filled('科目名称'),
+        'category': ctx.filled('类别'),
+        'auxiliary': ctx.filled('辅助核算'),
+        'debit_credit': df['借贷'] if '借贷' in df.columns else '',
+    })
+    return group_by_category(info.to_dict('records'), labels)
+
+
+def subject_keys(codes, names):
+    """生成 "编码_名称" 形式的科目键，与 f"{code}_{name}" 一致（空编码为'nan'）"""
+    codes = np.asarray(codes, dtype=object).astype(str)
+    names = pd.Series(names).astype(object)
+    names = names.where(names.notna(), '').to_numpy().astype(str)
+    return pd.Series(np.char.add(np.char.add(codes, '_'), names))
+
+
+def category_lookup(classifications, code_field='code', name_field='name'):
+    """把 科目分类结果.json 展开为 {"编码_名称": 分类}"""
+    subject_to_category = {}
+    for category, subjects in classifications.items():
+        for subj in subjects:
+            key = f"{subj.get(code_field, '')}_{subj.get(name_field, '')}"
+            subject_to_category[key] = category
+    return subject_to_category
+
+
+# ---------------------------------------------------------------------------
+# 匹配方法 / 匹配方法说明
+# ---------------------------------------------------------------------------
+
+MATCH_METHOD_COLUMNS = ('匹配方法', '匹配方法说明')
+
+# 更新二级科目匹配方法.py：二级及多级科目改为大模型匹配
+SECONDARY_MATCH_METHOD_RULES = RuleSet(MATCH_METHOD_COLUMNS, [
+    Rule('辅助核算', has_auxiliary(),
+         ('智能语义匹配（大模型）', '有辅助核算，需要大模型匹配并处理辅助核算映射')),
+    Rule('多级科目', is_multi_level(),
+         ('智能语义匹配（大模型）', '二级/多级科目，层级和名称可能不完全相同，建议使用大模型进行语义匹配')),
+], default=('传统精确匹配', '一级科目，建议使用完全匹配（编码+名称）或编码匹配'), default_name='一级科目')
+
+# 更新匹配方法备注.py：按分类结果（列'分类结果'）标注，未分类时按科目属性判断
+MATCH_METHOD_REMARK_RULES = RuleSet(MATCH_METHOD_COLUMNS, [
+    Rule('分类-完全匹配', equals('分类结果', '传统方法-完全匹配'),
+         ('传统精确匹配', '建议使用完全匹配（编码+名称）或编码匹配')),
+    Rule('分类-层级匹配', equals('分类结果', '传统方法-层级匹配'),
+         ('传统精确匹配', '建议使用层级匹配，处理多级科目结构')),
+    Rule('分类-辅助核算', equals('分类结果', '其他处理-辅助核算'),
+         ('智能语义匹配', '有辅助核算，需要额外处理辅助核算映射，建议使用智能匹配')),
+    Rule('辅助核算', has_auxiliary(),
+         ('智能语义匹配', '有辅助核算，需要额外处理辅助核算映射，建议使用智能匹配')),
+    Rule('层级编码', is_hierarchical(),
+         ('传统精确匹配', '建议使用层级匹配，处理多级科目结构')),
+], default=('传统精确匹配', '建议使用完全匹配（编码+名称）或编码匹配'), default_name='标准科目')
+
+# 添加匹配方法备注.py：基于原始Excel的分类结果（列'分类结果'）和操作类型
+LEGACY_MATCH_METHOD_REMARK_RULES = RuleSet(MATCH_METHOD_COLUMNS, [
+    Rule('分类-完全匹配', equals('分类结果', '传统方法-完全匹配'),
+         ('传统精确匹配', '建议使用完全匹配（编码+名称）或编码匹配')),
+    Rule('分类-层级匹配', equals('分类结果', '传统方法-层级匹配'),
+         ('传统精确匹配', '建议使用层级匹配，处理多级科目结构')),
+    Rule('分类-删除科目', equals('分类结果', '其他处理-删除科目'),
+         ('智能语义匹配', '本系统已删除，对方系统可能有此科目，需要智能匹配并建议替代方案')),
+    Rule('分类-新增科目', equals('分类结果', '其他处理-新增科目'),
+         ('智能语义匹配', '本系统新增科目，对方系统可能无此科目，需要智能匹配或创建新科目')),
+    Rule('分类-辅助核算', equals('分类结果', '其他处理-辅助核算'),
+         ('智能语义匹配', '有辅助核算，需要额外处理辅助核算映射，建议使用智能匹配')),
+    Rule('分类-待讨论', equals('分类结果', '其他处理-待讨论'),
+         ('智能语义匹配', '待讨论科目，需要人工确认，建议使用智能匹配提供候选')),
+    Rule('保持不变', equals('操作', '保持不变'),
+         ('传统精确匹配', '标准科目，建议使用完全匹配或编码匹配')),
+    Rule('删除', equals('操作', '删除'),
+         ('智能语义匹配', '已删除科目，需要智能匹配')),
+], default=('智能语义匹配', '需要智能匹配处理'), default_name='其他')
+
+
+# ---------------------------------------------------------------------------
+# 报表归属（资产负债表 / 利润表）
+# ---------------------------------------------------------------------------
+
+REPORT_COLUMNS = ('资产负债表', '利润表', '报表归属说明')
+
+# 分析科目报表归属.py：利润相关科目优先，其次按类别判断
+REPORT_ATTRIBUTION_RULES = RuleSet(REPORT_COLUMNS, [
+    Rule('利润相关', isin('科目代码', ['3103', '3104']) | contains('科目名称', '利润'),
+         ('是', '是', '利润相关科目，既影响资产负债表（权益）也影响利润表（净利润）')),
+    Rule('资产', equals('类别', '资产'), ('是', '否', '资产类科目，用于资产负债表')),
+    Rule('负债', equals('类别', '负债'), ('是', '否', '负债类科目，用于资产负债表')),
+    Rule('权益', equals('类别', '权益'), ('是', '否', '所有者权益类科目，用于资产负债表')),
+    # 成本类科目：通过存货影响资产负债表，通过主营业务成本影响利润表
+    Rule('成本', equals('类别', '成本'),
+         ('是', '是', '成本类科目，通过存货影响资产负债表，通过主营业务成本影响利润表')),
+    Rule('损益-收入', equals('类别', '损益') & (contains('科目名称', '收入') | startswith('科目代码', '5')),
+         ('否', '是', '收入类科目，用于利润表')),
+    Rule('损益-费用', equals('类别', '损益') & (contains('科目名称', '费用') | contains('科目名称', '成本')
+                                              | startswith('科目代码', ('56', '57', '58'))),
+         ('否', '是', '费用类科目，用于利润表')),
+    Rule('损益', equals('类别', '损益'), ('否', '是', '损益类科目，用于利润表')),
+], default=('否', '否', ''), default_name='未归属')
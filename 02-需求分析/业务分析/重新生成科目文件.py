@@ -1,16 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-根据修改后的CSV文件重新生成JSON和MD文件，并重新进行分类分析
+根据修改后的CSV文件增量更新JSON和MD文件，CSV本身不改写；
+对修改过的科目重新执行匹配方法和报表归属规则，列出与规则结果不一致的人工修改
 """
 
-import pandas as pd
-import json
-import os
+from 列式缓存 import read_csv_cached
+from 科目增量更新 import regenerate_subject_files
 
 # 读取修改后的CSV文件
 csv_file = "04-参考资料/业务文档/小企业会计准则-默认科目.csv"
-df = pd.read_csv(csv_file, encoding='utf-8-sig')
+df = read_csv_cached(csv_file, encoding='utf-8-sig')
 
 print(f"读取CSV文件: {csv_file}")
 print(f"数据形状: {df.shape}")
@@ -18,32 +18,14 @@ print(f"列名: {list(df.columns)}")
 print(f"\n前5行数据:")
 print(df.head())
 
-# 确保输出目录存在
-output_dir = "04-参考资料/业务文档"
-os.makedirs(output_dir, exist_ok=True)
-
-# 保存为JSON格式
-json_file = os.path.join(output_dir, "小企业会计准则-默认科目.json")
-data_dict = df.to_dict('records')
-with open(json_file, 'w', encoding='utf-8') as f:
-    json.dump(data_dict, f, ensure_ascii=False, indent=2)
-print(f"\n✅ JSON文件已更新: {json_file}")
-
-# 保存为Markdown格式
-md_file = os.path.join(output_dir, "小企业会计准则-默认科目.md")
-with open(md_file, 'w', encoding='utf-8') as f:
-    f.write("# 小企业会计准则 - 默认科目数据\n\n")
-    f.write(f"数据来源: {csv_file}\n\n")
-    f.write(f"数据行数: {len(df)}\n\n")
-    f.write("## 数据表\n\n")
-    # 表头
-    headers = df.columns.tolist()
-    f.write("| " + " | ".join(str(h) for h in headers) + " |\n")
-    f.write("| " + " | ".join(["---"] * len(headers)) + " |\n")
-    # 数据行
-    for _, row in df.iterrows():
-        f.write("| " + " | ".join(str(val) if pd.notna(val) else "" for val in row) + " |\n")
-print(f"✅ Markdown文件已更新: {md_file}")
+# 增量更新JSON和Markdown文件：只对新增、修改的科目重新执行规则并改写对应行
+stats = regenerate_subject_files(df, csv_file)
+print(f"\n✅ JSON/Markdown文件已更新（新增 {stats['added']}，修改 {stats['changed']}，"
+      f"删除 {stats['deleted']}，未变化 {stats['unchanged']}）")
+if not stats['incremental']:
+    print("   - CSV缺少科目代码或匹配方法/报表归属列，已整体重写（未重新执行规则）")
+if stats['manual']:
+    print(f"   - 匹配方法/报表归属与规则结果不一致（保留CSV中的人工修改）: {', '.join(stats['manual'])}")
 
 # 输出数据统计信息
 print(f"\n📊 数据统计:")